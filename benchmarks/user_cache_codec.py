@@ -0,0 +1,53 @@
+"""
+Compare the cached user payload: pickled ORM ``User`` versus the versioned principal record.
+
+Run from the project root with the usual environment (``.env``) available::
+
+    python benchmarks/user_cache_codec.py
+"""
+import os
+import pickle
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.models import User
+from src.services import principal as principal_codec
+
+NUMBER = 20000
+
+
+def make_user() -> User:
+    return User(
+        id=42,
+        role_id=3,
+        username="photographer",
+        first_name="Olena",
+        last_name="Kovalenko",
+        email="photographer@example.com",
+        password="$2b$12$" + "x" * 53,
+        created_at=datetime(2023, 11, 21, 12, 30, 15),
+        avatar="https://www.gravatar.com/avatar/0123456789abcdef0123456789abcdef",
+        refresh_token="r" * 180,
+        confirmed=True,
+        ban=False,
+    )
+
+
+def main() -> None:
+    user = make_user()
+    pickled = pickle.dumps(user)
+    record = principal_codec.dumps(principal_codec.Principal.from_user(user))
+
+    pickle_loads = min(timeit.repeat(lambda: pickle.loads(pickled), number=NUMBER, repeat=5))
+    record_loads = min(timeit.repeat(lambda: principal_codec.loads(record), number=NUMBER, repeat=5))
+
+    print(f"{'codec':<12}{'bytes':>8}{'decode, us':>14}")
+    print(f"{'pickle':<12}{len(pickled):>8}{pickle_loads / NUMBER * 1e6:>14.2f}")
+    print(f"{'principal':<12}{len(record):>8}{record_loads / NUMBER * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
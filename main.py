@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 import uvicorn
 from src.routes import user_profile
@@ -5,15 +7,73 @@ from src.routes import auth
 from src.routes import photo
 from src.routes import roles
 from src.routes import tags
-# from src.routes import comments
+from src.routes import search
+from src.routes import metrics
+from src.routes import admin
+from src.routes import comments
+from src.conf.config import settings
+from src.database.db import sessionmanager
+from src.services.cache import cache_invalidator, redis_client, redis_pool
+from src.services.counters import counter_reconciler
+from src.services.email import email_worker
+from src.services.hashing import password_hasher
+from src.services.metrics import MetricsMiddleware, instrument_engine, instrument_redis, loop_lag_monitor, request_metrics
+from src.services.query_profiler import query_profiler
+from src.services.revocation import revocation_list
+from src.services.storage import MediaFiles, cloudinary_uploader
+from src.services.transform import transform_worker
+from src.services.uploads import resumable_uploads
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cloudinary_uploader.configure(settings.cloudinary_name, settings.cloudinary_api_key,
+                                  settings.cloudinary_api_secret, settings.cloudinary_upload_prefix)
+    if settings.metrics_enabled:
+        for engine in sessionmanager.engines:
+            instrument_engine(engine)
+        instrument_redis(redis_client)
+        loop_lag_monitor.start()
+    if settings.slow_query_threshold > 0:
+        for engine in sessionmanager.engines:
+            query_profiler.instrument(engine)
+    revocation_list.start()
+    cache_invalidator.start()
+    sessionmanager.start()
+    counter_reconciler.start()
+    resumable_uploads.start()
+    if settings.transform_worker_enabled:
+        transform_worker.start()
+    if settings.mail_worker_enabled:
+        email_worker.start()
+    yield
+    await email_worker.stop()
+    await transform_worker.stop()
+    await counter_reconciler.stop()
+    await resumable_uploads.stop()
+    await loop_lag_monitor.stop()
+    await revocation_list.stop()
+    await cache_invalidator.stop()
+    password_hasher.shutdown()
+    await sessionmanager.close()
+    await redis_pool.disconnect()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(auth.router, prefix="/api")
 app.include_router(user_profile.profile_router, prefix="/api")
 app.include_router(roles.router, prefix='/api')
 app.include_router(photo.router, prefix='/api')
 app.include_router(tags.router, prefix='/api')
-# app.include_router(comments.router, prefix='/api')
+app.include_router(comments.router, prefix='/api')
+app.include_router(search.router, prefix='/api')
+app.include_router(admin.router, prefix='/api')
+if settings.storage_backend == "local":
+    app.mount(settings.media_url, MediaFiles(directory=settings.storage_root, check_dir=False), name="media")
+if settings.metrics_enabled:
+    app.include_router(metrics.router)
+    app.add_middleware(MetricsMiddleware)
+    request_metrics.preallocate(app.routes)
 
 
 @app.get("/")
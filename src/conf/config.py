@@ -6,9 +6,23 @@ class Settings(BaseSettings):
     postgres_user: str
     postgres_password: str
     postgres_url: str
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    postgres_replica_urls: str = ""
+    replica_max_lag: float = 5
+    replica_lag_check_interval: float = 5
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    cloudinary_upload_prefix: str = ""
+    cloudinary_concurrency: int = 4
+    cloudinary_timeout: float = 30
+    cloudinary_retries: int = 2
+    cloudinary_retry_backoff: float = 0.5
     secret_key: str
     algorithm: str
     mail_username: str
@@ -16,8 +30,63 @@ class Settings(BaseSettings):
     mail_from: str
     mail_port: int
     mail_server: str
+    mail_from_name: str = "PhotoShare"
+    mail_ssl_tls: bool = True
+    mail_starttls: bool = False
+    mail_use_credentials: bool = True
+    mail_validate_certs: bool = True
+    mail_pool_size: int = 4
+    mail_timeout: float = 30
+    mail_batch_size: int = 100
+    mail_max_attempts: int = 5
+    mail_retry_backoff: float = 30
+    mail_worker_enabled: bool = True
+    storage_backend: str = "local"
+    storage_root: str = "media"
+    media_url: str = "/media"
+    upload_tmp_dir: str = "uploads"
+    max_upload_size: int = 20 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+    upload_session_ttl: int = 24 * 60 * 60
+    upload_lock_ttl: int = 60
+    upload_cleanup_interval: int = 60 * 60
+    transform_specs: str = "200x200-fill,1024x1024-fit"
+    transform_workers: int = 2
+    transform_batch_size: int = 16
+    transform_dedupe_ttl: int = 60 * 60
+    transform_worker_enabled: bool = True
+    counter_reconcile_interval: int = 60 * 60
     redis_host: str
     redis_port: int
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5
+    user_cache_size: int = 1024
+    user_cache_ttl: int = 30
+    user_record_ttl: int = 900
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 900
+    tag_cache_size: int = 4096
+    tag_cache_ttl: int = 300
+    response_cache_ttl: int = 300
+    rate_limit_enabled: bool = True
+    rate_limit_local_size: int = 10000
+    metrics_enabled: bool = True
+    event_loop_lag_interval: float = 0.5
+    slow_query_threshold: float = 0.2
+    slow_query_log_size: int = 100
+    slow_query_explain: bool = False
+    slow_query_explain_analyze: bool = False
+    slow_query_explain_interval: float = 600
+    avatar_default: str = "identicon"
+    avatar_probe_timeout: float = 3
+    avatar_probe_ttl: int = 24 * 60 * 60
+    avatar_probe_concurrency: int = 4
+    revocation_filter_capacity: int = 100000
+    revocation_filter_error_rate: float = 0.001
+    revocation_rebuild_interval: int = 900
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_queue: int = 64
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,12 @@
+import asyncio
 import contextlib
-from typing import AsyncIterator
+import logging
+import time
+from typing import AsyncIterator, Optional, Sequence
 
 
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -10,39 +15,252 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.conf.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
-class DatabaseSessionManager:
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long callers wait to check out a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def engine_options(url: str) -> dict:
+    """
+    Build the engine and pool options from the settings.
+
+    :param url: The database URL.
+    :type url: str
+    :return: Keyword arguments for ``create_async_engine``.
+    :rtype: dict
+    """
+    options = dict(
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": settings.db_statement_cache_size}
+    return options
+
+
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    """
+    Report the saturation of an engine's connection pool.
+
+    :param engine: The engine to inspect.
+    :type engine: AsyncEngine
+    :return: Pool size, checked-out and overflow connections, and checkout wait times.
+    :rtype: dict
+    """
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_seconds_total": pool.wait_seconds_total,
+        "wait_seconds_max": pool.wait_seconds_max,
+    }
+
+
+class Replica:
+    """
+    A read replica engine with its measured replication lag and open sessions.
+    """
+
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        self.engine: AsyncEngine = create_async_engine(url, **engine_options(url))
+        self.session_maker = async_sessionmaker(
+            autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine
+        )
+        self.lag: Optional[float] = None
+        self.in_flight = 0
+
+
+class DatabaseSessionManager:
+    def __init__(self, url: str, replica_urls: Sequence[str] = (), max_replica_lag: float = 5,
+                 lag_check_interval: float = 5):
+        self._engine: AsyncEngine | None = create_async_engine(url, **engine_options(url))
         self._session_maker: async_sessionmaker | None = async_sessionmaker(
             autocommit=False, autoflush=False, expire_on_commit=False, bind=self._engine
         )
+        self._replicas = [Replica(replica_url) for replica_url in replica_urls]
+        self.max_replica_lag = max_replica_lag
+        self.lag_check_interval = lag_check_interval
+        self._lag_task: Optional[asyncio.Task] = None
 
-    @contextlib.asynccontextmanager
-    async def session(self) -> AsyncIterator[AsyncSession]:
-        if self._session_maker is None:
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
             raise Exception("DatabaseSessionManager is not initialized")
-        session = self._session_maker()
+        return self._engine
+
+    @property
+    def engines(self) -> list[AsyncEngine]:
+        """
+        The primary engine followed by the replica engines.
+        """
+        return [self.engine, *(replica.engine for replica in self._replicas)]
+
+    def start(self) -> None:
+        """
+        Start measuring replica lag in the background.
+        """
+        if self._replicas and self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._watch_replica_lag())
+
+    async def close(self) -> None:
+        """
+        Dispose of the engines and close every pooled connection.
+        """
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+            self._lag_task = None
+        for replica in self._replicas:
+            await replica.engine.dispose()
+        self._replicas = []
+        if self._engine is None:
+            return
+        await self._engine.dispose()
+        self._engine = None
+        self._session_maker = None
+
+    async def check_replica_lag(self) -> None:
+        """
+        Measure the replication lag of every replica.
+
+        A replica that cannot be reached is taken out of rotation until the next check.
+        """
+        for replica in self._replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    replica.lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar())
+            except Exception as err:
+                logger.warning("Measuring replica lag failed: %s", err)
+                replica.lag = None
+
+    async def _watch_replica_lag(self) -> None:
+        while True:
+            await self.check_replica_lag()
+            await asyncio.sleep(self.lag_check_interval)
+
+    def _pick_replica(self) -> Optional[Replica]:
+        candidates = [
+            replica for replica in self._replicas
+            if replica.lag is not None and replica.lag <= self.max_replica_lag
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda replica: replica.in_flight)
+
+    def pool_status(self) -> dict:
+        """
+        Report the saturation of the primary and replica connection pools.
+
+        :return: Pool size, checked-out and overflow connections, and checkout wait times.
+        :rtype: dict
+        """
+        status = pool_status(self.engine)
+        status["replicas"] = [
+            dict(pool_status(replica.engine), lag=replica.lag, in_flight=replica.in_flight)
+            for replica in self._replicas
+        ]
+        return status
+
+    @staticmethod
+    @contextlib.asynccontextmanager
+    async def _session_scope(session_maker: async_sessionmaker) -> AsyncIterator[AsyncSession]:
+        session = session_maker()
         try:
             yield session
         except Exception as err:
-            print(err)
+            logger.warning("Rolling back session after %r", err)
             await session.rollback()
         finally:
             await session.close()
 
+    @contextlib.asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        if self._session_maker is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+        async with self._session_scope(self._session_maker) as session:
+            yield session
+
+    @contextlib.asynccontextmanager
+    async def read_session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Open a session for read-only work.
+
+        The replica with the fewest open sessions is used; if every replica lags behind
+        more than ``max_replica_lag`` seconds (or none is configured) the primary is used.
+        """
+        replica = self._pick_replica()
+        if replica is None:
+            async with self.session() as session:
+                yield session
+            return
+        replica.in_flight += 1
+        try:
+            async with self._session_scope(replica.session_maker) as session:
+                yield session
+        finally:
+            replica.in_flight -= 1
+
 
-sessionmanager = DatabaseSessionManager(settings.postgres_url)
+sessionmanager = DatabaseSessionManager(
+    settings.postgres_url,
+    replica_urls=[url.strip() for url in settings.postgres_replica_urls.split(",") if url.strip()],
+    max_replica_lag=settings.replica_max_lag,
+    lag_check_interval=settings.replica_lag_check_interval,
+)
 
 
 # Dependency
 async def get_db():
     async with sessionmanager.session() as session:
         yield session
+
+
+async def get_read_db():
+    async with sessionmanager.read_session() as session:
+        yield session
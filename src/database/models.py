@@ -2,20 +2,27 @@ import enum
 
 from datetime import datetime, date
 
-from sqlalchemy import Column, Integer, Text, String, Boolean, func, Table
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import Column, Integer, Text, String, Boolean, func, Table, Index, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, Mapped, mapped_column, column_property
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
 from .db import Base
 
 
+# Full-text search vectors, maintained by database triggers (see the migration).
+# Other dialects, e.g. SQLite in tests, store plain text that is never queried.
+SearchVector = Text().with_variant(TSVECTOR(), "postgresql")
+
 
 ## ----Create ----#
 photo_tags = Table(
     'photo_tags',
     Base.metadata,
-    Column('photo_id', Integer, ForeignKey('photos.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('photo_id', Integer, ForeignKey('photos.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    # The primary key answers "tags of a photo", this index "photos with a tag".
+    Index('ix_photo_tags_tag_id_photo_id', 'tag_id', 'photo_id'),
 )
 
 
@@ -51,6 +58,47 @@ class Tag(Base):
     photos = relationship("Photo", secondary=photo_tags, back_populates="tags")
 
 
+class PhotoBlob(Base):
+    __tablename__ = "photo_blobs"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String(255), nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    phash: Mapped[str] = mapped_column(String(16), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class Counter(Base):
+    """
+    Denormalized counts, maintained in the same transaction as the rows they count.
+    """
+    __tablename__ = "counters"
+
+    PHOTO_COMMENTS = "photo_comments"
+    TAG_PHOTOS = "tag_photos"
+    USER_PHOTOS = "user_photos"
+    USER_COMMENTS = "user_comments"
+
+    scope: Mapped[str] = mapped_column(String(20), primary_key=True)
+    entity_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class SystemFlag(Base):
+    """
+    One-time facts about the deployment, claimed by inserting their row.
+
+    The primary key lets exactly one ``INSERT ... ON CONFLICT DO NOTHING`` win.
+    """
+    __tablename__ = "system_flags"
+
+    FIRST_ADMIN = "first_admin"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    created_at = Column(DateTime, default=func.now())
+
+
 class Photo(Base):
     __tablename__ = "photos"
 
@@ -58,6 +106,18 @@ class Photo(Base):
     description: Mapped[str] = mapped_column(String(255), nullable=False)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=func.now())
+    url: Mapped[str] = mapped_column(String(255), nullable=True)
+    storage_key: Mapped[str] = mapped_column(String(255), nullable=True)
+    content_hash: Mapped[str] = mapped_column(String(64), ForeignKey("photo_blobs.content_hash"), nullable=True)
+    search_vector = mapped_column(SearchVector, nullable=True, deferred=True)
+    # A primary key lookup per row, loaded with the photo.
+    comments_count = column_property(func.coalesce(
+        select(Counter.value)
+        .where(Counter.scope == Counter.PHOTO_COMMENTS, Counter.entity_id == id)
+        .correlate_except(Counter)
+        .scalar_subquery(),
+        0,
+    ), expire_on_flush=False)
 
     user: Mapped[int] = relationship("User", backref="photos")
     tags: Mapped[list["Tag"]] = relationship("Tag", secondary=photo_tags, back_populates="photos")
@@ -65,6 +125,11 @@ class Photo(Base):
         "Comment", back_populates="photo", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        Index("ix_photos_created_at_id", "created_at", "id"),
+        Index("ix_photos_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -76,10 +141,17 @@ class Comment(Base):
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     photo_id: Mapped[int] = mapped_column("photos_id", ForeignKey("photos.id", ondelete="CASCADE"), default=None)
     update_status: Mapped[bool] = mapped_column(Boolean, default=False)
+    search_vector = mapped_column(SearchVector, nullable=True, deferred=True)
 
     user: Mapped[int] = relationship("User", backref="comments")
     photo: Mapped["Photo"] = relationship("Photo", back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_comments_photos_id_created_at_id", "photos_id", "created_at", "id"),
+        Index("ix_comments_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_comments_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
 
 class TransformPhotos(Base):
     __tablename__ = 'transform_photos'
@@ -87,6 +159,12 @@ class TransformPhotos(Base):
     id = Column(Integer, primary_key=True)
     photo_url = Column(String, nullable=False)
     photo_id = Column(Integer, ForeignKey(Photo.id, ondelete="CASCADE"))
+    spec = Column(String(50), nullable=True)
+    storage_key = Column(String(255), nullable=True)
     created_at = Column('created_at', DateTime, default=func.now())
 
-    photo = relationship('Photo', backref="transform_photos")
\ No newline at end of file
+    photo = relationship('Photo', backref="transform_photos")
+
+    __table_args__ = (
+        Index("ix_transform_photos_photo_id_spec", "photo_id", "spec", unique=True),
+    )
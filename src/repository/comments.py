@@ -1,23 +1,31 @@
-from sqlalchemy import select
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.database.models import Comment
+from src.database.models import Comment, Counter
+from src.repository.counters import bump
+from src.repository.pagination import decode_cursor, encode_cursor
+from src.services.principal import Principal
+from src.services.response_cache import response_cache
 
 
-async def create_comments(content: str, user: str, photos_id: int, db: AsyncSession):
+async def create_comments(content: str, user: Principal, photos_id: int, db: AsyncSession):
     """
     Creates a new comment and stores it in the database.
 
     :param content: str: Text of the comment.
-    :param user: str: The user who left the comment.
+    :param user: Principal: The user who left the comment.
     :param photos_id: int: The ID of the photo to which the comment is linked.
     :param db: AsyncSession: Database session to perform operations.
     :return: Comment: Comment created.
     :raises Exception: If an error occurred while creating the comment.
     """
-    comment = Comment(text=content, user=user, photo_id=photos_id)
+    comment = Comment(text=content, user_id=user.id, photo_id=photos_id)
     try:
         db.add(comment)
+        await bump({(Counter.PHOTO_COMMENTS, photos_id): 1, (Counter.USER_COMMENTS, user.id): 1}, db)
         await db.commit()
+        await response_cache.invalidate(f"photo:{photos_id}", f"user:{user.id}")
         await db.refresh(comment)
         return comment
     except Exception as e:
@@ -82,7 +90,12 @@ async def delete_comment(id: int, db: AsyncSession):
     if comment:
         try:
             await db.delete(comment)
+            await bump({
+                (Counter.PHOTO_COMMENTS, comment.photo_id): -1,
+                (Counter.USER_COMMENTS, comment.user_id): -1,
+            }, db)
             await db.commit()
+            await response_cache.invalidate(f"photo:{comment.photo_id}", f"user:{comment.user_id}")
             return comment
         except Exception as e:
             await db.rollback()
@@ -90,46 +103,51 @@ async def delete_comment(id: int, db: AsyncSession):
     return None
 
 
-async def get_photo_comments(offset: int, limit: int, photo_id: int, db: AsyncSession):
+async def _get_comments_page(criterion, limit: int, cursor: str | None, db: AsyncSession):
+    sql = select(Comment).filter(criterion)
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor, 2)
+        if not isinstance(created_at, str) or not isinstance(comment_id, int):
+            raise ValueError("Invalid cursor")
+        sql = sql.filter(tuple_(Comment.created_at, Comment.id) > (datetime.fromisoformat(created_at), comment_id))
+    sql = sql.order_by(Comment.created_at, Comment.id).limit(limit + 1)
+    comments = (await db.execute(sql)).scalars().all()
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].created_at.isoformat(), comments[-1].id)
+    return comments, next_cursor
+
+
+async def get_photo_comments(limit: int, cursor: str | None, photo_id: int, db: AsyncSession):
     """
-    Gets comments on a specific photo with pagination.
+    Gets comments on a specific photo, oldest first, with keyset pagination.
 
-    :param offset: int: Offset to sample comments.
-    :param limit: int: Maximum number of comments to sample.
+    :param limit: int: Maximum number of comments to return.
+    :param cursor: str | None: Cursor returned with the previous page, or None for the first page.
     :param photo_id: int: Identifier of the photo to which the comments refer.
     :param db: AsyncSession: The database session for performing operations.
-    :return: list[Comment]: Pagination-aware list of comments on the photo.
+    :return: tuple[list[Comment], str | None]: The comments and the cursor of the next page, if any.
+    :raises ValueError: If the cursor is malformed.
     """
-    sql = (select(Comment)
-           # .options(selectinload(Comment.user))
-           .filter(Comment.photo_id == photo_id)
-           .offset(offset)
-           .limit(limit))
-    comments = await db.execute(sql)
-    result = comments.scalars().all()
-    return result
+    return await _get_comments_page(Comment.photo_id == photo_id, limit, cursor, db)
 
 
-async def get_user_comments(offset: int, limit: int, user_id: int, db: AsyncSession):
+async def get_user_comments(limit: int, cursor: str | None, user_id: int, db: AsyncSession):
     """
-    Review comments by photo
+    Review comments by user
 
     :param limit: limit of comments
-    :type: int
-    :param offset: offset of comments
-    :type offset: int
-    :param photos_id: The ID of the photo for which to retrieve ratings.
-    :type photos_id: int
+    :type limit: int
+    :param cursor: cursor returned with the previous page, or None for the first page
+    :type cursor: str | None
+    :param user_id: The ID of the user whose comments to retrieve.
+    :type user_id: int
     :param db: The database session.
     :type db: AsyncSession
-    :return: A list of comment objects.
-    :rtype: list[Comment]
+    :return: The comments, oldest first, and the cursor of the next page, if any.
+    :rtype: tuple[list[Comment], str | None]
+    :raises ValueError: If the cursor is malformed.
     """
-    sql = (select(Comment)
-           # .options(selectinload(Comment.user))
-           .filter(Comment.user_id == user_id)
-           .offset(offset)
-           .limit(limit))
-    comments = await db.execute(sql)
-    result = comments.scalars().all()
-    return result
+    return await _get_comments_page(Comment.user_id == user_id, limit, cursor, db)
@@ -0,0 +1,130 @@
+import logging
+
+from typing import Iterable
+
+from sqlalchemy import exc, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Comment, Counter, Photo, photo_tags
+
+logger = logging.getLogger(__name__)
+
+# What each counter scope counts, grouped by the counted entity.
+SOURCES = {
+    Counter.PHOTO_COMMENTS: select(Comment.photo_id.label("entity_id"), func.count().label("value"))
+    .filter(Comment.photo_id.isnot(None)).group_by(Comment.photo_id),
+    Counter.USER_COMMENTS: select(Comment.user_id.label("entity_id"), func.count().label("value"))
+    .filter(Comment.user_id.isnot(None)).group_by(Comment.user_id),
+    Counter.USER_PHOTOS: select(Photo.user_id.label("entity_id"), func.count().label("value"))
+    .filter(Photo.user_id.isnot(None)).group_by(Photo.user_id),
+    Counter.TAG_PHOTOS: select(photo_tags.c.tag_id.label("entity_id"), func.count().label("value"))
+    .group_by(photo_tags.c.tag_id),
+}
+
+
+async def bump(changes: dict[tuple[str, int], int], db: AsyncSession) -> None:
+    """
+    Apply counter deltas in the caller's transaction, in a single upsert.
+
+    The caller commits; the counters change atomically with the rows they count.
+
+    :param changes: Deltas keyed by ``(scope, entity_id)``.
+    :type changes: dict[tuple[str, int], int]
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    values = [
+        {"scope": scope, "entity_id": entity_id, "value": delta}
+        for (scope, entity_id), delta in sorted(changes.items()) if delta and entity_id is not None
+    ]
+    if not values:
+        return
+    # Sorted, so concurrent transactions lock the counter rows in the same order.
+    statement = insert(Counter).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Counter.scope, Counter.entity_id],
+        set_={"value": Counter.value + statement.excluded.value},
+    )
+    await db.execute(statement)
+
+
+async def get_counts(scope: str, entity_ids: Iterable[int], db: AsyncSession) -> dict[int, int]:
+    """
+    Read counters by primary key.
+
+    :param scope: The counter scope, e.g. ``Counter.USER_PHOTOS``.
+    :type scope: str
+    :param entity_ids: The counted entities.
+    :type entity_ids: Iterable[int]
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The count of every entity, 0 for those without a counter.
+    :rtype: dict[int, int]
+    """
+    counts = dict.fromkeys(entity_ids, 0)
+    if counts:
+        rows = await db.execute(
+            select(Counter.entity_id, Counter.value).filter(Counter.scope == scope, Counter.entity_id.in_(counts))
+        )
+        counts.update({entity_id: value for entity_id, value in rows})
+    return counts
+
+
+async def reconcile_scope(scope: str, db: AsyncSession) -> int:
+    """
+    Recount one counter scope and fix the counters that drifted.
+
+    On PostgreSQL the recount runs in a ``REPEATABLE READ`` transaction, so a
+    concurrent bump makes it fail with a serialization error instead of being
+    overwritten by a stale count.
+
+    :param scope: The counter scope.
+    :type scope: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The number of counters fixed.
+    :rtype: int
+    """
+    if db.bind.dialect.name == "postgresql":
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    actual = SOURCES[scope].subquery()
+    upsert = insert(Counter).from_select(
+        ["scope", "entity_id", "value"],
+        # The WHERE is always true; SQLite needs one before ON CONFLICT in INSERT ... SELECT.
+        select(literal(scope), actual.c.entity_id, actual.c.value).where(actual.c.value > 0),
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[Counter.scope, Counter.entity_id],
+        set_={"value": upsert.excluded.value},
+        where=Counter.value != upsert.excluded.value,
+    )
+    fixed = (await db.execute(upsert)).rowcount
+    stale = (
+        update(Counter)
+        .where(Counter.scope == scope, Counter.value != 0, Counter.entity_id.not_in(select(actual.c.entity_id)))
+        .values(value=0)
+    )
+    fixed += (await db.execute(stale)).rowcount
+    await db.commit()
+    return fixed
+
+
+async def reconcile(db: AsyncSession) -> dict[str, int | None]:
+    """
+    Recount every counter scope, each in its own transaction.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The number of counters fixed per scope, None where the recount lost a race and was skipped.
+    :rtype: dict[str, int | None]
+    """
+    result = {}
+    for scope in SOURCES:
+        try:
+            result[scope] = await reconcile_scope(scope, db)
+        except exc.DBAPIError as err:
+            logger.error("Reconciling %s counters failed: %s", scope, err)
+            await db.rollback()
+            result[scope] = None
+    return result
@@ -0,0 +1,36 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(*values) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor.
+
+    :param values: JSON-serializable sort key values, in ``ORDER BY`` order.
+    :return: The cursor to pass back for the next page.
+    :rtype: str
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """
+    Decode a cursor produced by :func:`encode_cursor`.
+
+    :param cursor: The opaque cursor.
+    :type cursor: str
+    :param size: The number of sort key values the cursor must hold.
+    :type size: int
+    :raises ValueError: If the cursor is malformed.
+    :return: The sort key values.
+    :rtype: list
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
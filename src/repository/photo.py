@@ -1,72 +1,305 @@
 from typing import List
 
 from fastapi import UploadFile
-from sqlalchemy import select
+from sqlalchemy import delete, exists, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.database.models import Photo, User
-from src.repository.tags import create_tag
-from src.schemas import ImageTagModel
+from sqlalchemy.orm import selectinload
+from src.database.models import Comment, Counter, Photo, PhotoBlob, TransformPhotos, User, photo_tags
+from src.repository.counters import bump
+from src.repository.pagination import decode_cursor, encode_cursor
+from src.repository.search import matches
+from src.repository.tags import create_tag, get_tag_ids
+from src.services.response_cache import response_cache
+from src.schemas import ImageTagModel, PhotoBase
+from src.services.storage import StagedObject, blob_key, stage_upload, storage_backend
 from datetime import datetime
 
+
+def photo_query():
+    """
+    Select photos together with everything ``PhotoModels`` serializes.
+
+    Tags are loaded with one extra ``SELECT ... IN`` for the whole result instead of a
+    lazy load per photo, which ``AsyncSession`` cannot do implicitly anyway.
+    """
+    return select(Photo).options(selectinload(Photo.tags))
+
+
+async def _acquire_blob(staged: StagedObject | None, content_hash: str, suffix: str, user_id: int,
+                        db: AsyncSession):
+    # Upsert the blob row: a new hash is inserted with one reference, a known one
+    # gains a reference. The row stays locked until the caller commits, so a
+    # concurrent upload or removal of the same contents waits for us.
+    # Without a file, only contents the user already has a photo of can be reused;
+    # otherwise a hash alone would give access to, or reveal, anyone's upload.
+    if staged is not None:
+        statement = (
+            insert(PhotoBlob)
+            .values(content_hash=content_hash, storage_key=blob_key(content_hash, suffix),
+                    size=staged.size, ref_count=1)
+            .on_conflict_do_update(index_elements=[PhotoBlob.content_hash],
+                                   set_={"ref_count": PhotoBlob.ref_count + 1})
+        )
+    else:
+        statement = (
+            update(PhotoBlob)
+            .where(PhotoBlob.content_hash == content_hash,
+                   exists().where(Photo.content_hash == content_hash, Photo.user_id == user_id))
+            .values(ref_count=PhotoBlob.ref_count + 1)
+        )
+    result = await db.execute(statement.returning(PhotoBlob.storage_key, PhotoBlob.ref_count))
+    return result.one_or_none()
+
+
 async def add_photo(
     description: str,
     tags: str,
-    file: UploadFile,
+    file: UploadFile | None,
     db: AsyncSession,
     current_user: User,
-) -> Photo:
+    content_hash: str | None = None,
+) -> Photo | None:
+    """
+    Add a photo, sharing the stored file with identical earlier uploads.
 
+    The file is hashed while it streams into storage. If its contents are already
+    stored, the new copy is dropped and the photo points at the existing blob.
+    Without a file, the ``content_hash`` of a file the user uploaded before makes the
+    upload metadata-only.
+
+    :param description: The photo description.
+    :type description: str
+    :param tags: Comma-separated tag names.
+    :type tags: str
+    :param file: The uploaded file, or None for a metadata-only upload.
+    :type file: UploadFile | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The uploading user.
+    :type current_user: User
+    :param content_hash: The SHA-256 of a file the user uploaded before, used when no file is sent.
+    :type content_hash: str | None
+    :return: The new photo, or None if no file was sent and the user has no photo with that content.
+    :rtype: Photo | None
+    """
     photo = Photo(
         description=description,
         created_at=datetime.now(),
         user_id=current_user.id,
+        tags=[],
     )
     # Додаємо теги до фото
     if tags:
         result = []
         tags = tags.split(",")
         for tag in tags:
-            tag.strip()
+            tag = tag.strip()
             current_tag = ImageTagModel(tag_name=tag)
             result.append(current_tag)
         photo.tags = await create_tag(result, db)
 
-    db.add(photo)
-    await db.flush()
-    await db.refresh(photo)
+    staged = await stage_upload(file) if file is not None else None
+    created = False
+    try:
+        if staged is not None:
+            content_hash = staged.sha256
+        blob = await _acquire_blob(staged, content_hash, staged.suffix if staged else "", current_user.id, db)
+        if blob is None:
+            return None
+        storage_key, ref_count = blob
+        created = staged is not None and ref_count == 1
+        if created:
+            await staged.commit(storage_key)
+        elif staged is not None:
+            await staged.abort()
+        staged = None
+
+        photo.url = storage_backend.url(storage_key)
+        photo.storage_key = storage_key
+        photo.content_hash = content_hash
+        photo.comments_count = 0
+        db.add(photo)
+        changes = {(Counter.TAG_PHOTOS, tag.id): 1 for tag in photo.tags}
+        changes[Counter.USER_PHOTOS, current_user.id] = 1
+        await bump(changes, db)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        if staged is not None:
+            await staged.abort()
+        if created:
+            await storage_backend.delete(storage_key)
+        raise
+    await response_cache.invalidate(f"user:{current_user.id}")
+    # Every attribute the response needs is already set, so no refresh round trip.
     return photo
 
 
-async def remove_photo(photo_id: int, current_user: User, db: AsyncSession) -> Photo:
-    async with db.begin():
-        photo = await db.execute(select(Photo).filter(Photo.id == photo_id, Photo.user_id == current_user.id))
-        photo = photo.scalar_one_or_none()
+async def _release_blob(content_hash: str, db: AsyncSession) -> str | None:
+    # Drop one reference; the row and its file go with the last one.
+    result = await db.execute(
+        update(PhotoBlob)
+        .where(PhotoBlob.content_hash == content_hash)
+        .values(ref_count=PhotoBlob.ref_count - 1)
+        .returning(PhotoBlob.storage_key, PhotoBlob.ref_count)
+    )
+    storage_key, ref_count = result.one()
+    if ref_count > 0:
+        return None
+    await db.execute(delete(PhotoBlob).where(PhotoBlob.content_hash == content_hash))
+    return storage_key
 
-        if not photo:
-            return None
 
-        await db.delete(photo)
+async def remove_photo(photo_id: int, current_user: User, db: AsyncSession) -> Photo:
+    photo = await db.execute(photo_query().filter(Photo.id == photo_id, Photo.user_id == current_user.id))
+    photo = photo.scalar_one_or_none()
+
+    if not photo:
+        return None
 
+    derivatives = await db.execute(
+        delete(TransformPhotos).where(TransformPhotos.photo_id == photo.id).returning(TransformPhotos.storage_key)
+    )
+    derivative_keys = [key for key in derivatives.scalars() if key]
+    commenters = await db.execute(
+        select(Comment.user_id, func.count()).filter(Comment.photo_id == photo.id).group_by(Comment.user_id)
+    )
+    changes = {(Counter.USER_COMMENTS, user_id): -count for user_id, count in commenters.tuples()}
+    affected = [f"photo:{photo.id}", *(f"user:{user_id}" for _, user_id in changes)]
+    changes.update({(Counter.TAG_PHOTOS, tag.id): -1 for tag in photo.tags})
+    changes[Counter.USER_PHOTOS, photo.user_id] = -1
+    affected.append(f"user:{photo.user_id}")
+    await bump(changes, db)
+    await db.execute(delete(Counter).where(Counter.scope == Counter.PHOTO_COMMENTS, Counter.entity_id == photo.id))
+    await db.delete(photo)
+    if photo.content_hash:
+        await db.flush()
+        released_key = await _release_blob(photo.content_hash, db)
+        if released_key:
+            # Deleted once committed; an upload of the same contents after that
+            # stores a new blob under a key of its own.
+            derivative_keys.append(released_key)
+    elif photo.storage_key:
+        derivative_keys.append(photo.storage_key)
+    await db.commit()
+    await response_cache.invalidate(*affected)
+    for key in derivative_keys:
+        await storage_backend.delete(key)
     return photo
 
 
-async def update_description(photo_id: int, body: Photo, current_user: User, db: AsyncSession) -> Photo:
+async def update_description(photo_id: int, body: PhotoBase, current_user: User, db: AsyncSession) -> Photo:
     # Логіка для оновлення опису фото за ідентифікатором
-    photo = await db.execute(select(Photo).filter(Photo.id == photo_id, Photo.user_id == current_user.id))
+    photo = await db.execute(photo_query().filter(Photo.id == photo_id, Photo.user_id == current_user.id))
     photo = photo.scalar_one_or_none()
 
     if not photo:
         return None
 
-    for key, value in body.dict().items():
-        setattr(photo, key, value)
+    old_tags = {tag.id for tag in photo.tags}
+    photo.description = body.description
+    photo.tags = await create_tag(body.tags, db)
+    new_tags = {tag.id for tag in photo.tags}
 
+    changes = {(Counter.TAG_PHOTOS, tag_id): -1 for tag_id in old_tags - new_tags}
+    changes.update({(Counter.TAG_PHOTOS, tag_id): 1 for tag_id in new_tags - old_tags})
+    await bump(changes, db)
     await db.commit()
-    await db.refresh(photo)
+    await response_cache.invalidate(f"photo:{photo.id}")
     return photo
 
 
 async def see_photo(photo_id: int, current_user: User, db: AsyncSession) -> Photo:
     # Логіка для отримання фото за ідентифікатором
-    photo = await db.execute(select(Photo).filter(Photo.id == photo_id))
-    return photo.scalar_one_or_none()
\ No newline at end of file
+    photo = await db.execute(photo_query().filter(Photo.id == photo_id))
+    return photo.scalar_one_or_none()
+
+
+async def get_transformed_photo(photo_id: int, spec: str, db: AsyncSession) -> TransformPhotos | None:
+    """
+    Get a pre-computed derivative of a photo.
+
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param spec: The canonical transformation spec, e.g. ``200x200-fill``.
+    :type spec: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The derivative, or None if it has not been rendered (yet).
+    :rtype: TransformPhotos | None
+    """
+    derivative = await db.execute(
+        select(TransformPhotos).where(TransformPhotos.photo_id == photo_id, TransformPhotos.spec == spec)
+    )
+    return derivative.scalar_one_or_none()
+
+
+async def search_photos(
+    tags: List[str],
+    match_all: bool,
+    keywords: str | None,
+    newest_first: bool,
+    limit: int,
+    cursor: str | None,
+    db: AsyncSession,
+):
+    """
+    Search photos by tags and description keywords, with keyset pagination by date.
+
+    Each tag filter is an ``EXISTS`` probe on ``photo_tags``: the primary key
+    ``(photo_id, tag_id)`` serves it while walking photos in date order, and the
+    ``(tag_id, photo_id)`` index lets the planner start from a rare tag instead.
+
+    :param tags: Tag names to filter by.
+    :type tags: List[str]
+    :param match_all: Whether a photo needs all the tags (AND) or any of them (OR).
+    :type match_all: bool
+    :param keywords: A full-text query the description must match.
+    :type keywords: str | None
+    :param newest_first: Sort newest first, otherwise oldest first.
+    :type newest_first: bool
+    :param limit: Maximum number of photos to return.
+    :type limit: int
+    :param cursor: Cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :raises ValueError: If the cursor is malformed.
+    :return: The photos and the cursor of the next page, if any.
+    :rtype: tuple[list[Photo], str | None]
+    """
+    sql = photo_query()
+    names = list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+    if names:
+        ids = await get_tag_ids(names, db)
+        if not ids or (match_all and len(ids) < len(names)):
+            return [], None
+        if match_all:
+            for tag_id in ids.values():
+                sql = sql.filter(exists().where(photo_tags.c.photo_id == Photo.id, photo_tags.c.tag_id == tag_id))
+        else:
+            sql = sql.filter(
+                exists().where(photo_tags.c.photo_id == Photo.id, photo_tags.c.tag_id.in_(ids.values()))
+            )
+    if keywords and keywords.strip():
+        sql = sql.filter(matches(Photo, keywords))
+
+    key = tuple_(Photo.created_at, Photo.id)
+    if cursor:
+        created_at, photo_id = decode_cursor(cursor, 2)
+        if not isinstance(created_at, str) or not isinstance(photo_id, int):
+            raise ValueError("Invalid cursor")
+        bound = (datetime.fromisoformat(created_at), photo_id)
+        sql = sql.filter(key < bound if newest_first else key > bound)
+    if newest_first:
+        sql = sql.order_by(Photo.created_at.desc(), Photo.id.desc())
+    else:
+        sql = sql.order_by(Photo.created_at, Photo.id)
+    photos = (await db.execute(sql.limit(limit + 1))).scalars().all()
+
+    next_cursor = None
+    if len(photos) > limit:
+        photos = photos[:limit]
+        next_cursor = encode_cursor(photos[-1].created_at.isoformat(), photos[-1].id)
+    return photos, next_cursor
@@ -0,0 +1,100 @@
+from sqlalchemy import Float, cast, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from src.database.models import Comment, Photo
+from src.repository.pagination import decode_cursor, encode_cursor
+
+# The text search configuration of the search_vector triggers. "simple" neither
+# stems nor drops stop words, so it works the same for every language.
+SEARCH_CONFIG = "simple"
+HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+
+def text_query(query: str):
+    """
+    Parse a user query (quoted phrases, ``or``, ``-word``) into a tsquery.
+
+    :param query: The search query.
+    :type query: str
+    :return: The tsquery expression.
+    """
+    return func.websearch_to_tsquery(SEARCH_CONFIG, query)
+
+
+def matches(model, query: str):
+    """
+    The full-text match condition of a searchable model, served by its GIN index.
+
+    :param model: ``Photo`` or ``Comment``.
+    :param query: The search query.
+    :type query: str
+    """
+    return model.search_vector.op("@@")(text_query(query))
+
+
+async def _search(model, column, query: str, limit: int, cursor: str | None, db: AsyncSession, options=()):
+    tsquery = text_query(query)
+    rank = cast(func.ts_rank_cd(model.search_vector, tsquery), Float).label("rank")
+
+    # Rank and page on ids first; the costly snippets are built for the page only.
+    page = select(model.id, rank).filter(matches(model, query))
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor, 2)
+        if not isinstance(last_rank, (int, float)) or not isinstance(last_id, int):
+            raise ValueError("Invalid cursor")
+        page = page.filter(tuple_(rank, model.id) < (last_rank, last_id))
+    page = page.order_by(rank.desc(), model.id.desc()).limit(limit + 1).subquery()
+
+    snippet = func.ts_headline(SEARCH_CONFIG, column, tsquery, HEADLINE_OPTIONS).label("snippet")
+    sql = (
+        select(model, page.c.rank, snippet)
+        .join(page, model.id == page.c.id)
+        .options(*options)
+        .order_by(page.c.rank.desc(), page.c.id.desc())
+    )
+    rows = (await db.execute(sql)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1][0].id)
+    return [{"rank": row.rank, "snippet": row.snippet, "item": row[0]} for row in rows], next_cursor
+
+
+async def search_photos(query: str, limit: int, cursor: str | None, db: AsyncSession):
+    """
+    Full-text search over photo descriptions, best matches first.
+
+    :param query: The search query, in web search syntax.
+    :type query: str
+    :param limit: Maximum number of photos to return.
+    :type limit: int
+    :param cursor: Cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :raises ValueError: If the cursor is malformed.
+    :return: The hits (``item``, ``rank``, highlighted ``snippet``) and the cursor of the next page, if any.
+    :rtype: tuple[list[dict], str | None]
+    """
+    return await _search(Photo, Photo.description, query, limit, cursor, db, options=(selectinload(Photo.tags),))
+
+
+async def search_comments(query: str, limit: int, cursor: str | None, db: AsyncSession):
+    """
+    Full-text search over comments, best matches first.
+
+    :param query: The search query, in web search syntax.
+    :type query: str
+    :param limit: Maximum number of comments to return.
+    :type limit: int
+    :param cursor: Cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :raises ValueError: If the cursor is malformed.
+    :return: The hits (``item``, ``rank``, highlighted ``snippet``) and the cursor of the next page, if any.
+    :rtype: tuple[list[dict], str | None]
+    """
+    return await _search(Comment, Comment.text, query, limit, cursor, db)
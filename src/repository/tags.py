@@ -1,9 +1,17 @@
 from typing import List
 
-from sqlalchemy import select
+from sqlalchemy import false, literal_column, select, true, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.conf.config import settings
 from src.database.models import Tag
 from src.schemas import ImageTagModel
+from src.services.cache import LRUCache, cache_invalidator
+from src.services.response_cache import response_cache
+
+# tag_name -> id, for resolving tag filters without a lookup per request. Renamed
+# and removed names are dropped in every worker.
+tag_ids = cache_invalidator.register("tag_ids", LRUCache(settings.tag_cache_size, settings.tag_cache_ttl))
 
 
 async def get_tags(skip: int, limit: int, db: AsyncSession) -> List[Tag]:
@@ -19,26 +27,76 @@ async def get_tags_by_list_values(
         await db.execute(select(Tag).filter(Tag.tag_name.in_([value.tag_name for value in values])))
     ).scalars().all()
 
-async def create_tag(values: List[ImageTagModel], db: AsyncSession) -> Tag:
-    bd_tags = await get_tags_by_list_values(values, db)
-    for value in values:
-        if not any([tag.tag_name == value.tag_name for tag in bd_tags]):
-            new_tag = Tag(tag_name=value.tag_name)
-            db.add(new_tag)
-            await db.commit()
-    return await get_tags_by_list_values(values, db)
+async def get_tag_ids(names: List[str], db: AsyncSession) -> dict[str, int]:
+    """
+    Resolve tag names to IDs, through the in-process tag cache.
+
+    :param names: The tag names.
+    :type names: List[str]
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The IDs of the tags that exist, by name.
+    :rtype: dict[str, int]
+    """
+    found = {}
+    missing = []
+    for name in names:
+        tag_id = tag_ids.get(name)
+        if tag_id is None:
+            missing.append(name)
+        else:
+            found[name] = tag_id
+    if missing:
+        for name, tag_id in await db.execute(select(Tag.tag_name, Tag.id).filter(Tag.tag_name.in_(missing))):
+            tag_ids.set(name, tag_id)
+            found[name] = tag_id
+    return found
+
+async def create_tag(values: List[ImageTagModel], db: AsyncSession) -> List[Tag]:
+    # Get-or-create every tag in one statement: the CTE inserts the missing names
+    # and the union returns them together with the ones that already exist, each
+    # flagged with whether it was inserted. Only an insert changes the tag listing.
+    names = list(dict.fromkeys(value.tag_name.strip() for value in values if value.tag_name.strip()))
+    if not names:
+        return []
+    inserted = (
+        insert(Tag)
+        .values([{"tag_name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=[Tag.tag_name])
+        .returning(Tag.id, Tag.tag_name)
+        .cte("inserted")
+    )
+    statement = union_all(
+        select(inserted.c.id, inserted.c.tag_name, true().label("inserted")),
+        select(Tag.id, Tag.tag_name, false().label("inserted")).filter(Tag.tag_name.in_(names)),
+    )
+    rows = (await db.execute(select(Tag, literal_column("inserted")).from_statement(statement))).all()
+    tags = [tag for tag, _ in rows]
+    created = any(was_inserted for _, was_inserted in rows)
+    if len(tags) < len(names):
+        # A concurrent upload committed some of the names after our snapshot was taken.
+        tags = (await db.execute(select(Tag).filter(Tag.tag_name.in_(names)))).scalars().all()
+    if created:
+        await db.commit()
+        await response_cache.invalidate("tags")
+    return tags
 
 async def update_tag(tag_id: int, body: ImageTagModel, db: AsyncSession) -> Tag | None:
     tag = await get_tag_by_id(tag_id, db)
     if tag:
+        old_name = tag.tag_name
         tag.tag_name = body.tag_name
         await db.commit()
         await db.refresh(tag)
+        await cache_invalidator.invalidate("tag_ids", old_name, tag.tag_name)
+        await response_cache.invalidate("tags", f"tag:{tag.id}")
     return tag
 
 async def remove_tag(tag_id: int, db: AsyncSession) -> Tag | None:
     tag = await get_tag_by_id(tag_id, db)
     if tag:
-        db.delete(tag)
+        await db.delete(tag)
         await db.commit()
+        await cache_invalidator.invalidate("tag_ids", tag.tag_name)
+        await response_cache.invalidate("tags", f"tag:{tag.id}")
     return tag
@@ -1,9 +1,117 @@
+import logging
+
+from typing import Iterable
+
+import redis.asyncio as redis
+
 from src.schemas import UpdateUserProfileModel
-from libgravatar import Gravatar
-from src.database.models import User
+from src.conf.config import settings
+from src.database.models import SystemFlag, User
 from src.schemas import UserModel
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from src.services import principal as principal_codec
+from src.services.avatar import avatar_service
+from src.services.cache import LRUCache, cache_invalidator, redis_client
+from src.services.principal import Principal
+from src.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# A user is cached as a Principal under every key it is looked up by:
+# user:id:{id}, user:email:{email} and user:username:{username}. Each worker keeps
+# a short-lived copy in front of Redis, dropped in every worker when the user changes.
+LOOKUP_FIELDS = ("id", "email", "username")
+local_users = cache_invalidator.register("users", LRUCache(settings.user_cache_size, settings.user_cache_ttl))
+
+# Set once this process has seen the first-admin flag taken; from then on a
+# signup is a single INSERT.
+first_admin_claimed = False
+
+
+def _cache_key(field: str, value) -> str:
+    return f"user:{field}:{value}"
+
+
+def _cache_keys(principal: Principal) -> list[str]:
+    return [_cache_key(field, getattr(principal, field)) for field in LOOKUP_FIELDS]
+
+
+async def _store(principal: Principal, stale: Iterable[str] = (), overwrite: bool = True) -> None:
+    keys = _cache_keys(principal)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.delete(*stale)
+            for key in keys:
+                # Readers never overwrite, so a miss racing a write cannot bring back
+                # the row it read before the write committed.
+                pipe.set(key, principal_codec.dumps(principal), ex=settings.user_record_ttl, nx=not overwrite)
+            await pipe.execute()
+    except redis.RedisError as err:
+        logger.warning("Caching user failed: %s", err)
+
+
+async def get_principal(field: str, value, db: AsyncSession) -> Principal | None:
+    """
+    Look up a user by id, email or username through the user cache.
+
+    :param field: The field to look the user up by, one of ``id``, ``email`` or ``username``.
+    :type field: str
+    :param value: The value of the field.
+    :param db: The database session, used on a cache miss.
+    :type db: AsyncSession
+    :raises ValueError: If the field is not a lookup field.
+    :return: The user, or None if not found.
+    :rtype: Principal | None
+    """
+    if field not in LOOKUP_FIELDS:
+        raise ValueError(f"Users cannot be looked up by {field}")
+    key = _cache_key(field, value)
+    principal = local_users.get(key)
+    if principal is not None:
+        return principal
+
+    try:
+        record = await redis_client.get(key)
+    except redis.RedisError as err:
+        logger.warning("Reading cached user failed: %s", err)
+        record = None
+    principal = principal_codec.loads(record) if record is not None else None
+    if principal is None:
+        user = (await db.execute(select(User).where(getattr(User, field) == value))).scalars().first()
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        await _store(principal, overwrite=False)
+    local_users.set(key, principal)
+    return principal
+
+
+async def refresh_user(user: User, previous: Principal | None = None) -> Principal:
+    """
+    Write a committed change of a user through to the user cache.
+
+    The entries in Redis are replaced rather than dropped; those under an email or
+    username the user no longer has are deleted. Every worker drops its local copy
+    of all of them, and cached responses showing the user are invalidated.
+
+    :param user: The updated user.
+    :type user: User
+    :param previous: The user as it was before the change, if its email or username may have changed.
+    :type previous: Principal | None
+    :return: The cached user.
+    :rtype: Principal
+    """
+    principal = Principal.from_user(user)
+    keys = _cache_keys(principal)
+    stale = set(_cache_keys(previous)) - set(keys) if previous else set()
+    await _store(principal, stale)
+    await cache_invalidator.invalidate("users", *keys, *stale)
+    await response_cache.invalidate(f"user:{user.id}")
+    return principal
 
 
 async def get_user_by_username(username: str, db: AsyncSession) -> User:
@@ -49,25 +157,26 @@ async def create_user(body: UserModel, db: AsyncSession) -> User:
     :return: The newly created user.
     :rtype: User
     """
-    result = await db.execute(select(User).limit(1))
-    existing_user = result.scalar()
-
-    if existing_user is None:   # First user is an admin
-        role_id = 1
-    else:
-        role_id = 3
-
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        print(e)
-
-    new_user = User(**body.dict(), role_id=role_id, avatar=avatar)
+    global first_admin_claimed
+    claimed = False
+    if not first_admin_claimed:
+        # The first user is an admin. Claiming the flag in the same transaction
+        # makes exactly one signup win, and a failed signup gives the claim back.
+        claim = (
+            insert(SystemFlag).values(name=SystemFlag.FIRST_ADMIN)
+            .on_conflict_do_nothing(index_elements=[SystemFlag.name])
+            .returning(SystemFlag.name)
+        )
+        claimed = (await db.execute(claim)).scalar() is not None
+    role_id = 1 if claimed else 3
+
+    # Only the URL is derived here; whether a Gravatar exists is checked later, see
+    # replace_avatar.
+    new_user = User(**body.dict(), role_id=role_id, avatar=avatar_service.url(body.email))
     db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
+    first_admin_claimed = True
+    # The id and created_at come back with the INSERT, so no refresh is needed.
     return new_user
 
 
@@ -114,10 +223,12 @@ async def update_user_email(user: User, new_email: str, db: AsyncSession):
     :param db: Database session.
     :type db: AsyncSession
     """
+    previous = Principal.from_user(user)
     user.email = new_email
     user.confirmed = False
 
     await db.commit()
+    await refresh_user(user, previous)
 
 
 async def confirmed_email(email: str, db: AsyncSession) -> None:
@@ -133,6 +244,7 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
     await db.commit()
+    await refresh_user(user)
 
 
 async def update_avatar(email, url: str, db: AsyncSession) -> User:
@@ -151,6 +263,36 @@ async def update_avatar(email, url: str, db: AsyncSession) -> User:
     user = await get_user_by_email(email, db)
     user.avatar = url
     await db.commit()
+    await refresh_user(user)
+    return user
+
+
+async def replace_avatar(email: str, expected: str, url: str, db: AsyncSession) -> User | None:
+    """
+    Replaces the avatar URL of a user if it is still the expected one.
+
+    Lets a late background update lose to an avatar the user uploaded meanwhile.
+
+    :param email: The email address of the user to update.
+    :type email: str
+    :param expected: The avatar URL the user must still have.
+    :type expected: str
+    :param url: The new avatar URL for the user.
+    :type url: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The updated user, or None if the avatar had changed.
+    :rtype: User | None
+    """
+    stmt = (
+        update(User).where(User.email == email, User.avatar == expected)
+        .values(avatar=url).returning(User)
+        .execution_options(synchronize_session=False)
+    )
+    user = (await db.execute(stmt)).scalar_one_or_none()
+    await db.commit()
+    if user is not None:
+        await refresh_user(user)
     return user
 
 
@@ -168,6 +310,7 @@ async def update_user_profile(email: str, profile_data: UpdateUserProfileModel,
     :rtype: User
     """
     user = await get_user_by_email(email, db)
+    previous = Principal.from_user(user)
 
     if profile_data.username:
         user.username = profile_data.username
@@ -179,6 +322,7 @@ async def update_user_profile(email: str, profile_data: UpdateUserProfileModel,
         user.last_name = profile_data.last_name
 
     await db.commit()
+    await refresh_user(user, previous)
 
     return user
 
@@ -200,6 +344,7 @@ async def update_user_role(username: str, role_id: int, db: AsyncSession) -> Use
     if user:
         user.role_id = role_id
         await db.commit()
+        await refresh_user(user)
 
     return user
 
@@ -219,5 +364,6 @@ async def update_user_ban(username: str, db: AsyncSession) -> User:
     if user:
         user.ban = not user.ban
         await db.commit()
+        await refresh_user(user)
 
     return user
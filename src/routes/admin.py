@@ -0,0 +1,28 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, status
+
+from src.schemas import SlowQueryResponse
+from src.services.auth_admin import is_admin
+from src.services.query_profiler import query_profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(is_admin)])
+
+
+@router.get("/slow-queries", response_model=List[SlowQueryResponse])
+async def get_slow_queries():
+    """
+    List the most recent slow statements, newest first.
+
+    :return: The recorded statements, with their callers and captured plans.
+    :rtype: List[SlowQueryResponse]
+    """
+    return list(reversed(query_profiler.entries))
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    """
+    Forget the recorded slow statements.
+    """
+    query_profiler.clear()
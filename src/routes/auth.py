@@ -2,20 +2,38 @@ from fastapi import APIRouter, Depends, Form, HTTPException, status
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from jose import jwt
 
-from src.database.db import get_db
+from src.database.db import get_db, sessionmanager
 from src.schemas import UserBan, UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
 from src.services.auth import auth_service
+from src.services.avatar import avatar_service
 from src.services.email import send_email
 from src.services.auth_admin import is_admin
+from src.services.rate_limit import rate_limit
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
-@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def resolve_avatar(email: str) -> None:
+    """
+    Replace the signup avatar with the default image if the address has no Gravatar.
+
+    Runs after the signup response, on a session of its own, so the probe holds no
+    connection.
+
+    :param email: The email address of the new user.
+    :type email: str
+    """
+    url = await avatar_service.resolve(email)
+    if url is not None:
+        async with sessionmanager.session() as db:
+            await repository_users.replace_avatar(email, avatar_service.url(email), url, db)
+
+
+@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("signup", times=5, seconds=60, per="ip"))])
 async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Register a new user.
@@ -35,14 +53,16 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
     background_tasks.add_task(
         send_email, new_user.email, new_user.username, request.base_url)
+    background_tasks.add_task(resolve_avatar, new_user.email)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
-@router.post("/login", response_model=TokenModel)
+@router.post("/login", response_model=TokenModel,
+             dependencies=[Depends(rate_limit("login", times=10, seconds=60, per="ip"))])
 async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     print("login")
     """
@@ -62,12 +82,15 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     if not user.confirmed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     if user.ban:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="You have been banned")
+    if new_hash:
+        await repository_users.update_user_password(user, new_hash, db)
 
     # Generate JWT
     access_token = await auth_service.create_access_token(data={"sub": user.email})
@@ -85,11 +108,10 @@ async def logout(token: str = Depends(auth_service.oauth2_scheme)):
     :type token: str
     """
     # Get the expiration time of the access_token
-    payload = jwt.decode(token, auth_service.SECRET_KEY,
-                         algorithms=[auth_service.ALGORITHM])
+    payload = auth_service.decode_access_token(token)
     expires_delta = payload["exp"] - payload["iat"]
 
-    auth_service.add_to_blacklist(token, expires_delta)
+    await auth_service.add_to_blacklist(token, expires_delta)
     return {"message": "Successfully logged out"}
 
 
@@ -143,7 +165,7 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     return {"message": "Email confirmed"}
 
 
-@router.post('/request_email')
+@router.post('/request_email', dependencies=[Depends(rate_limit("request_email", times=5, seconds=60, per="ip"))])
 async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
                         db: AsyncSession = Depends(get_db)):
     """
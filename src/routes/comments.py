@@ -1,14 +1,15 @@
-from typing import List
+from typing import Optional
 
 import src.repository.comments as repository_comments
-from src.database.db import get_db
-from fastapi import APIRouter, Depends, status, HTTPException, Form
+from src.database.db import get_db, get_read_db
+from fastapi import APIRouter, Depends, status, HTTPException, Form, Query
 
 from src.services.auth import auth_service
+from src.services.rate_limit import rate_limit
 
 from src.database.models import User
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.schemas import CommentSchema, CommentList, CommentUpdateSchems, CommentRemoveSchema, CommentUserList
+from src.schemas import CommentSchema, CommentList, CommentUpdateSchems, CommentRemoveSchema
 
 THE_MANY_REQUESTS = "No more than 10 requests in minute"
 DELETED_SUCCESSFUL = "You deleted SUCCESSFUL"
@@ -18,7 +19,7 @@ router = APIRouter(prefix="/comments", tags=['Comments'])
 
 @router.post("/publish", status_code=status.HTTP_201_CREATED,
              description=THE_MANY_REQUESTS,
-             # dependencies=[Depends(Ratelimiter(times=10, seconds=60))],
+             dependencies=[Depends(rate_limit("post_comment", times=10, seconds=60))],
              response_model=CommentSchema
              )
 async def post_comment(
@@ -56,7 +57,8 @@ async def post_comment(
 
 @router.patch(
     "/update",
-    status_code=status.HTTP_200_OK, response_model=CommentUpdateSchems
+    status_code=status.HTTP_200_OK, response_model=CommentUpdateSchems,
+    dependencies=[Depends(rate_limit("update_comment", times=10, seconds=60))],
 )
 async def change_comment(
         comment_id: int = Form(...),
@@ -93,7 +95,8 @@ async def change_comment(
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
 
-@router.delete("/delete", response_model=CommentRemoveSchema)
+@router.delete("/delete", response_model=CommentRemoveSchema,
+               dependencies=[Depends(rate_limit("delete_comment", times=10, seconds=60))])
 async def remove_comment(
         comment_id: int = Form(...),
 
@@ -132,64 +135,70 @@ async def remove_comment(
 @router.get("/photos/{photo_id}", response_model=CommentList)
 async def show_photo_comments(
         photo_id: int,
-        limit: int = 0,
-        offset: int = 10,
+        limit: int = Query(10, ge=1, le=100),
+        cursor: Optional[str] = None,
 
         current_user: User = Depends(auth_service.get_current_user),
 
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
 ):
     """
     Retrieve comments for a specific photo.
 
     :param photo_id: The ID of the photo for which comments are to be retrieved.
     :type photo_id: int
-    :param limit: The maximum number of comments to retrieve (default is 0, which retrieves all).
+    :param limit: The maximum number of comments to retrieve (default is 10).
     :type limit: int
-    :param offset: The offset for paginating through comments (default is 10).
-    :type offset: int
+    :param cursor: The next_cursor of the previous page, omitted for the first page.
+    :type cursor: str
     :param current_user: The authenticated user.
     :type current_user: User
     :param db: Database session.
     :type db: AsyncSession
 
-    :return: A dictionary containing the list of comments for the specified photo.
+    :return: A page of comments for the specified photo and the cursor of the next page.
     :rtype: dict
 
-    :raises HTTPException 404: If the photo does not exist.
+    :raises HTTPException 400: If the cursor is malformed.
     """
-    comments = await repository_comments.get_photo_comments(limit, offset, photo_id, db)
-    return {"comments": comments}
+    try:
+        comments, next_cursor = await repository_comments.get_photo_comments(limit, cursor, photo_id, db)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return {"comments": comments, "next_cursor": next_cursor}
 
 
-@router.get("/users/{users_id}", response_model=List[CommentSchema])
+@router.get("/users/{user_id}", response_model=CommentList)
 async def show_user_comments(
         user_id: int,
-        limit: int = 0,
-        offset: int = 10,
+        limit: int = Query(10, ge=1, le=100),
+        cursor: Optional[str] = None,
 
         current_user: User = Depends(auth_service.get_current_user),
 
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
 ):
     """
     Retrieve comments for a specific user.
 
     :param user_id: The ID of the user for whom comments are to be retrieved.
     :type user_id: int
-    :param limit: The maximum number of comments to retrieve (default is 0, which retrieves all).
+    :param limit: The maximum number of comments to retrieve (default is 10).
     :type limit: int
-    :param offset: The offset for paginating through comments (default is 10).
-    :type offset: int
+    :param cursor: The next_cursor of the previous page, omitted for the first page.
+    :type cursor: str
     :param current_user: The authenticated user.
     :type current_user: User
     :param db: Database session.
     :type db: AsyncSession
 
-    :return: A dictionary containing the list of comments for the specified user.
+    :return: A page of comments for the specified user and the cursor of the next page.
     :rtype: dict
 
-    :raises HTTPException 404: If the user does not exist.
+    :raises HTTPException 400: If the cursor is malformed.
     """
-    comments = await repository_comments.get_user_comments(limit, offset, user_id, db)
-    return {"comments": comments}
+    try:
+        comments, next_cursor = await repository_comments.get_user_comments(limit, cursor, user_id, db)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return {"comments": comments, "next_cursor": next_cursor}
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from src.services.metrics import registry
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Expose the metrics in the Prometheus text format.
+
+    :return: The current metrics.
+    :rtype: Response
+    """
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
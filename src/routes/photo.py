@@ -1,36 +1,171 @@
-from typing import List
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Form, status
+import logging
+
+from typing import List, Literal, Optional
+
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Form, Header, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.database.models import User, Photo, Tag
 from src.services.auth import auth_service
 import src.repository.photo as repository_photo
 from src.conf.config import settings
-from src.schemas import PhotoModels, PhotoBase
+from src.schemas import PhotoList, PhotoModels, PhotoBase, TransformPhotoResponse, UploadSessionResponse
+from src.services.rate_limit import rate_limit
+from src.services.response_cache import response_cache
+from src.services.transform import TransformSpec, transform_queue
+from src.services.uploads import resumable_uploads
 
 router = APIRouter(prefix='/photos', tags=["photos"])
+logger = logging.getLogger(__name__)
+
+
+async def _queue_derivatives(photo: Photo) -> None:
+    # The photo is committed by now, so failing here would only make the client
+    # retry and store it twice; without Redis the derivatives wait to be queued again.
+    try:
+        await transform_queue.enqueue(photo.id, photo.storage_key)
+    except redis.RedisError as err:
+        logger.warning("Queueing derivatives of photo %s failed: %s", photo.id, err)
 
 # ...
 
 @router.post(
-    "/new/", response_model=PhotoModels, status_code=status.HTTP_201_CREATED
+    "/new/", response_model=PhotoModels, status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("create_photo", times=30, seconds=60))],
 )
 async def create_photo(
     description: str = Form(),
     tags: str = Form(None),
-    file: UploadFile = File(),
+    file: UploadFile = File(None),
+    content_hash: str = Form(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
-    
-    return await repository_photo.add_photo(
-        description, tags, file, db, current_user
+    """
+    Upload a photo.
+
+    Instead of the file, the SHA-256 ``content_hash`` of a file the user uploaded before
+    may be sent; the new photo then shares the stored file and nothing is transferred.
+    """
+    if file is None and not content_hash:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Either a file or a content hash is required")
+    photo = await repository_photo.add_photo(
+        description, tags, file, db, current_user, content_hash=content_hash
     )
+    if photo is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Content not found, upload the file")
+    await _queue_derivatives(photo)
+    return photo
+
+
+# Declared before /{photo_id} so that "search" is not taken for a photo ID.
+@router.get("/search", response_model=PhotoList)
+async def search_photos(
+    tags: List[str] = Query([]),
+    match: Literal["all", "any"] = "all",
+    q: Optional[str] = None,
+    sort: Literal["newest", "oldest"] = "newest",
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Search photos by tags and description keywords.
+
+    :param tags: Tag names, repeated (``?tags=sea&tags=sun``) or comma-separated.
+    :type tags: List[str]
+    :param match: ``all`` for photos with every tag, ``any`` for photos with at least one.
+    :type match: str
+    :param q: A full-text query on the description, in web search syntax.
+    :type q: str
+    :param sort: ``newest`` or ``oldest`` first.
+    :type sort: str
+    :param limit: The maximum number of photos to return.
+    :type limit: int
+    :param cursor: The next_cursor of the previous page, omitted for the first page.
+    :type cursor: str
+    :return: A page of photos and the cursor of the next page.
+    :rtype: dict
+    :raises HTTPException 400: If the cursor is malformed.
+    """
+    names = [name for value in tags for name in value.split(",")]
+    try:
+        photos, next_cursor = await repository_photo.search_photos(
+            names, match == "all", q, sort == "newest", limit, cursor, db
+        )
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return {"photos": photos, "next_cursor": next_cursor}
+
+
+@router.post("/uploads/", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("start_upload", times=30, seconds=60))])
+async def start_upload(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Start a resumable upload for a large photo.
+
+    The file is then sent in one or more ``PATCH`` requests and turned into a photo
+    with ``POST /uploads/{upload_id}/complete``.
+    """
+    upload_id = await resumable_uploads.create(current_user.id)
+    return {"upload_id": upload_id, "offset": 0}
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(upload_id: str, current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Get how many bytes of a resumable upload were received, to resume from there.
+    """
+    offset = await resumable_uploads.get_offset(upload_id, current_user.id)
+    return {"upload_id": upload_id, "offset": offset}
 
 
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionResponse,
+              dependencies=[Depends(rate_limit("append_upload", times=600, seconds=60))])
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Append the request body to a resumable upload at ``Upload-Offset``.
+    """
+    offset = await resumable_uploads.append(upload_id, current_user.id, upload_offset, request.stream())
+    return {"upload_id": upload_id, "offset": offset}
 
 
-@router.delete("/{photo_id}", response_model=PhotoModels)
+@router.post("/uploads/{upload_id}/complete", response_model=PhotoModels, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("create_photo", times=30, seconds=60))])
+async def complete_upload(
+    upload_id: str,
+    description: str = Form(),
+    tags: str = Form(None),
+    filename: str = Form(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Create a photo from a finished resumable upload.
+    """
+    file = UploadFile(await resumable_uploads.open(upload_id, current_user.id), filename=filename)
+    try:
+        photo = await repository_photo.add_photo(description, tags, file, db, current_user)
+    finally:
+        await file.close()
+    try:
+        await resumable_uploads.discard(upload_id)
+    except redis.RedisError as err:
+        logger.warning("Discarding upload %s failed: %s", upload_id, err)
+    await _queue_derivatives(photo)
+    return photo
+
+
+@router.delete("/{photo_id}", response_model=PhotoModels,
+               dependencies=[Depends(rate_limit("delete_photo", times=30, seconds=60))])
 async def delete_photo(
     photo_id: int,
     db: AsyncSession = Depends(get_db),
@@ -38,7 +173,8 @@ async def delete_photo(
 ):
     return await repository_photo.remove_photo(photo_id, current_user, db)
 
-@router.put("/{photo_id}", response_model=PhotoModels)
+@router.put("/{photo_id}", response_model=PhotoModels,
+            dependencies=[Depends(rate_limit("update_photo", times=30, seconds=60))])
 async def put_description(
     body: PhotoBase,
     photo_id: int,
@@ -48,9 +184,35 @@ async def put_description(
     return await repository_photo.update_description(photo_id, body, current_user, db)
 
 @router.get("/{photo_id}", response_model=PhotoModels)
+@response_cache.cached(
+    PhotoModels, tags=lambda photo: [f"photo:{photo.id}", *(f"tag:{tag.id}" for tag in photo.tags)]
+)
 async def get_photo(
     photo_id: int,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user),
 ):
-    return await repository_photo.see_photo(photo_id, current_user, db)
+    photo = await repository_photo.see_photo(photo_id, current_user, db)
+    if photo is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+    return photo
+
+
+@router.get("/{photo_id}/transforms/{spec}", response_model=TransformPhotoResponse)
+async def get_transformed_photo(
+    photo_id: int,
+    spec: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Get a derivative of a photo rendered by the transform worker, e.g. ``200x200-fill``.
+    """
+    try:
+        spec = str(TransformSpec.parse(spec))
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(err))
+    derivative = await repository_photo.get_transformed_photo(photo_id, spec, db)
+    if derivative is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transformation not found")
+    return derivative
@@ -0,0 +1,70 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db import get_read_db
+from src.database.models import User
+from src.repository import search as repository_search
+from src.schemas import CommentSearchResults, PhotoSearchResults
+from src.services.auth import auth_service
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/photos", response_model=PhotoSearchResults)
+async def search_photos(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Full-text search over photo descriptions.
+
+    :param q: The query: words, "quoted phrases", ``or`` and ``-excluded`` words.
+    :type q: str
+    :param limit: The maximum number of photos to return.
+    :type limit: int
+    :param cursor: The next_cursor of the previous page, omitted for the first page.
+    :type cursor: str
+    :return: The best matching photos with highlighted snippets, and the cursor of the next page.
+    :rtype: dict
+    :raises HTTPException 400: If the cursor is malformed.
+    """
+    try:
+        hits, next_cursor = await repository_search.search_photos(q, limit, cursor, db)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    results = [{"photo": hit["item"], "rank": hit["rank"], "snippet": hit["snippet"]} for hit in hits]
+    return {"results": results, "next_cursor": next_cursor}
+
+
+@router.get("/comments", response_model=CommentSearchResults)
+async def search_comments(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Full-text search over comments.
+
+    :param q: The query: words, "quoted phrases", ``or`` and ``-excluded`` words.
+    :type q: str
+    :param limit: The maximum number of comments to return.
+    :type limit: int
+    :param cursor: The next_cursor of the previous page, omitted for the first page.
+    :type cursor: str
+    :return: The best matching comments with highlighted snippets, and the cursor of the next page.
+    :rtype: dict
+    :raises HTTPException 400: If the cursor is malformed.
+    """
+    try:
+        hits, next_cursor = await repository_search.search_comments(q, limit, cursor, db)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    results = [{"comment": hit["item"], "rank": hit["rank"], "snippet": hit["snippet"]} for hit in hits]
+    return {"results": results, "next_cursor": next_cursor}
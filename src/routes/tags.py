@@ -3,16 +3,20 @@ from typing import List
 from fastapi import APIRouter, Body, Form, HTTPException, Depends, status
 from sqlalchemy.orm import Session
 
-from src.database.db import get_db
-from src.database.models import User
-from src.schemas import ImageTagModel, ImageTagResponse
+from src.database.db import get_db, get_read_db
+from src.database.models import Counter, User
+from src.schemas import ImageTagModel, ImageTagResponse, TagDetail
+from src.repository import counters as repository_counters
 from src.repository import tags as repository_tags
 from src.services.auth import auth_service
+from src.services.rate_limit import rate_limit
+from src.services.response_cache import response_cache
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
 
 @router.get("/all tags/", response_model=List[ImageTagResponse])
+@response_cache.cached(List[ImageTagResponse], tags=lambda tags: ["tags"])
 async def read_tags(
     skip: int = 0,
     limit: int = 25,
@@ -22,21 +26,23 @@ async def read_tags(
     return await repository_tags.get_tags(skip, limit, db)
 
 
-@router.get("/get tag by id/{tag_id}", response_model=ImageTagResponse)
+@router.get("/get tag by id/{tag_id}", response_model=TagDetail)
 async def read_tag(
     tag_id: int,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     tag = await repository_tags.get_tag_by_id(tag_id, db)
     if tag is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found"
         )
-    return tag
+    counts = await repository_counters.get_counts(Counter.TAG_PHOTOS, [tag.id], db)
+    return TagDetail(id=tag.id, tag_name=tag.tag_name, photos_count=counts[tag.id])
 
 
-@router.post("/", response_model=List[ImageTagResponse])
+@router.post("/", response_model=List[ImageTagResponse],
+             dependencies=[Depends(rate_limit("create_tag", times=30, seconds=60))])
 async def create_tag(
     tags: List[ImageTagModel],
     current_user: User = Depends(auth_service.get_current_user),
@@ -45,7 +51,8 @@ async def create_tag(
     return await repository_tags.create_tag(tags, db)
 
 
-@router.put("/{tag_id}", response_model=ImageTagResponse)
+@router.put("/{tag_id}", response_model=ImageTagResponse,
+            dependencies=[Depends(rate_limit("update_tag", times=30, seconds=60))])
 async def update_tag(
     body: ImageTagModel,
     tag_id: int,
@@ -60,7 +67,8 @@ async def update_tag(
     return tag
 
 
-@router.delete("/{tag_id}", response_model=ImageTagResponse)
+@router.delete("/{tag_id}", response_model=ImageTagResponse,
+               dependencies=[Depends(rate_limit("delete_tag", times=30, seconds=60))])
 async def remove_tag(
     tag_id: int,
     current_user: User = Depends(auth_service.get_current_user),
@@ -1,24 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks, Request, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 
-import cloudinary
-import cloudinary.uploader
-
 from src.repository import users as repository_users
 from src.repository import roles as repository_roles
-from src.schemas import TokenModel, UserDb, UpdateUserProfileModel
+from src.repository import counters as repository_counters
+from src.schemas import TokenModel, UserDb, UserProfile, UpdateUserProfileModel
 from src.services.auth import auth_service
 from src.services.auth_admin import is_admin
 from src.database.db import get_db
-from src.database.models import User
-from src.conf.config import settings
+from src.database.models import Counter, User
 from src.services.email import send_email
+from src.services.rate_limit import rate_limit
+from src.services.response_cache import response_cache
+from src.services.storage import cloudinary_uploader
 
 
 profile_router = APIRouter(prefix="/profile", tags=["profile"])
 
 
-@profile_router.get("/{username}", response_model=UserDb)
+@profile_router.get("/{username}", response_model=UserProfile)
+@response_cache.cached(UserProfile, tags=lambda user: [f"user:{user.id}"])
 async def get_user_profile(username: str, db: AsyncSession = Depends(get_db)):
     """
     Get the profile information for a user by their unique username.
@@ -27,14 +28,18 @@ async def get_user_profile(username: str, db: AsyncSession = Depends(get_db)):
     :type username: str
     :param db: Database session.
     :type db: AsyncSession
-    :return: User profile information.
-    :rtype: UserDb
+    :return: User profile information, with the number of photos and comments.
+    :rtype: UserProfile
     """
-    user = await repository_users.get_user_by_username(username, db)
+    user = await repository_users.get_principal("username", username, db)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return user
+    photos = await repository_counters.get_counts(Counter.USER_PHOTOS, [user.id], db)
+    comments = await repository_counters.get_counts(Counter.USER_COMMENTS, [user.id], db)
+    return UserProfile.model_validate(user).model_copy(
+        update={"photos_count": photos[user.id], "comments_count": comments[user.id]}
+    )
 
 
 @profile_router.get("/me/", response_model=UserDb)
@@ -50,7 +55,8 @@ async def get_own_profile(current_user: User = Depends(auth_service.get_current_
     return current_user
 
 
-@profile_router.put("/me/", response_model=UserDb)
+@profile_router.put("/me/", response_model=UserDb,
+                    dependencies=[Depends(rate_limit("update_profile", times=10, seconds=60))])
 async def update_own_profile(user_data: UpdateUserProfileModel,
                              current_user: User = Depends(
                                  auth_service.get_current_user),
@@ -72,7 +78,8 @@ async def update_own_profile(user_data: UpdateUserProfileModel,
     return user
 
 
-@profile_router.patch('/avatar', response_model=UserDb)
+@profile_router.patch('/avatar', response_model=UserDb,
+                      dependencies=[Depends(rate_limit("update_avatar", times=5, seconds=60))])
 async def update_user_avatar(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
                              db: AsyncSession = Depends(get_db)):
     """
@@ -87,22 +94,16 @@ async def update_user_avatar(file: UploadFile = File(), current_user: User = Dep
     :return: The user with the updated avatar.
     :rtype: UserDb
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(
+    r = await cloudinary_uploader.upload(
         file.file, public_id=f'PhotoShare/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'PhotoShare/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    src_url = cloudinary_uploader.build_url(f'PhotoShare/{current_user.username}',
+                                            width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
 
 
-@profile_router.patch("/update-password", response_model=TokenModel)
+@profile_router.patch("/update-password", response_model=TokenModel,
+                      dependencies=[Depends(rate_limit("update_password", times=5, seconds=60))])
 async def update_password(
     new_password: str,
     confirm_password: str,
@@ -130,12 +131,12 @@ async def update_password(
 
     user = await repository_users.get_user_by_email(email, db)
 
-    if auth_service.verify_password(new_password, user.password):
+    if await auth_service.verify_password(new_password, user.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password already in use",
         )
-    hashed_password = auth_service.get_password_hash(new_password)
+    hashed_password = await auth_service.get_password_hash(new_password)
     await repository_users.update_user_password(user, hashed_password, db)
 
     access_token = await auth_service.create_access_token(data={"sub": user.email})
@@ -145,7 +146,8 @@ async def update_password(
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@profile_router.patch("/update-email", response_model=TokenModel)
+@profile_router.patch("/update-email", response_model=TokenModel,
+                      dependencies=[Depends(rate_limit("update_email", times=5, seconds=60))])
 async def update_email(
     new_email: str,
     background_tasks: BackgroundTasks,
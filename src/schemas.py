@@ -16,6 +16,13 @@ class ImageTagResponse(ImageTagModel):
     class Config:
         from_attributes = True
 
+class TagDetail(ImageTagResponse):
+    """
+    A tag with the number of photos it is on.
+    """
+    photos_count: int = 0
+
+
 class PhotoBase(BaseModel):
     description: str = Field(max_length=255)
     tags: List[ImageTagModel]
@@ -31,6 +38,54 @@ class PhotoModels(PhotoBase):
     tags: List[ImageTagResponse]
     id: int
     created_at: datetime
+    url: Optional[str] = None
+    content_hash: Optional[str] = None
+    comments_count: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+class PhotoList(BaseModel):
+    """
+    A page of photos.
+
+    :param photos: The photos on this page.
+    :type photos: List[PhotoModels]
+    :param next_cursor: The cursor of the next page, or None on the last page.
+    :type next_cursor: Optional[str]
+    """
+    photos: List[PhotoModels]
+    next_cursor: Optional[str] = None
+
+
+class UploadSessionResponse(BaseModel):
+    """
+    State of a resumable photo upload.
+
+    :param upload_id: The ID of the upload session.
+    :type upload_id: str
+    :param offset: The number of bytes received so far.
+    :type offset: int
+    """
+    upload_id: str
+    offset: int
+
+
+class TransformPhotoResponse(BaseModel):
+    """
+    A pre-computed derivative of a photo.
+
+    :param photo_id: The ID of the original photo.
+    :type photo_id: int
+    :param spec: The transformation, e.g. ``200x200-fill``.
+    :type spec: str
+    :param photo_url: The URL of the derivative.
+    :type photo_url: str
+    """
+    photo_id: int
+    spec: str
+    photo_url: str
 
     class Config:
         from_attributes = True
@@ -56,13 +111,78 @@ class CommentSchema(BaseModel):
     photo_id: int
 
 
-class CommentList(BaseModel):
+class CommentResponse(BaseModel):
     """
-    Schema for listing comments.
+    Schema for a comment returned by the API.
     """
-    limit: int = 10
-    offset: int = 0
+    id: int
+    text: str
+    user_id: int
     photo_id: int
+    created_at: datetime
+    updated_at: datetime
+    update_status: bool
+
+    class Config:
+        from_attributes = True
+
+
+class CommentList(BaseModel):
+    """
+    Schema for a page of comments.
+
+    ``next_cursor`` is opaque: pass it back to get the next page. It is None on the last page.
+    """
+    comments: List[CommentResponse]
+    next_cursor: Optional[str] = None
+
+
+class PhotoSearchHit(BaseModel):
+    """
+    A photo matching a full-text search.
+
+    :param photo: The photo.
+    :type photo: PhotoModels
+    :param rank: The relevance of the match; higher is better.
+    :type rank: float
+    :param snippet: The matching part of the description, terms wrapped in ``<b>``.
+    :type snippet: str
+    """
+    photo: PhotoModels
+    rank: float
+    snippet: str
+
+
+class PhotoSearchResults(BaseModel):
+    """
+    A page of photo search results, best matches first.
+    """
+    results: List[PhotoSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class CommentSearchHit(BaseModel):
+    """
+    A comment matching a full-text search.
+
+    :param comment: The comment.
+    :type comment: CommentResponse
+    :param rank: The relevance of the match; higher is better.
+    :type rank: float
+    :param snippet: The matching part of the text, terms wrapped in ``<b>``.
+    :type snippet: str
+    """
+    comment: CommentResponse
+    rank: float
+    snippet: str
+
+
+class CommentSearchResults(BaseModel):
+    """
+    A page of comment search results, best matches first.
+    """
+    results: List[CommentSearchHit]
+    next_cursor: Optional[str] = None
 
 
 class CommentUpdateSchems(BaseModel):
@@ -142,6 +262,19 @@ class UserDb(BaseModel):
         from_attributes = True
 
 
+class UserProfile(UserDb):
+    """
+    Public profile of a user, with their activity counts.
+
+    :param photos_count: The number of photos the user uploaded.
+    :type photos_count: int
+    :param comments_count: The number of comments the user left.
+    :type comments_count: int
+    """
+    photos_count: int = 0
+    comments_count: int = 0
+
+
 class UserResponse(BaseModel):
     """
     Model for a user response. Contains user data and a detail message.
@@ -205,3 +338,31 @@ class UpdateUserProfileModel(BaseModel):
     username: Optional[str]
     first_name: Optional[str]
     last_name: Optional[str]
+
+
+class SlowQueryResponse(BaseModel):
+    """
+    A statement recorded by the slow-query profiler.
+
+    :param statement: The SQL statement.
+    :type statement: str
+    :param fingerprint: The statement with whitespace and placeholder lists collapsed.
+    :type fingerprint: str
+    :param duration: How long the statement took, in seconds.
+    :type duration: float
+    :param caller: The function that issued the statement.
+    :type caller: str
+    :param recorded_at: When the statement finished.
+    :type recorded_at: datetime
+    :param plan: The captured query plan, if any.
+    :type plan: Optional[str]
+    """
+    statement: str
+    fingerprint: str
+    duration: float
+    caller: str
+    recorded_at: datetime
+    plan: Optional[str] = None
+
+    class Config:
+        from_attributes = True
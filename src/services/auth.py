@@ -1,31 +1,35 @@
-import pickle
-import redis
+import hashlib
+import time
 
 from typing import Optional
 
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.cache import LRUCache, redis_client
+from src.services.hashing import password_hasher
+from src.services.revocation import revocation_list
 
 
 class Auth:
     """
     Authentication service for user authentication and token management.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hasher = password_hasher
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    r = redis_client
+    token_cache = LRUCache(settings.token_cache_size, settings.token_cache_ttl)
+    revocation = revocation_list
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         Verify if the plain password matches the hashed password.
 
@@ -36,9 +40,22 @@ class Auth:
         :return: True if the passwords match, False otherwise.
         :rtype: bool
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self.hasher.verify(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        Verify a password and rehash it if the bcrypt cost factor has changed.
+
+        :param plain_password: The plain password to verify.
+        :type plain_password: str
+        :param hashed_password: The hashed password to compare with.
+        :type hashed_password: str
+        :return: Whether the passwords match, and the new hash to store or None.
+        :rtype: tuple[bool, str | None]
+        """
+        return await self.hasher.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
         """
         Generate a hashed password from a plain password.
 
@@ -47,7 +64,7 @@ class Auth:
         :return: The hashed password.
         :rtype: str
         """
-        return self.pwd_context.hash(password)
+        return await self.hasher.hash(password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -118,6 +135,41 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail='Could not validate credentials')
 
+    @staticmethod
+    def token_digest(token: str) -> bytes:
+        """
+        Get the digest a token is cached under.
+
+        :param token: The encoded token.
+        :type token: str
+        :return: The SHA-256 digest of the token.
+        :rtype: bytes
+        """
+        return hashlib.sha256(token.encode()).digest()
+
+    def decode_access_token(self, token: str, digest: Optional[bytes] = None) -> dict:
+        """
+        Decode and verify a token, reusing the claims of a token verified earlier.
+
+        Verified claims are cached by token digest until the token expires, so the
+        signature is only checked once per token and worker.
+
+        :param token: The encoded token.
+        :type token: str
+        :param digest: The digest of the token, if already computed.
+        :type digest: bytes
+        :raises JWTError: If the token is invalid or expired.
+        :return: The verified claims.
+        :rtype: dict
+        """
+        digest = digest or self.token_digest(token)
+        payload = self.token_cache.get(digest)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            ttl = payload["exp"] - time.time() if "exp" in payload else None
+            self.token_cache.set(digest, payload, ttl=ttl)
+        return payload
+
     async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         Get the current user based on the provided access token.
@@ -127,7 +179,7 @@ class Auth:
         :param db: Database session.
         :type db: AsyncSession
         :return: The authenticated user.
-        :rtype: User
+        :rtype: Principal
         """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -135,10 +187,10 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+        digest = self.token_digest(token)
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY,
-                                 algorithms=[self.ALGORITHM])
+            payload = self.decode_access_token(token, digest)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -148,15 +200,12 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = self.r.get(f"user:{email}")
+        if await self.revocation.is_revoked(token, digest):
+            raise credentials_exception
+
+        user = await repository_users.get_principal("email", email, db)
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            raise credentials_exception
         return user
 
     def create_email_token(self, data: dict):
@@ -195,7 +244,7 @@ class Auth:
                                 detail="Invalid token for email verification")
 
 
-    def add_to_blacklist(self, token: str, expires_delta: float):
+    async def add_to_blacklist(self, token: str, expires_delta: float):
         """
         Add the access_token to the "blacklist".
 
@@ -204,7 +253,9 @@ class Auth:
         :param expires_delta: The expiration time of the access_token in seconds.
         :type expires_delta: float
         """
-        self.r.setex(f"blacklist:{token}", int(expires_delta), "revoked")
+        digest = self.token_digest(token)
+        self.token_cache.pop(digest)
+        await self.revocation.revoke(token, digest, int(expires_delta))
 
 
 auth_service = Auth()
@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import urllib.error
+import urllib.request
+
+from typing import Optional
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+GRAVATAR_URL = "https://www.gravatar.com/avatar/"
+
+
+@functools.lru_cache(maxsize=4096)
+def gravatar_hash(email: str) -> str:
+    """
+    The Gravatar hash of an email address.
+
+    :param email: The email address.
+    :type email: str
+    :return: The MD5 hex digest of the trimmed, lowercased address.
+    :rtype: str
+    """
+    return hashlib.md5(email.strip().lower().encode("utf-8")).hexdigest()
+
+
+class AvatarService:
+    """
+    Derives Gravatar URLs and checks in the background whether a Gravatar exists.
+
+    A new user gets the plain Gravatar URL, which needs no I/O. Afterwards ``resolve``
+    asks Gravatar whether the address has an image of its own; the answer is kept in
+    Redis so an address is probed at most once per ``ttl``.
+
+    :param r: The Redis client the probe results are kept in.
+    :param base_url: The Gravatar avatar endpoint.
+    :param default: The Gravatar default image for addresses without one.
+    :param timeout: Seconds a probe may take.
+    :param ttl: Seconds a probe result is kept.
+    :param concurrency: Probes in flight at once.
+    """
+
+    def __init__(self, r: redis.Redis, base_url: str = GRAVATAR_URL, default: str = "identicon",
+                 timeout: float = 3, ttl: int = 86400, concurrency: int = 4):
+        self.r = r
+        self.base_url = base_url
+        self.default = default
+        self.timeout = timeout
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def url(self, email: str, default: Optional[str] = None) -> str:
+        """
+        The Gravatar URL of an email address.
+
+        :param email: The email address.
+        :type email: str
+        :param default: The image Gravatar serves when the address has none.
+        :type default: str | None
+        :return: The avatar URL.
+        :rtype: str
+        """
+        url = self.base_url + gravatar_hash(email)
+        return f"{url}?d={default}" if default else url
+
+    def _request(self, url: str) -> bool:
+        request = urllib.request.Request(url, method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status == 200
+        except urllib.error.HTTPError as err:
+            if err.code == 404:
+                return False
+            raise
+
+    async def exists(self, email: str) -> Optional[bool]:
+        """
+        Whether an email address has a Gravatar of its own.
+
+        :param email: The email address.
+        :type email: str
+        :return: The answer, or None if Gravatar could not be asked.
+        :rtype: bool | None
+        """
+        key = f"avatar:{gravatar_hash(email)}"
+        try:
+            cached = await self.r.get(key)
+        except redis.RedisError as err:
+            logger.warning("Reading cached Gravatar probe failed: %s", err)
+            cached = None
+        if cached is not None:
+            return cached in (b"1", "1")
+
+        try:
+            async with self._semaphore:
+                found = await asyncio.wait_for(asyncio.to_thread(self._request, self.url(email, "404")),
+                                               self.timeout)
+        except Exception as err:
+            logger.warning("Gravatar probe failed: %r", err)
+            return None
+        try:
+            await self.r.set(key, int(found), ex=self.ttl)
+        except redis.RedisError as err:
+            logger.warning("Caching Gravatar probe failed: %s", err)
+        return found
+
+    async def resolve(self, email: str) -> Optional[str]:
+        """
+        The avatar URL an email address should end up with, if not the plain Gravatar URL.
+
+        :param email: The email address.
+        :type email: str
+        :return: The default image URL for addresses without a Gravatar, otherwise None.
+        :rtype: str | None
+        """
+        if await self.exists(email) is False:
+            return self.url(email, self.default)
+        return None
+
+
+avatar_service = AvatarService(redis_client, default=settings.avatar_default,
+                               timeout=settings.avatar_probe_timeout, ttl=settings.avatar_probe_ttl,
+                               concurrency=settings.avatar_probe_concurrency)
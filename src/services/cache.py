@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+redis_pool = redis.BlockingConnectionPool(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    db=0,
+    max_connections=settings.redis_max_connections,
+    timeout=settings.redis_pool_timeout,
+    health_check_interval=30,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+
+class LRUCache:
+    """
+    Bounded in-process cache with least-recently-used eviction and per-entry expiry.
+
+    The cache is meant to sit in front of Redis for hot keys, so it is not
+    thread-safe and is only ever touched from the event loop thread.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        """
+        :param maxsize: The maximum number of entries kept in memory.
+        :type maxsize: int
+        :param ttl: The default lifetime of an entry in seconds.
+        :type ttl: float
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a value from the cache.
+
+        :param key: The key to look up.
+        :type key: Hashable
+        :param default: The value returned when the key is missing or expired.
+        :type default: Any
+        :return: The cached value or the default.
+        :rtype: Any
+        """
+        item = self._data.get(key)
+        if item is not None:
+            value, expires_at = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Put a value into the cache, evicting the least recently used entry if full.
+
+        :param key: The key to store the value under.
+        :type key: Hashable
+        :param value: The value to store.
+        :type value: Any
+        :param ttl: Optional lifetime in seconds, defaults to the cache ttl.
+        :type ttl: float
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove a key from the cache.
+
+        :param key: The key to remove.
+        :type key: Hashable
+        :param default: The value returned when the key is missing.
+        :type default: Any
+        :return: The removed value or the default.
+        :rtype: Any
+        """
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def stats(self) -> dict:
+        """
+        Report the cache size and hit/miss counters.
+
+        :return: The cache statistics.
+        :rtype: dict
+        """
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache.
+        """
+        self._data.clear()
+
+
+class CacheInvalidator:
+    """
+    Keeps the in-process caches of all workers in step.
+
+    A key dropped through :meth:`invalidate` is published on ``cache:invalidate``
+    and dropped from the same cache by every worker. A worker that was not
+    subscribed for a while clears its caches, as it may have missed messages;
+    the entry TTL bounds staleness while Redis is unavailable.
+    """
+    CHANNEL = "cache:invalidate"
+
+    def __init__(self, r: redis.Redis):
+        self.r = r
+        self.caches: dict[str, LRUCache] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, cache: LRUCache) -> LRUCache:
+        """
+        Make a cache invalidatable by name.
+
+        :param name: The name the cache is invalidated by.
+        :type name: str
+        :param cache: The cache.
+        :type cache: LRUCache
+        :return: The cache.
+        :rtype: LRUCache
+        """
+        self.caches[name] = cache
+        return cache
+
+    def _drop(self, name: str, keys: list) -> None:
+        cache = self.caches.get(name)
+        if cache is not None:
+            for key in keys:
+                cache.pop(key)
+
+    async def invalidate(self, name: str, *keys: Hashable) -> None:
+        """
+        Drop keys from a cache in every worker.
+
+        Call after the change is committed.
+
+        :param name: The name of the cache.
+        :type name: str
+        :param keys: The keys to drop; they must be JSON-serializable.
+        :type keys: Hashable
+        """
+        self._drop(name, list(keys))
+        try:
+            await self.r.publish(self.CHANNEL, json.dumps([name, list(keys)]))
+        except redis.RedisError as err:
+            logger.warning("Publishing cache invalidation failed: %s", err)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.r.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    for cache in self.caches.values():
+                        cache.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            name, keys = json.loads(message["data"])
+                            self._drop(name, keys)
+            except redis.RedisError as err:
+                logger.warning("Cache invalidation subscription failed: %s", err)
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """
+        Start listening for invalidations in the background.
+        """
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """
+        Stop listening for invalidations.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+cache_invalidator = CacheInvalidator(redis_client)
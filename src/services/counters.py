@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+from typing import Callable, Optional
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.database.db import sessionmanager
+from src.repository.counters import reconcile
+from src.services.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class CounterReconciler:
+    """
+    Periodically recounts the denormalized counters to fix any drift.
+
+    Every worker runs the loop, but a Redis lock that is held for the whole interval
+    lets only one of them recount per interval.
+    """
+    LOCK = "counters:reconcile"
+
+    def __init__(self, r: redis.Redis, interval: float = 3600, session_factory: Callable = sessionmanager.session):
+        self.r = r
+        self.interval = interval
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> Optional[dict]:
+        """
+        Recount the counters, unless another worker did within the interval.
+
+        :return: The number of counters fixed per scope, or None if skipped.
+        :rtype: dict | None
+        """
+        if not await self.r.set(self.LOCK, 1, nx=True, ex=max(1, int(self.interval))):
+            return None
+        async with self.session_factory() as db:
+            return await reconcile(db)
+
+    async def _run_periodically(self) -> None:
+        while True:
+            try:
+                fixed = await self.run_once()
+                if fixed and any(fixed.values()):
+                    logger.info("Counters reconciled: %s", fixed)
+            except Exception:
+                # Redis, the pool or the database being unavailable must not end the loop.
+                logger.exception("Reconciling counters failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """
+        Start reconciling in the background.
+        """
+        self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self) -> None:
+        """
+        Stop reconciling.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+counter_reconciler = CounterReconciler(redis_client, settings.counter_reconcile_interval)
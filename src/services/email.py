@@ -1,30 +1,344 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
+from typing import AsyncIterator, Optional, Sequence
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+import redis.asyncio as redis
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import settings
+from src.services.cache import redis_client
+from src.services.queue import ReliableQueue
+
+logger = logging.getLogger(__name__)
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="PhotoShare",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+TEMPLATE_FOLDER = Path(__file__).parent / "templates"
+
+# Templates are compiled once and kept by the environment; with auto_reload off
+# the files are not checked for changes on every render.
+templates = Environment(
+    loader=FileSystemLoader(TEMPLATE_FOLDER),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
 )
 
 
+def render_message(job: dict) -> EmailMessage:
+    """
+    Build the email of an outbox job.
+
+    :param job: The job, with the recipient, subject, template name and context.
+    :type job: dict
+    :return: The message.
+    :rtype: EmailMessage
+    """
+    message = EmailMessage()
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    message["To"] = job["to"]
+    message["Subject"] = job["subject"]
+    message.set_content(templates.get_template(job["template"]).render(job["context"]), subtype="html")
+    return message
+
+
+class SMTPPool:
+    """
+    Persistent SMTP connections shared by every sender.
+
+    At most ``size`` connections are open at once. A connection is logged in once
+    and reused for message after message; one that failed is closed instead of
+    being returned to the pool.
+    """
+
+    def __init__(self, hostname: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, start_tls: bool = False, validate_certs: bool = True, size: int = 4,
+                 timeout: float = 30):
+        self.options = dict(hostname=hostname, port=port, username=username, password=password, use_tls=use_tls,
+                            start_tls=start_tls, validate_certs=validate_certs, timeout=timeout)
+        self.size = size
+        self._idle: list[aiosmtplib.SMTP] = []
+        self._semaphore = asyncio.Semaphore(size)
+
+    @staticmethod
+    def _close(smtp: aiosmtplib.SMTP) -> None:
+        if smtp.is_connected:
+            smtp.close()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        """
+        Borrow a connection, opening a new one if none is idle.
+        """
+        async with self._semaphore:
+            smtp = self._idle.pop() if self._idle else None
+            if smtp is None or not smtp.is_connected:
+                smtp = aiosmtplib.SMTP(**self.options)
+                await smtp.connect()
+            try:
+                yield smtp
+            except BaseException:
+                self._close(smtp)
+                raise
+            self._idle.append(smtp)
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        Send a message over a pooled connection.
+
+        A connection the server dropped while idle is replaced once.
+
+        :param message: The message.
+        :type message: EmailMessage
+        :raises aiosmtplib.SMTPException: If the message could not be sent.
+        """
+        for attempt in range(2):
+            try:
+                async with self.connection() as smtp:
+                    await smtp.send_message(message)
+                return
+            except aiosmtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    async def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        while self._idle:
+            smtp = self._idle.pop()
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                self._close(smtp)
+
+
+class EmailOutbox:
+    """
+    Redis-backed queue of emails waiting to be sent.
+
+    Taken emails stay on the worker's processing list until they are sent or
+    failed, see :class:`ReliableQueue`. Failed messages are scheduled on the
+    ``email:retry`` sorted set with exponential backoff and moved back onto the
+    queue once due. Messages that fail permanently, or too often, end up on the
+    ``email:dead`` list for inspection.
+    """
+    QUEUE = "email:outbox"
+    RETRY = "email:retry"
+    DEAD = "email:dead"
+
+    # Moves the due retries onto the queue atomically, so none is lost or doubled
+    # when several workers promote at the same time.
+    PROMOTE = """
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    if #due > 0 then
+        redis.call('ZREM', KEYS[1], unpack(due))
+        redis.call('RPUSH', KEYS[2], unpack(due))
+    end
+    return #due
+    """
+
+    def __init__(self, r: redis.Redis, max_attempts: int = 5, retry_backoff: float = 30, heartbeat_ttl: int = 30):
+        self.r = r
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.queue = ReliableQueue(r, self.QUEUE, heartbeat_ttl=heartbeat_ttl)
+        self._promote = r.register_script(self.PROMOTE)
+
+    @staticmethod
+    def job(recipient: str, subject: str, template: str, context: dict) -> dict:
+        return {"id": uuid.uuid4().hex, "to": recipient, "subject": subject, "template": template,
+                "context": context, "attempts": 0}
+
+    async def enqueue(self, job: dict) -> None:
+        """
+        Queue an email.
+
+        :param job: The job, as built by :meth:`job`.
+        :type job: dict
+        """
+        await self.r.rpush(self.QUEUE, json.dumps(job))
+
+    async def take(self, batch_size: int, timeout: float = 1) -> list[str]:
+        """
+        Wait for an email and take up to ``batch_size`` queued emails at once.
+
+        :param batch_size: The maximum number of emails to take.
+        :type batch_size: int
+        :param timeout: How long to wait for the first email, in seconds.
+        :type timeout: float
+        :return: The serialized jobs, empty if none arrived in time.
+        :rtype: list[str]
+        """
+        return await self.queue.take(batch_size, timeout)
+
+    async def ack(self, raw: str) -> None:
+        """
+        Mark a taken email as sent.
+
+        :param raw: The serialized job, as returned by :meth:`take`.
+        :type raw: str
+        """
+        await self.queue.ack(raw)
+
+    async def promote(self, limit: int = 1000) -> int:
+        """
+        Move the retries that are due back onto the queue.
+
+        :param limit: The maximum number of retries to move.
+        :type limit: int
+        :return: The number of retries moved.
+        :rtype: int
+        """
+        return await self._promote(keys=[self.RETRY, self.QUEUE], args=[time.time(), limit])
+
+    async def fail(self, raw: str, error: str, permanent: bool = False) -> None:
+        """
+        Schedule a failed email for a retry, or bury it once it cannot succeed.
+
+        A job that cannot be read is buried as it is.
+
+        :param raw: The serialized job, as returned by :meth:`take`.
+        :type raw: str
+        :param error: The reason of the failure.
+        :type error: str
+        :param permanent: Whether retrying cannot help, e.g. the recipient was refused.
+        :type permanent: bool
+        """
+        try:
+            job = json.loads(raw)
+            job = dict(job, attempts=int(job["attempts"]) + 1, error=error)
+        except (ValueError, TypeError, KeyError):
+            job, permanent = {"raw": raw if isinstance(raw, str) else raw.decode(errors="replace"),
+                              "error": error}, True
+        async with self.r.pipeline(transaction=True) as pipe:
+            if permanent or job["attempts"] >= self.max_attempts:
+                pipe.rpush(self.DEAD, json.dumps(job))
+            else:
+                due = time.time() + self.retry_backoff * 2 ** (job["attempts"] - 1)
+                pipe.zadd(self.RETRY, {json.dumps(job): due})
+            pipe.lrem(self.queue.processing, 1, raw)
+            await pipe.execute()
+
+
+class EmailWorker:
+    """
+    Drains the outbox in batches over the pooled SMTP connections.
+
+    The messages of a batch are sent concurrently, so each pooled connection
+    carries several of them one after the other.
+    """
+
+    def __init__(self, outbox: EmailOutbox, pool: SMTPPool, batch_size: int = 100):
+        self.outbox = outbox
+        self.pool = pool
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def _deliver(self, raw: str) -> bool:
+        try:
+            message = render_message(json.loads(raw))
+        except Exception as err:
+            # Retrying cannot fix a malformed job or a missing template.
+            logger.error("Cannot render email job %.200s: %r", raw, err)
+            await self.outbox.fail(raw, repr(err), permanent=True)
+            return False
+        try:
+            await self.pool.send(message)
+        except aiosmtplib.SMTPRecipientsRefused as err:
+            await self.outbox.fail(raw, str(err), permanent=all(refused.code >= 500 for refused in err.recipients))
+        except aiosmtplib.SMTPResponseException as err:
+            await self.outbox.fail(raw, str(err), permanent=err.code >= 500)
+        except Exception as err:
+            logger.warning("Sending email to %s failed: %r", message["To"], err)
+            await self.outbox.fail(raw, repr(err))
+        else:
+            await self.outbox.ack(raw)
+            return True
+        return False
+
+    async def process(self, jobs: Sequence[str]) -> int:
+        """
+        Send a batch of emails.
+
+        A job that fails does not affect the others; one whose failure could not be
+        recorded stays on the processing list and is sent again later.
+
+        :param jobs: The serialized jobs taken from the outbox.
+        :type jobs: Sequence[str]
+        :return: The number of emails sent.
+        :rtype: int
+        """
+        results = await asyncio.gather(*(self._deliver(job) for job in jobs), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error("Email job failed: %r", result)
+        return sum(result is True for result in results)
+
+    async def run(self) -> None:
+        """
+        Send emails until cancelled.
+        """
+        keep_alive = asyncio.create_task(self.outbox.queue.keep_alive())
+        try:
+            while True:
+                try:
+                    await self.outbox.promote()
+                    jobs = await self.outbox.take(self.batch_size)
+                    if jobs:
+                        await self.process(jobs)
+                except Exception:
+                    logger.exception("Email worker error")
+                    await asyncio.sleep(1)
+        finally:
+            keep_alive.cancel()
+
+    def start(self) -> None:
+        """
+        Drain the outbox in the background.
+        """
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop draining the outbox and close the SMTP connections.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.outbox.queue.release()
+        await self.pool.close()
+
+
+smtp_pool = SMTPPool(
+    settings.mail_server,
+    settings.mail_port,
+    settings.mail_username if settings.mail_use_credentials else None,
+    settings.mail_password if settings.mail_use_credentials else None,
+    use_tls=settings.mail_ssl_tls,
+    start_tls=settings.mail_starttls,
+    validate_certs=settings.mail_validate_certs,
+    size=settings.mail_pool_size,
+    timeout=settings.mail_timeout,
+)
+email_outbox = EmailOutbox(redis_client, settings.mail_max_attempts, settings.mail_retry_backoff)
+email_worker = EmailWorker(email_outbox, smtp_pool, settings.mail_batch_size)
+
+
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    Send an email with a verification token to the specified email address.
+    Queue an email with a verification token to the specified email address.
+
+    The email is sent directly if the outbox is unavailable.
 
     :param email: The recipient's email address.
     :type email: EmailStr
@@ -33,17 +347,14 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param host: The host (URL) where the email is being sent from.
     :type host: str
     """
+    token_verification = auth_service.create_email_token({"sub": email})
+    job = EmailOutbox.job(email, "Confirm your email ", "email_template.html",
+                          {"host": str(host), "username": username, "token": token_verification})
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username,
-                           "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+        await email_outbox.enqueue(job)
+    except redis.RedisError as err:
+        logger.warning("Email outbox unavailable, sending directly: %s", err)
+        try:
+            await smtp_pool.send(render_message(job))
+        except (aiosmtplib.SMTPException, OSError) as err:
+            logger.error("Sending email to %s failed: %s", email, err)
@@ -0,0 +1,100 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+
+
+class PasswordHasher:
+    """
+    Run bcrypt hashing and verification on a bounded worker pool.
+
+    bcrypt releases the GIL while it works, so a thread pool spreads the cost across
+    cores and the event loop keeps serving unrelated requests during login storms.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 4, max_queue: int = 64):
+        """
+        :param rounds: The bcrypt cost factor for new hashes.
+        :type rounds: int
+        :param workers: The number of hashing threads.
+        :type workers: int
+        :param max_queue: How many calls may wait for a free worker before new ones are rejected.
+        :type max_queue: int
+        """
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func: Callable, *args) -> Any:
+        if self.pending >= self.workers + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Generate a hashed password from a plain password.
+
+        :param password: The plain password to hash.
+        :type password: str
+        :return: The hashed password.
+        :rtype: str
+        """
+        return await self._run(self.pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify if the plain password matches the hashed password.
+
+        :param plain_password: The plain password to verify.
+        :type plain_password: str
+        :param hashed_password: The hashed password to compare with.
+        :type hashed_password: str
+        :return: True if the passwords match, False otherwise.
+        :rtype: bool
+        """
+        return await self._run(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """
+        Verify a password and produce a new hash if the stored one uses outdated settings.
+
+        :param plain_password: The plain password to verify.
+        :type plain_password: str
+        :param hashed_password: The hashed password to compare with.
+        :type hashed_password: str
+        :return: Whether the password matches, and the replacement hash or None.
+        :rtype: tuple[bool, str | None]
+        """
+        return await self._run(self.pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.bcrypt_rounds, settings.password_hash_workers, settings.password_hash_queue)
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import time
+
+from typing import Callable, Iterable, Optional
+
+import redis.asyncio as redis
+from prometheus_client import CollectorRegistry, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.database.db import sessionmanager
+from src.repository.tags import tag_ids
+from src.repository.users import local_users
+from src.services.auth import auth_service
+from src.services.cache import LRUCache
+from src.services.rate_limit import rate_limiter
+from src.services.revocation import revocation_list
+
+logger = logging.getLogger(__name__)
+
+registry = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests by route template.",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+STATEMENT_LATENCY = Histogram(
+    "db_statement_duration_seconds", "Latency of SQL statements by kind.",
+    ["operation"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Latency of Redis commands.",
+    ["command"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop resumes a sleeping task.",
+    buckets=LATENCY_BUCKETS, registry=registry,
+)
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "OTHER")
+REDIS_COMMANDS = (
+    "GET", "SET", "DEL", "EXISTS", "EXPIRE", "INCR", "HGETALL", "HSET", "SADD", "SMEMBERS",
+    "RPUSH", "LPOP", "BLPOP", "ZADD", "EVALSHA", "EVAL", "SCRIPT", "PING", "OTHER",
+)
+UNMATCHED = "unmatched"
+
+# Label children are created up front so the hot path is a dict lookup instead of
+# the locked label resolution of prometheus_client.
+_statement_children = {operation: STATEMENT_LATENCY.labels(operation) for operation in OPERATIONS}
+_redis_children = {command: REDIS_LATENCY.labels(command) for command in REDIS_COMMANDS}
+
+
+class RequestMetrics:
+    """
+    Request latency children, one per route template, method and status class.
+    """
+
+    def __init__(self):
+        self._children: dict[tuple[str, str, str], Histogram] = {}
+
+    def _child(self, method: str, route: str, status: str):
+        child = self._children.get((method, route, status))
+        if child is None:
+            child = self._children[method, route, status] = REQUEST_LATENCY.labels(method, route, status)
+        return child
+
+    def preallocate(self, routes: Iterable[BaseRoute]) -> None:
+        """
+        Create the children of every route of the app.
+
+        :param routes: The routes of the app.
+        :type routes: Iterable[BaseRoute]
+        """
+        for route in routes:
+            for method in getattr(route, "methods", None) or ():
+                for status in STATUS_CLASSES:
+                    self._child(method, route.path, status)
+
+    def observe(self, scope: Scope, status_code: int, seconds: float) -> None:
+        route = scope.get("route")
+        path = route.path if route is not None else UNMATCHED
+        self._child(scope["method"], path, STATUS_CLASSES[status_code // 100 - 1]).observe(seconds)
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Record the latency of every HTTP request under its route template.
+
+    A plain ASGI middleware, so no request or response objects are built for it.
+    Requests that match no route are recorded together, keeping the label set bounded.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe(scope, status_code, time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+    operation = statement.lstrip()[:7].split(None, 1)
+    child = _statement_children.get(operation[0].upper() if operation else "OTHER", _statement_children["OTHER"])
+    child.observe(elapsed)
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("metrics_start"):
+        context.connection.info["metrics_start"].pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Time every statement an engine executes.
+
+    :param engine: The engine.
+    :type engine: AsyncEngine
+    """
+    if not event.contains(engine.sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+
+def instrument_redis(client: redis.Redis) -> None:
+    """
+    Time every command a Redis client sends.
+
+    Pipelines are sent as one batch and are not timed per command.
+
+    :param client: The client.
+    :type client: redis.Redis
+    """
+    if getattr(client, "_metrics_instrumented", False):
+        return
+    execute_command = client.execute_command
+
+    async def timed_execute_command(*args, **options):
+        child = _redis_children.get(str(args[0]).upper(), _redis_children["OTHER"])
+        start = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            child.observe(time.perf_counter() - start)
+
+    client.execute_command = timed_execute_command
+    client._metrics_instrumented = True
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than asked a sleeping task wakes up.
+
+    Blocking calls on the loop (CPU-bound work, sync I/O) show up as lag.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(loop.time() - start - self.interval, 0))
+
+    def start(self) -> None:
+        """
+        Start measuring in the background.
+        """
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop measuring.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class StatsCollector(Collector):
+    """
+    Exposes the statistics the services already keep, read when scraped.
+
+    :param pool_status: Returns the connection pool status, see ``DatabaseSessionManager.pool_status``.
+    :param revocation_metrics: Returns the revocation filter metrics.
+    :param caches: The in-process caches by name.
+    """
+
+    def __init__(self, pool_status: Callable[[], dict], revocation_metrics: Callable[[], dict],
+                 caches: dict[str, LRUCache]):
+        self.pool_status = pool_status
+        self.revocation_metrics = revocation_metrics
+        self.caches = caches
+
+    @staticmethod
+    def _pool(status: dict, database: str, size, checked_out, overflow, checkouts, timeouts, wait):
+        size.add_metric([database], status["size"])
+        checked_out.add_metric([database], status["checked_out"])
+        overflow.add_metric([database], status["overflow"])
+        checkouts.add_metric([database], status["checkouts"])
+        timeouts.add_metric([database], status["timeouts"])
+        wait.add_metric([database], status["wait_seconds_total"])
+
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Connections kept by the pool.", labels=["database"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use.", labels=["database"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size.",
+                                     labels=["database"])
+        checkouts = CounterMetricFamily("db_pool_checkouts", "Connection checkouts.", labels=["database"])
+        timeouts = CounterMetricFamily("db_pool_timeouts", "Checkouts that timed out.", labels=["database"])
+        wait = CounterMetricFamily("db_pool_wait_seconds", "Time spent waiting for a connection.",
+                                   labels=["database"])
+        try:
+            status = self.pool_status()
+        except Exception as err:
+            logger.warning("Reading pool status failed: %s", err)
+        else:
+            self._pool(status, "primary", size, checked_out, overflow, checkouts, timeouts, wait)
+            for index, replica in enumerate(status["replicas"]):
+                self._pool(replica, f"replica{index}", size, checked_out, overflow, checkouts, timeouts, wait)
+        yield from (size, checked_out, overflow, checkouts, timeouts, wait)
+
+        revocation = self.revocation_metrics()
+        yield GaugeMetricFamily("revocation_filter_items", "Tokens in the revocation filter.",
+                                value=revocation["items"])
+        yield GaugeMetricFamily("revocation_filter_false_positive_rate",
+                                "Expected false positive rate of the revocation filter.",
+                                value=revocation["expected_false_positive_rate"])
+        yield GaugeMetricFamily("revocation_filter_memory_bytes", "Memory used by the revocation filter bits.",
+                                value=revocation["memory_bytes"])
+        yield GaugeMetricFamily("revocation_filter_false_positives",
+                                "Filter hits that Redis showed were not revoked, since start.",
+                                value=revocation["false_positives"])
+        yield CounterMetricFamily("revocation_checks", "Tokens checked against the revocation filter.",
+                                  value=revocation["checks"])
+        yield CounterMetricFamily("revocation_redis_lookups", "Revocation checks that went to Redis.",
+                                  value=revocation["redis_lookups"])
+
+        entries = GaugeMetricFamily("cache_entries", "Entries in an in-process cache.", labels=["cache"])
+        hits = CounterMetricFamily("cache_hits", "In-process cache hits.", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "In-process cache misses.", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            entries.add_metric([name], stats["size"])
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+        yield from (entries, hits, misses)
+
+
+loop_lag_monitor = LoopLagMonitor(settings.event_loop_lag_interval)
+registry.register(StatsCollector(
+    sessionmanager.pool_status,
+    revocation_list.metrics,
+    {"tokens": auth_service.token_cache, "users": local_users, "tag_ids": tag_ids, "rate_limits": rate_limiter.local},
+))
@@ -0,0 +1,115 @@
+import json
+
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Optional
+
+from src.database.models import User
+
+
+SCHEMA_VERSION = 1
+
+
+@dataclass(slots=True, frozen=True)
+class Principal:
+    """
+    Lightweight, detached view of an authenticated user.
+
+    Holds only the columns the routes read, so it can be cached without any ORM state.
+    """
+    id: int
+    role_id: int
+    username: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    email: str
+    created_at: Optional[datetime]
+    avatar: Optional[str]
+    confirmed: bool
+    ban: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        """
+        Build a principal from a database user.
+
+        :param user: The user loaded from the database.
+        :type user: User
+        :return: The detached principal.
+        :rtype: Principal
+        """
+        return cls(
+            id=user.id,
+            role_id=user.role_id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            email=user.email,
+            created_at=user.created_at,
+            avatar=user.avatar,
+            confirmed=bool(user.confirmed),
+            ban=bool(user.ban),
+        )
+
+
+# The schema version followed by every field of a principal.
+RECORD_LENGTH = 1 + len(fields(Principal))
+
+
+def dumps(principal: Principal) -> bytes:
+    """
+    Serialize a principal into a compact, schema-versioned JSON array.
+
+    :param principal: The principal to serialize.
+    :type principal: Principal
+    :return: The encoded record.
+    :rtype: bytes
+    """
+    created_at = principal.created_at.isoformat() if principal.created_at else None
+    record = [
+        SCHEMA_VERSION,
+        principal.id,
+        principal.role_id,
+        principal.username,
+        principal.first_name,
+        principal.last_name,
+        principal.email,
+        created_at,
+        principal.avatar,
+        int(principal.confirmed),
+        int(principal.ban),
+    ]
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(payload: bytes) -> Optional[Principal]:
+    """
+    Rehydrate a principal from a cached record.
+
+    Records written with another schema version or field count, or that cannot be
+    decoded at all, are treated as a cache miss.
+
+    :param payload: The encoded record.
+    :type payload: bytes
+    :return: The principal, or None if the record is stale or malformed.
+    :rtype: Principal | None
+    """
+    try:
+        record = json.loads(payload)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(record, list) or len(record) != RECORD_LENGTH or record[0] != SCHEMA_VERSION:
+        return None
+    _, id, role_id, username, first_name, last_name, email, created_at, avatar, confirmed, ban = record
+    return Principal(
+        id=id,
+        role_id=role_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name,
+        email=email,
+        created_at=datetime.fromisoformat(created_at) if created_at else None,
+        avatar=avatar,
+        confirmed=bool(confirmed),
+        ban=bool(ban),
+    )
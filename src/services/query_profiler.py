@@ -0,0 +1,158 @@
+import asyncio
+import functools
+import logging
+import re
+import sys
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class SlowQuery:
+    """
+    A statement that ran longer than the profiler threshold.
+
+    Parameter values are not kept: they include tokens, password hashes and emails.
+    """
+    statement: str
+    fingerprint: str
+    duration: float
+    caller: str
+    recorded_at: datetime
+    plan: Optional[str] = None
+
+
+def _caller() -> str:
+    # Statements run in a greenlet of their own; the code that awaited them is
+    # suspended in the parent greenlet.
+    parent = greenlet.getcurrent().parent
+    frame = parent.gr_frame if parent is not None else sys._getframe()
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("src.repository."):
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        if fallback is None and module.startswith("src.") and not module.startswith(("src.database.", __name__)):
+            fallback = f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return fallback or "unknown"
+
+
+_PLACEHOLDER = r"(?:\$\d+|%s|\?|:\w+|%\(\w+\)s)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+
+
+def _fingerprint(statement: str) -> str:
+    # Collapse whitespace and lists of placeholders, so an IN clause has one
+    # fingerprint whatever its length.
+    return _PLACEHOLDER_LIST.sub("(?)", " ".join(statement.split()))
+
+
+class QueryProfiler:
+    """
+    Keeps the most recent slow statements, with the function that issued them.
+
+    Only statements slower than ``threshold`` seconds cost more than a timer. With
+    ``explain`` on, the plan of a slow statement is captured afterwards on a
+    separate connection that is rolled back, at most once per ``explain_interval``
+    seconds for each statement fingerprint. The plan is a plain ``EXPLAIN``, which
+    does not run the statement; ``analyze`` switches SELECTs to
+    ``EXPLAIN (ANALYZE, BUFFERS)``, which runs them a second time.
+    """
+
+    def __init__(self, threshold: float = 0.2, size: int = 100, explain: bool = False,
+                 analyze: bool = False, explain_interval: float = 600):
+        self.threshold = threshold
+        self.explain = explain
+        self.analyze = analyze
+        self.explain_interval = explain_interval
+        self.entries: deque[SlowQuery] = deque(maxlen=size)
+        self._instrumented: set[int] = set()
+        self._explained: dict[str, float] = {}
+        self._explained_size = max(size, 1) * 10
+        self._tasks: set[asyncio.Task] = set()
+
+    def instrument(self, engine: AsyncEngine) -> None:
+        """
+        Profile the statements an engine executes.
+
+        :param engine: The engine.
+        :type engine: AsyncEngine
+        """
+        if id(engine.sync_engine) in self._instrumented:
+            return
+        self._instrumented.add(id(engine.sync_engine))
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", functools.partial(self._after_cursor_execute, engine))
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["profiler_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, engine, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info.pop("profiler_start", time.perf_counter())
+        if duration < self.threshold or statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        entry = SlowQuery(statement=statement, fingerprint=_fingerprint(statement), duration=duration,
+                          caller=_caller(), recorded_at=datetime.utcnow())
+        self.entries.append(entry)
+        logger.warning("Slow query (%.0f ms) in %s: %.200s", duration * 1000, entry.caller, statement)
+        if self.explain and not executemany and engine.dialect.name == "postgresql" \
+                and self._claim_explain(statement):
+            task = asyncio.get_running_loop().create_task(self._capture_plan(engine, entry, parameters))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _claim_explain(self, statement: str) -> bool:
+        """
+        Whether the plan of a statement should be captured now, recording it if so.
+
+        :param statement: The SQL statement.
+        :type statement: str
+        :return: False if a statement with the same fingerprint was explained within ``explain_interval``.
+        :rtype: bool
+        """
+        key = _fingerprint(statement)
+        now = time.monotonic()
+        last = self._explained.pop(key, None)
+        if last is not None and now - last < self.explain_interval:
+            self._explained[key] = last
+            return False
+        self._explained[key] = now
+        if len(self._explained) > self._explained_size:
+            del self._explained[next(iter(self._explained))]
+        return True
+
+    async def _capture_plan(self, engine: AsyncEngine, entry: SlowQuery, parameters) -> None:
+        analyze = self.analyze and entry.statement.lstrip()[:6].upper() == "SELECT"
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        try:
+            async with engine.connect() as conn:
+                rows = await conn.exec_driver_sql(prefix + entry.statement, parameters)
+                entry.plan = "\n".join(row[0] for row in rows)
+                await conn.rollback()
+        except Exception as err:
+            entry.plan = f"EXPLAIN failed: {err}"
+
+    def clear(self) -> None:
+        """
+        Forget the recorded statements.
+        """
+        self.entries.clear()
+
+
+query_profiler = QueryProfiler(settings.slow_query_threshold, settings.slow_query_log_size,
+                               settings.slow_query_explain, settings.slow_query_explain_analyze,
+                               settings.slow_query_explain_interval)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import uuid
+
+from typing import Optional
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+class ReliableQueue:
+    """
+    A Redis list whose jobs are not lost when a consumer dies with them.
+
+    ``take`` moves jobs from the queue onto the consumer's own processing list in
+    one step (``BLMOVE``, then ``LMOVE`` for the rest of the batch), so a job is
+    always on one of the two lists; ``ack`` removes it once it is finished. Every
+    consumer keeps a heartbeat key alive, and the jobs of a consumer whose
+    heartbeat expired are moved back to the front of the queue by the others.
+    Delivery is therefore at least once.
+
+    :param r: The Redis client.
+    :param name: The key of the queue.
+    :param consumer: The name of this consumer, unique per process by default.
+    :param heartbeat_ttl: Seconds after its last heartbeat a consumer is considered dead.
+    """
+
+    # KEYS: queue, processing list. ARGV: the number of jobs to move.
+    TAKE = """
+    local jobs = {}
+    for i = 1, tonumber(ARGV[1]) do
+        local job = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+        if not job then
+            break
+        end
+        jobs[i] = job
+    end
+    return jobs
+    """
+
+    # KEYS: heartbeat, processing list, queue, consumer set. ARGV: the consumer.
+    RECOVER = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return 0
+    end
+    local moved = 0
+    while redis.call('LMOVE', KEYS[2], KEYS[3], 'RIGHT', 'LEFT') do
+        moved = moved + 1
+    end
+    redis.call('SREM', KEYS[4], ARGV[1])
+    return moved
+    """
+
+    def __init__(self, r: redis.Redis, name: str, consumer: Optional[str] = None, heartbeat_ttl: int = 30):
+        self.r = r
+        self.name = name
+        self.consumer = consumer or uuid.uuid4().hex
+        self.heartbeat_ttl = heartbeat_ttl
+        self.processing = self._processing_key(self.consumer)
+        self._take = r.register_script(self.TAKE)
+        self._recover = r.register_script(self.RECOVER)
+
+    def _processing_key(self, consumer: str) -> str:
+        return f"{self.name}:processing:{consumer}"
+
+    def _heartbeat_key(self, consumer: str) -> str:
+        return f"{self.name}:heartbeat:{consumer}"
+
+    @property
+    def _consumers_key(self) -> str:
+        return f"{self.name}:consumers"
+
+    async def take(self, batch_size: int, timeout: float = 1) -> list[str]:
+        """
+        Wait for a job and move up to ``batch_size`` queued jobs onto the processing list.
+
+        :param batch_size: The maximum number of jobs to take.
+        :type batch_size: int
+        :param timeout: How long to wait for the first job, in seconds.
+        :type timeout: float
+        :return: The serialized jobs, empty if none arrived in time.
+        :rtype: list[str]
+        """
+        job = await self.r.blmove(self.name, self.processing, timeout, "LEFT", "RIGHT")
+        if job is None:
+            return []
+        jobs = [job]
+        if batch_size > 1:
+            jobs.extend(await self._take(keys=[self.name, self.processing], args=[batch_size - 1]))
+        return jobs
+
+    async def ack(self, *jobs: str) -> None:
+        """
+        Remove finished jobs from the processing list.
+
+        :param jobs: The serialized jobs, as returned by :meth:`take`.
+        :type jobs: str
+        """
+        if not jobs:
+            return
+        async with self.r.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.lrem(self.processing, 1, job)
+            await pipe.execute()
+
+    async def heartbeat(self) -> None:
+        """
+        Mark this consumer as alive.
+        """
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.set(self._heartbeat_key(self.consumer), 1, ex=self.heartbeat_ttl)
+            pipe.sadd(self._consumers_key, self.consumer)
+            await pipe.execute()
+
+    async def _requeue(self, consumer: str) -> int:
+        return await self._recover(
+            keys=[self._heartbeat_key(consumer), self._processing_key(consumer), self.name, self._consumers_key],
+            args=[consumer],
+        )
+
+    async def recover(self) -> int:
+        """
+        Put the jobs of dead consumers back onto the queue.
+
+        :return: The number of jobs put back.
+        :rtype: int
+        """
+        moved = 0
+        for consumer in await self.r.smembers(self._consumers_key):
+            consumer = consumer.decode() if isinstance(consumer, bytes) else consumer
+            if consumer != self.consumer:
+                moved += await self._requeue(consumer)
+        if moved:
+            logger.warning("Recovered %d jobs of dead consumers of %s", moved, self.name)
+        return moved
+
+    async def keep_alive(self) -> None:
+        """
+        Send heartbeats and recover the jobs of dead consumers until cancelled.
+        """
+        while True:
+            try:
+                await self.heartbeat()
+                await self.recover()
+            except redis.RedisError as err:
+                logger.warning("Heartbeat of %s failed: %s", self.name, err)
+            await asyncio.sleep(self.heartbeat_ttl / 3)
+
+    async def release(self) -> None:
+        """
+        Put this consumer's unfinished jobs back onto the queue, e.g. on shutdown.
+        """
+        try:
+            await self.r.delete(self._heartbeat_key(self.consumer))
+            await self._requeue(self.consumer)
+        except redis.RedisError as err:
+            logger.warning("Releasing the jobs of %s failed: %s", self.name, err)
@@ -0,0 +1,132 @@
+import logging
+import math
+import time
+
+from typing import Callable, Optional
+
+import redis.asyncio as redis
+from fastapi import Depends, HTTPException, Request, status
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.cache import LRUCache, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Sliding-window rate limits shared by all workers through Redis.
+
+    Each limit counts the accepted requests of the current and the previous fixed
+    window; the previous one is weighted by how much of it still overlaps the
+    sliding window. The check and the increment run in one Lua script, so
+    concurrent requests cannot both take the last slot.
+
+    Every worker also remembers what it has seen. If it alone accepted the whole
+    limit in the current window, or Redis just rejected the client, further
+    requests are rejected locally without a Redis round trip. Both shortcuts can
+    only reject requests Redis would reject as well.
+
+    If Redis is unavailable, requests are let through.
+    """
+    SCRIPT = """
+    local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+    if previous * tonumber(ARGV[3]) + current >= tonumber(ARGV[1]) then
+        return 0
+    end
+    redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2] * 2)
+    return 1
+    """
+
+    def __init__(self, r: redis.Redis, local_size: int = 10000, enabled: bool = True):
+        self.r = r
+        self.enabled = enabled
+        self.local = LRUCache(local_size, ttl=float("inf"))
+        self._script = r.register_script(self.SCRIPT)
+
+    async def hit(self, key: str, times: int, seconds: int) -> Optional[float]:
+        """
+        Count a request against a limit.
+
+        :param key: The limited client and route, e.g. ``login:203.0.113.7``.
+        :type key: str
+        :param times: The number of requests allowed per window.
+        :type times: int
+        :param seconds: The length of the window.
+        :type seconds: int
+        :return: None if the request is allowed, otherwise the seconds to wait before retrying.
+        :rtype: float | None
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        window, elapsed = divmod(now, seconds)
+        # [window, requests this worker let through in it, locally blocked until]
+        state = self.local.get(key)
+        if state is None or state[0] != window:
+            state = [window, 0, state[2] if state else 0.0]
+            self.local.set(key, state, ttl=2 * seconds)
+        if state[2] > now:
+            return state[2] - now
+        if state[1] >= times:
+            return seconds - elapsed
+
+        # The hash tag keeps both windows of a key in one cluster slot.
+        keys = [f"ratelimit:{{{key}}}:{int(window)}", f"ratelimit:{{{key}}}:{int(window) - 1}"]
+        try:
+            allowed = await self._script(keys=keys, args=[times, seconds, 1 - elapsed / seconds])
+        except redis.RedisError as err:
+            logger.warning("Rate limiter unavailable: %s", err)
+            return None
+        if allowed:
+            state[1] += 1
+            return None
+        # A slot frees up roughly every seconds / times as the window slides on.
+        state[2] = now + seconds / times
+        return seconds / times
+
+
+rate_limiter = RateLimiter(redis_client, settings.rate_limit_local_size, settings.rate_limit_enabled)
+
+
+def _reject(retry_after: float):
+    raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests",
+                        headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+def rate_limit(name: str, times: int, seconds: int, per: str = "user") -> Callable:
+    """
+    Create a dependency that limits a route.
+
+    :param name: The name the route's counters are kept under.
+    :type name: str
+    :param times: The number of requests allowed per window.
+    :type times: int
+    :param seconds: The length of the window.
+    :type seconds: int
+    :param per: ``user`` to limit each authenticated user, ``ip`` to limit each client address.
+    :type per: str
+    :raises HTTPException: 429 with a ``Retry-After`` header once the limit is reached.
+    :return: The dependency.
+    :rtype: Callable
+    """
+    if per == "user":
+        async def limit_user(current_user: User = Depends(auth_service.get_current_user)):
+            retry_after = await rate_limiter.hit(f"{name}:user:{current_user.id}", times, seconds)
+            if retry_after is not None:
+                _reject(retry_after)
+        return limit_user
+
+    if per == "ip":
+        async def limit_ip(request: Request):
+            client = request.client.host if request.client else "unknown"
+            retry_after = await rate_limiter.hit(f"{name}:ip:{client}", times, seconds)
+            if retry_after is not None:
+                _reject(retry_after)
+        return limit_ip
+
+    raise ValueError(f"Unknown rate limit scope: {per}")
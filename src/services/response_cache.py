@@ -0,0 +1,190 @@
+import functools
+import hashlib
+import inspect
+import logging
+
+from typing import Any, Callable, Iterable, Optional
+
+import redis.asyncio as redis
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+
+from src.conf.config import settings
+from src.services.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "respgen"
+
+# KEYS: the entry, then respinv:{tag} and resptag:{tag} for each of the n tags.
+# ARGV: the generation the miss started at, etag, body, ttl, n.
+SET_SCRIPT = """
+local n = tonumber(ARGV[5])
+for i = 2, n + 1 do
+    if tonumber(redis.call('GET', KEYS[i]) or '0') > tonumber(ARGV[1]) then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], 'etag', ARGV[2], 'body', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+for i = n + 2, 2 * n + 1 do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+end
+return 1
+"""
+
+# KEYS: respgen, then respinv:{tag} and resptag:{tag} for each of the n tags.
+# ARGV: n, how long the invalidation marks are kept.
+INVALIDATE_SCRIPT = """
+local n = tonumber(ARGV[1])
+local generation = redis.call('INCR', KEYS[1])
+for i = 2, n + 1 do
+    redis.call('SET', KEYS[i], generation, 'EX', ARGV[2])
+    local members = redis.call('SMEMBERS', KEYS[i + n])
+    for j = 1, #members, 1000 do
+        redis.call('DEL', unpack(members, j, math.min(j + 999, #members)))
+    end
+    redis.call('DEL', KEYS[i + n])
+end
+return generation
+"""
+
+
+class ResponseCache:
+    """
+    Redis cache of serialized GET responses, invalidated by dependency tags.
+
+    A cached response is stored under ``resp:{path}?{query}`` together with its
+    ETag. Each entry is tagged with the entities it was built from (``photo:{id}``,
+    ``user:{id}``, ...); the set ``resptag:{tag}`` lists the entries carrying the
+    tag, so a mutation drops exactly the responses that showed the changed entity.
+
+    A miss remembers the invalidation generation it started at and is only
+    stored if none of its tags was invalidated since, so a slow miss cannot put
+    back a response built from the state before a write. Misses should read
+    from the primary: a lagging replica could still return the old state after
+    the invalidation.
+
+    Redis errors never fail a request: the endpoint is then simply not cached.
+    """
+
+    def __init__(self, r: redis.Redis, ttl: int = 300):
+        self.r = r
+        self.ttl = ttl
+        self._set_script = r.register_script(SET_SCRIPT)
+        self._invalidate_script = r.register_script(INVALIDATE_SCRIPT)
+
+    @staticmethod
+    def _key(request: Request) -> str:
+        query = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+        return f"resp:{request.url.path}?{query}"
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"resptag:{tag}"
+
+    @staticmethod
+    def _invalidated_key(tag: str) -> str:
+        return f"respinv:{tag}"
+
+    @staticmethod
+    def _response(body: bytes, etag: str, request: Request) -> Response:
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", "").replace("W/", "").split(", "):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def _get(self, key: str) -> tuple[Optional[dict], Optional[int]]:
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.hgetall(key)
+                pipe.get(GENERATION_KEY)
+                entry, generation = await pipe.execute()
+            return entry, int(generation or 0)
+        except redis.RedisError as err:
+            logger.warning("Reading cached response failed: %s", err)
+            return None, None
+
+    async def _set(self, key: str, body: bytes, etag: str, tags: list[str], ttl: int, generation: int) -> bool:
+        try:
+            stored = await self._set_script(
+                keys=[key, *(self._invalidated_key(tag) for tag in tags), *(self._tag_key(tag) for tag in tags)],
+                args=[generation, etag, body, ttl, len(tags)],
+            )
+            return bool(stored)
+        except redis.RedisError as err:
+            logger.warning("Caching response failed: %s", err)
+            return False
+
+    async def invalidate(self, *tags: str) -> None:
+        """
+        Drop every cached response carrying any of the tags.
+
+        Call after the mutation is committed. Each invalidation advances a
+        generation and marks the tags with it; a miss that began before (and so
+        may have read the old state) is not stored afterwards.
+
+        :param tags: The dependency tags, e.g. ``photo:1``.
+        :type tags: str
+        """
+        if not tags:
+            return
+        try:
+            await self._invalidate_script(
+                keys=[GENERATION_KEY, *(self._invalidated_key(tag) for tag in tags),
+                      *(self._tag_key(tag) for tag in tags)],
+                args=[len(tags), self.ttl],
+            )
+        except redis.RedisError as err:
+            logger.warning("Invalidating cached responses failed: %s", err)
+
+    def cached(self, model: Any, tags: Callable[[Any], Iterable[str]], ttl: Optional[int] = None):
+        """
+        Cache a GET endpoint's response.
+
+        The endpoint's dependencies (authentication included) still run on every
+        request; the endpoint itself only runs on a miss. A request whose
+        ``If-None-Match`` matches the cached ETag gets a 304 without a body.
+
+        :param model: The response model the result is serialized with.
+        :param tags: Returns the dependency tags of a result.
+        :type tags: Callable
+        :param ttl: The lifetime of entries in seconds, the cache default if omitted.
+        :type ttl: int
+        """
+        adapter = TypeAdapter(model)
+
+        def decorator(endpoint):
+            signature = inspect.signature(endpoint)
+            request_name = next(
+                (name for name, param in signature.parameters.items() if param.annotation is Request), None
+            )
+            parameters = list(signature.parameters.values())
+            if request_name is None:
+                request_name = "cache_request"
+                parameters.append(inspect.Parameter(request_name, inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                request = kwargs[request_name]
+                if request_name == "cache_request":
+                    del kwargs[request_name]
+                key = self._key(request)
+                entry, generation = await self._get(key)
+                if entry:
+                    return self._response(entry[b"body"], entry[b"etag"].decode(), request)
+                result = await endpoint(*args, **kwargs)
+                body = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if generation is not None:
+                    await self._set(key, body, etag, list(tags(result)), ttl or self.ttl, generation)
+                return self._response(body, etag, request)
+
+            wrapper.__signature__ = signature.replace(parameters=parameters)
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache(redis_client, settings.response_cache_ttl)
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import logging
+import math
+
+from typing import Optional
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over SHA-256 token digests.
+
+    The digests are already uniformly distributed, so the bit positions are derived
+    from them directly with double hashing instead of hashing again.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: The number of items the filter is sized for.
+        :type capacity: int
+        :param error_rate: The target false-positive rate at capacity.
+        :type error_rate: float
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, digest: bytes) -> None:
+        """
+        Add a digest to the filter.
+
+        :param digest: The SHA-256 digest of the item.
+        :type digest: bytes
+        """
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    @property
+    def false_positive_rate(self) -> float:
+        """
+        The expected false-positive rate for the items added so far.
+        """
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class RevocationList:
+    """
+    Revoked access tokens, checked through an in-process Bloom filter.
+
+    Redis stays the source of truth (``blacklist:{token}`` keys); every worker keeps a
+    filter of revoked digests that is loaded on start, fed from the ``blacklist``
+    pub/sub channel and rebuilt periodically to shed expired tokens. Only tokens the
+    filter reports as possibly revoked pay a Redis round trip.
+    """
+    CHANNEL = "blacklist"
+
+    def __init__(self, r: redis.Redis, capacity: int = 100000, error_rate: float = 0.001,
+                 rebuild_interval: float = 900):
+        self.r = r
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.filter = BloomFilter(capacity, error_rate)
+        self.ready = False
+        self.checks = 0
+        self.redis_lookups = 0
+        self.false_positives = 0
+        self._lock = asyncio.Lock()
+        self._added_during_rebuild: Optional[list[bytes]] = None
+        self._tasks: list[asyncio.Task] = []
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return f"blacklist:{token}"
+
+    def _add(self, digest: bytes) -> None:
+        self.filter.add(digest)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(digest)
+
+    async def revoke(self, token: str, digest: bytes, expires_delta: int) -> None:
+        """
+        Revoke a token and notify the other workers.
+
+        :param token: The encoded token.
+        :type token: str
+        :param digest: The SHA-256 digest of the token.
+        :type digest: bytes
+        :param expires_delta: How long the revocation is kept, in seconds.
+        :type expires_delta: int
+        """
+        self._add(digest)
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.setex(self._key(token), expires_delta, "revoked")
+            pipe.publish(self.CHANNEL, digest)
+            await pipe.execute()
+
+    async def is_revoked(self, token: str, digest: bytes) -> bool:
+        """
+        Check whether a token has been revoked.
+
+        :param token: The encoded token.
+        :type token: str
+        :param digest: The SHA-256 digest of the token.
+        :type digest: bytes
+        :return: True if the token is revoked.
+        :rtype: bool
+        """
+        self.checks += 1
+        if self.ready and digest not in self.filter:
+            return False
+        self.redis_lookups += 1
+        revoked = bool(await self.r.exists(self._key(token)))
+        if self.ready and not revoked:
+            self.false_positives += 1
+        return revoked
+
+    async def rebuild(self) -> None:
+        """
+        Rebuild the filter from the revocations currently stored in Redis.
+        """
+        async with self._lock:
+            # Revocations that arrive while scanning may be missed by the scan,
+            # so they are replayed into the new filter before it is swapped in.
+            self._added_during_rebuild = []
+            try:
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                prefix = len(self._key(""))
+                async for key in self.r.scan_iter(match=self._key("*"), count=1000):
+                    bloom.add(hashlib.sha256(key[prefix:]).digest())
+                for digest in self._added_during_rebuild:
+                    bloom.add(digest)
+                self.filter = bloom
+            finally:
+                self._added_during_rebuild = None
+            self.ready = True
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.r.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    # Anything revoked while we were not subscribed is picked up here.
+                    await self.rebuild()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._add(message["data"])
+                            if self.filter.count > self.capacity:
+                                await self.rebuild()
+            except redis.RedisError as err:
+                self.ready = False
+                logger.warning("Revocation list subscription failed: %s", err)
+                await asyncio.sleep(1)
+
+    async def _rebuild_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self.rebuild()
+            except redis.RedisError as err:
+                logger.warning("Rebuilding the revocation filter failed: %s", err)
+
+    def start(self) -> None:
+        """
+        Start syncing the filter from Redis in the background.
+        """
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._rebuild_periodically()),
+        ]
+
+    async def stop(self) -> None:
+        """
+        Stop the background sync.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.ready = False
+
+    def metrics(self) -> dict:
+        """
+        Report the filter size and accuracy.
+
+        :return: The filter metrics.
+        :rtype: dict
+        """
+        return {
+            "items": self.filter.count,
+            "memory_bytes": self.filter.memory_bytes,
+            "hash_count": self.filter.hash_count,
+            "expected_false_positive_rate": self.filter.false_positive_rate,
+            "checks": self.checks,
+            "redis_lookups": self.redis_lookups,
+            "false_positives": self.false_positives,
+        }
+
+
+revocation_list = RevocationList(
+    redis_client,
+    settings.revocation_filter_capacity,
+    settings.revocation_filter_error_rate,
+    settings.revocation_rebuild_interval,
+)
@@ -0,0 +1,400 @@
+import asyncio
+import hashlib
+import json
+import shutil
+import uuid
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Optional
+
+import cloudinary
+import cloudinary.utils
+import urllib3
+from fastapi import HTTPException, UploadFile, status
+from fastapi.staticfiles import StaticFiles
+from PIL import Image
+from starlette.responses import Response
+
+from src.conf.config import settings
+
+# The formats photos are accepted in, with the extension they are stored under.
+IMAGE_SUFFIXES = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+
+
+class StorageWriter(ABC):
+    """
+    Incremental writer returned by :meth:`StorageBackend.open_writer`.
+
+    Chunks are written as they arrive; the object only becomes visible under its key
+    once :meth:`commit` is called.
+    """
+
+    @abstractmethod
+    async def write(self, chunk: bytes) -> None:
+        """
+        Append a chunk to the object.
+        """
+
+    @abstractmethod
+    async def commit(self, key: str) -> None:
+        """
+        Make the written object visible under ``key``.
+        """
+
+    @abstractmethod
+    async def abort(self) -> None:
+        """
+        Discard what was written.
+        """
+
+
+class StorageBackend(ABC):
+    """
+    Base class for the backends photos are stored in.
+    """
+
+    @abstractmethod
+    async def open_writer(self) -> StorageWriter:
+        """
+        Start writing a new object.
+        """
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes:
+        """
+        Read a whole object.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """
+        Delete an object; a missing one is not an error.
+        """
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """
+        The public URL of an object.
+        """
+
+
+class LocalWriter(StorageWriter):
+    def __init__(self, root: Path, tmp_dir: Path):
+        self.root = root
+        self.path = tmp_dir / uuid.uuid4().hex
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "wb")
+
+    async def write(self, chunk: bytes) -> None:
+        await asyncio.to_thread(self.file.write, chunk)
+
+    def _commit(self, key: str) -> None:
+        self.file.close()
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(self.path, target)
+
+    async def commit(self, key: str) -> None:
+        await asyncio.to_thread(self._commit, key)
+
+    def _abort(self) -> None:
+        self.file.close()
+        self.path.unlink(missing_ok=True)
+
+    async def abort(self) -> None:
+        await asyncio.to_thread(self._abort)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Store files on the local filesystem, served by the app under ``base_url``.
+
+    Files are written to ``tmp_dir`` first and moved under ``root`` on commit, so
+    partial uploads are never served.
+    """
+
+    def __init__(self, root: str, base_url: str, tmp_dir: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.tmp_dir = Path(tmp_dir)
+
+    async def open_writer(self) -> StorageWriter:
+        return await asyncio.to_thread(LocalWriter, self.root, self.tmp_dir)
+
+    async def read(self, key: str) -> bytes:
+        return await asyncio.to_thread((self.root / key).read_bytes)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread((self.root / key).unlink, missing_ok=True)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class MediaFiles(StaticFiles):
+    """
+    Serve :class:`LocalStorage` files with ``X-Content-Type-Options: nosniff``, so
+    browsers never treat a stored file as anything but its declared type.
+    """
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        return response
+
+
+async def iter_upload(file: UploadFile, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Read an uploaded file in chunks.
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :param chunk_size: The size of each chunk in bytes.
+    :type chunk_size: int
+    :return: The file contents, chunk by chunk.
+    :rtype: AsyncIterator[bytes]
+    """
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+@dataclass(slots=True)
+class StagedObject:
+    """
+    A file streamed into a backend whose key is chosen once its hash is known.
+
+    Exactly one of :meth:`commit` or :meth:`abort` must be called.
+    """
+    writer: StorageWriter
+    size: int
+    sha256: str
+    suffix: str = ""
+
+    async def commit(self, key: str) -> None:
+        await self.writer.commit(key)
+
+    async def abort(self) -> None:
+        await self.writer.abort()
+
+
+async def stage_stream(chunks: AsyncIterator[bytes], backend: StorageBackend, max_size: int) -> StagedObject:
+    """
+    Stream chunks into a storage backend, hashing and size-checking them on the fly.
+
+    Only one chunk is held in memory at a time.
+
+    :param chunks: The file contents.
+    :type chunks: AsyncIterator[bytes]
+    :param backend: The backend to store the file in.
+    :type backend: StorageBackend
+    :param max_size: The maximum accepted size in bytes.
+    :type max_size: int
+    :raises HTTPException: 413 if the file is larger than ``max_size``.
+    :return: The staged, not yet visible, object.
+    :rtype: StagedObject
+    """
+    digest = hashlib.sha256()
+    size = 0
+    writer = await backend.open_writer()
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                    detail="File is too large")
+            digest.update(chunk)
+            await writer.write(chunk)
+    except BaseException:
+        await writer.abort()
+        raise
+    return StagedObject(writer=writer, size=size, sha256=digest.hexdigest())
+
+
+def image_suffix(file: BinaryIO) -> str:
+    """
+    Check that a file is an image in one of the accepted formats.
+
+    The file is left at its start.
+
+    :param file: The file.
+    :type file: BinaryIO
+    :raises HTTPException: 415 if the file is not a valid JPEG, PNG, GIF or WebP image.
+    :return: The extension of the detected format.
+    :rtype: str
+    """
+    try:
+        with Image.open(file, formats=list(IMAGE_SUFFIXES)) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:
+        image_format = None
+    finally:
+        file.seek(0)
+    if image_format not in IMAGE_SUFFIXES:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Only JPEG, PNG, GIF and WebP images are accepted")
+    return IMAGE_SUFFIXES[image_format]
+
+
+def blob_key(sha256: str, suffix: str = "") -> str:
+    """
+    A new key for a photo blob, derived from its contents.
+
+    Every blob row gets a key of its own, so the file of a released blob can be
+    deleted after the fact without hitting a later upload of the same contents.
+
+    :param sha256: The hex SHA-256 of the contents.
+    :type sha256: str
+    :param suffix: The file extension to keep on the key.
+    :type suffix: str
+    :return: The storage key.
+    :rtype: str
+    """
+    return f"blobs/{sha256[:2]}/{sha256}-{uuid.uuid4().hex[:12]}{suffix}"
+
+
+async def stage_upload(file: UploadFile, backend: Optional[StorageBackend] = None) -> StagedObject:
+    """
+    Check that an uploaded photo is an image and stream it into storage without publishing it yet.
+
+    The staged object's suffix comes from the detected format, never from the file name.
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :param backend: The backend to use, the configured one by default.
+    :type backend: StorageBackend
+    :raises HTTPException: 415 if the file is not an accepted image.
+    :return: The staged object.
+    :rtype: StagedObject
+    """
+    suffix = await asyncio.to_thread(image_suffix, file.file)
+    staged = await stage_stream(iter_upload(file, settings.upload_chunk_size), backend or storage_backend,
+                                settings.max_upload_size)
+    staged.suffix = suffix
+    return staged
+
+
+class CloudinaryUploader:
+    """
+    Non-blocking Cloudinary client.
+
+    Requests are signed with the SDK's public helpers and sent over a keep-alive
+    pool of our own, sized to the concurrency limit, so the actual response status
+    is seen (``cloudinary.uploader`` reports a 500 as ``http_code`` 200). Uploads
+    run in worker threads, at most ``concurrency`` at a time, with a per-request
+    timeout and exponential backoff on transport and 5xx errors.
+    """
+
+    def __init__(self, concurrency: int = 4, timeout: float = 30, retries: int = 2, backoff: float = 0.5):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._http: Optional[urllib3.PoolManager] = None
+
+    def configure(self, cloud_name: str, api_key: str, api_secret: str, upload_prefix: Optional[str] = None) -> None:
+        """
+        Configure the SDK credentials and the pooled HTTP connector.
+
+        :param cloud_name: The Cloudinary cloud name.
+        :type cloud_name: str
+        :param api_key: The Cloudinary API key.
+        :type api_key: str
+        :param api_secret: The Cloudinary API secret.
+        :type api_secret: str
+        :param upload_prefix: Base URL of the upload API, e.g. a local stub in tests.
+        :type upload_prefix: str
+        """
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True,
+                          upload_prefix=upload_prefix or None)
+        pool_options = dict(cloudinary.CERT_KWARGS, maxsize=self.concurrency, block=True, retries=False)
+        self._http = cloudinary.utils.get_http_connector(cloudinary.config(), pool_options)
+
+    def _request(self, file: BinaryIO, options: dict) -> tuple[int, dict]:
+        # The same request cloudinary.uploader.upload builds, without its status mapping.
+        params = cloudinary.utils.cleanup_params(cloudinary.utils.build_upload_params(**options))
+        params = cloudinary.utils.sign_request(params, options)
+        fields = []
+        for name, value in params.items():
+            if isinstance(value, list):
+                fields.extend((f"{name}[]", item) for item in value)
+            elif value:
+                fields.append((name, value))
+        fields.append(("file", cloudinary.utils.handle_file_parameter(file, options.get("filename"))))
+        response = self._http.request("POST", cloudinary.utils.cloudinary_api_url("upload", **options),
+                                      fields=fields, headers={"User-Agent": cloudinary.get_user_agent()},
+                                      timeout=self.timeout)
+        try:
+            result = json.loads(response.data)
+        except ValueError:
+            result = {"error": {"message": f"Unexpected response ({response.status})"}}
+        return response.status, result
+
+    async def upload(self, file: BinaryIO, **options: Any) -> dict:
+        """
+        Upload a file without blocking the event loop.
+
+        :param file: The file to upload.
+        :type file: BinaryIO
+        :param options: Upload options passed to ``cloudinary.uploader.upload``.
+        :raises HTTPException: 502 if Cloudinary rejects the file or stays unavailable.
+        :return: The upload result.
+        :rtype: dict
+        """
+        if self._http is None:
+            self.configure(settings.cloudinary_name, settings.cloudinary_api_key, settings.cloudinary_api_secret,
+                           settings.cloudinary_upload_prefix)
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                file.seek(0)
+                try:
+                    code, result = await asyncio.to_thread(self._request, file, options)
+                except (urllib3.exceptions.HTTPError, OSError) as err:
+                    error = str(err)
+                    continue
+                if code < 300 and "error" not in result:
+                    return result
+                error = result.get("error", {}).get("message") or f"HTTP {code}"
+                if code < 500:
+                    break
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Upload failed: {error}")
+
+    @staticmethod
+    def build_url(public_id: str, **options: Any) -> str:
+        """
+        Build the delivery URL of an uploaded image.
+
+        :param public_id: The public ID of the image.
+        :type public_id: str
+        :return: The image URL.
+        :rtype: str
+        """
+        return cloudinary.CloudinaryImage(public_id).build_url(**options)
+
+
+def get_backend(name: str) -> StorageBackend:
+    """
+    Create the storage backend configured by name.
+
+    :param name: The backend name.
+    :type name: str
+    :return: The storage backend.
+    :rtype: StorageBackend
+    """
+    if name == "local":
+        return LocalStorage(settings.storage_root, settings.media_url, settings.upload_tmp_dir)
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+storage_backend = get_backend(settings.storage_backend)
+cloudinary_uploader = CloudinaryUploader(
+    settings.cloudinary_concurrency,
+    settings.cloudinary_timeout,
+    settings.cloudinary_retries,
+    settings.cloudinary_retry_backoff,
+)
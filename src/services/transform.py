@@ -0,0 +1,385 @@
+import asyncio
+import io
+import json
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, ClassVar, Optional, Sequence
+
+import redis.asyncio as redis
+from PIL import Image, ImageOps
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.conf.config import settings
+from src.database.db import sessionmanager
+from src.database.models import Photo, PhotoBlob, TransformPhotos
+from src.services.cache import redis_client
+from src.services.queue import ReliableQueue
+from src.services.storage import StorageBackend, storage_backend
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class TransformSpec:
+    """
+    A derivative of a photo: its bounding box and how the photo is fitted into it.
+
+    ``fit`` keeps the aspect ratio inside the box, ``fill`` crops to the exact size.
+    The canonical form, e.g. ``200x200-fill``, names the derivative everywhere.
+    """
+    MODES: ClassVar[tuple[str, ...]] = ("fit", "fill")
+
+    width: int
+    height: int
+    mode: str = "fit"
+
+    @classmethod
+    def parse(cls, value: str) -> "TransformSpec":
+        """
+        Parse a spec from its canonical form.
+
+        :param value: The spec, e.g. ``200x200-fill``.
+        :type value: str
+        :raises ValueError: If the spec is malformed.
+        :return: The spec.
+        :rtype: TransformSpec
+        """
+        size, _, mode = value.strip().partition("-")
+        width, _, height = size.partition("x")
+        if not (width.isdigit() and height.isdigit()) or mode not in cls.MODES:
+            raise ValueError(f"Invalid transformation: {value}")
+        if not (0 < int(width) <= 4096 and 0 < int(height) <= 4096):
+            raise ValueError(f"Invalid transformation size: {value}")
+        return cls(int(width), int(height), mode)
+
+    def __str__(self) -> str:
+        return f"{self.width}x{self.height}-{self.mode}"
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """
+    Compute the 64-bit difference hash of an image.
+
+    Near-identical images (re-encoded, resized) get hashes a few bits apart.
+
+    :param image: The image.
+    :type image: Image.Image
+    :return: The hash as 16 hex digits.
+    :rtype: str
+    """
+    pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def render(data: bytes, specs: Sequence[TransformSpec]) -> tuple[list[bytes], str]:
+    """
+    Produce the JPEG derivatives and the perceptual hash of an image.
+
+    Runs in a worker process; the source is decoded once for all of its specs.
+
+    :param data: The original image.
+    :type data: bytes
+    :param specs: The derivatives to produce.
+    :type specs: Sequence[TransformSpec]
+    :return: The encoded derivatives, in the order of ``specs``, and the perceptual hash.
+    :rtype: tuple[list[bytes], str]
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        results = []
+        for spec in specs:
+            if spec.mode == "fill":
+                derivative = ImageOps.fit(image, (spec.width, spec.height), Image.LANCZOS)
+            else:
+                derivative = image.copy()
+                derivative.thumbnail((spec.width, spec.height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            derivative.save(buffer, "JPEG", quality=85, optimize=True)
+            results.append(buffer.getvalue())
+        return results, perceptual_hash(image)
+
+
+class TransformQueue:
+    """
+    Redis-backed queue of photos waiting for their derivatives.
+
+    Every queued ``(photo, spec)`` pair is claimed with ``SET NX`` first, so a spec
+    that is already waiting for a photo is not queued twice. The claim is released
+    once the job is done. Taken jobs stay on the worker's processing list until
+    then, see :class:`ReliableQueue`, so the jobs of a worker that dies are taken
+    again instead of being lost behind their claims. Jobs that fail are kept on
+    ``transform:dead`` for inspection.
+    """
+    QUEUE = "transform:queue"
+    DEAD = "transform:dead"
+
+    def __init__(self, r: redis.Redis, specs: Sequence[TransformSpec], dedupe_ttl: int = 3600,
+                 heartbeat_ttl: int = 60):
+        self.r = r
+        self.specs = list(specs)
+        self.dedupe_ttl = dedupe_ttl
+        self.queue = ReliableQueue(r, self.QUEUE, heartbeat_ttl=heartbeat_ttl)
+
+    @staticmethod
+    def _pending_key(photo_id: int, spec: str) -> str:
+        return f"transform:{photo_id}:{spec}"
+
+    async def enqueue(self, photo_id: int, storage_key: str,
+                      specs: Optional[Sequence[TransformSpec]] = None) -> int:
+        """
+        Queue the derivatives of a photo.
+
+        :param photo_id: The ID of the photo.
+        :type photo_id: int
+        :param storage_key: The storage key of the original.
+        :type storage_key: str
+        :param specs: The derivatives to produce, the configured ones by default.
+        :type specs: Sequence[TransformSpec]
+        :return: The number of specs queued; those already waiting are skipped.
+        :rtype: int
+        """
+        names = list(dict.fromkeys(str(spec) for spec in (specs or self.specs)))
+        async with self.r.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.set(self._pending_key(photo_id, name), 1, nx=True, ex=self.dedupe_ttl)
+            claimed = await pipe.execute()
+        fresh = [name for name, ok in zip(names, claimed) if ok]
+        if fresh:
+            job = {"photo_id": photo_id, "storage_key": storage_key, "specs": fresh}
+            await self.r.rpush(self.QUEUE, json.dumps(job))
+        return len(fresh)
+
+    async def take(self, batch_size: int, timeout: float = 5) -> list[str]:
+        """
+        Wait for a job and take up to ``batch_size`` queued jobs at once.
+
+        :param batch_size: The maximum number of jobs to take.
+        :type batch_size: int
+        :param timeout: How long to wait for the first job, in seconds.
+        :type timeout: float
+        :return: The serialized jobs, empty if none arrived in time.
+        :rtype: list[str]
+        """
+        return await self.queue.take(batch_size, timeout)
+
+    async def done(self, taken: Sequence[str], jobs: Sequence[dict], failed: Optional[dict] = None) -> None:
+        """
+        Acknowledge taken jobs and release the claims of their specs.
+
+        :param taken: The serialized jobs, as returned by :meth:`take`.
+        :type taken: Sequence[str]
+        :param jobs: The jobs that could be read, whose claims are released.
+        :type jobs: Sequence[dict]
+        :param failed: The reasons of the failed jobs, by serialized job; they are moved to the dead list.
+        :type failed: dict
+        """
+        keys = [self._pending_key(job["photo_id"], spec) for job in jobs for spec in job["specs"]]
+        async with self.r.pipeline(transaction=True) as pipe:
+            for raw, error in (failed or {}).items():
+                text = raw.decode(errors="replace") if isinstance(raw, bytes) else raw
+                pipe.rpush(self.DEAD, json.dumps({"job": text, "error": error}))
+            for raw in taken:
+                pipe.lrem(self.queue.processing, 1, raw)
+            if keys:
+                pipe.delete(*keys)
+            await pipe.execute()
+
+
+def _read_job(raw: str) -> dict:
+    job = json.loads(raw)
+    if not (isinstance(job, dict) and isinstance(job.get("photo_id"), int)
+            and isinstance(job.get("storage_key"), str) and isinstance(job.get("specs"), list)):
+        raise ValueError("Malformed transform job")
+    for spec in job["specs"]:
+        TransformSpec.parse(spec)
+    return job
+
+
+class TransformWorker:
+    """
+    Consumes the transform queue, rendering derivatives in a process pool.
+
+    Jobs are taken in batches; specs repeated for the same photo within a batch are
+    rendered once and all resulting ``TransformPhotos`` rows are written with a
+    single ``INSERT ... ON CONFLICT DO NOTHING``. The perceptual hashes of the
+    originals are recorded on their blobs in the same transaction.
+    """
+
+    def __init__(self, queue: TransformQueue, backend: StorageBackend, workers: int = 2,
+                 batch_size: int = 16, session_factory: Callable = sessionmanager.session):
+        self.queue = queue
+        self.backend = backend
+        self.workers = workers
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def derivative_key(photo_id: int, spec: TransformSpec) -> str:
+        return f"transforms/{photo_id}/{spec}.jpg"
+
+    async def _transform(self, photo_id: int, storage_key: str,
+                         specs: Sequence[TransformSpec]) -> tuple[list[dict], dict]:
+        data = await self.backend.read(storage_key)
+        loop = asyncio.get_running_loop()
+        images, phash = await loop.run_in_executor(self._executor, render, data, specs)
+        rows = []
+        for spec, image in zip(specs, images):
+            key = self.derivative_key(photo_id, spec)
+            writer = await self.backend.open_writer()
+            try:
+                await writer.write(image)
+                await writer.commit(key)
+            except BaseException:
+                await writer.abort()
+                raise
+            rows.append({"photo_id": photo_id, "spec": str(spec), "storage_key": key,
+                         "photo_url": self.backend.url(key)})
+        return rows, {"blob_key": storage_key, "phash": phash}
+
+    async def _save(self, rows: list[dict], hashes: list[dict]) -> int:
+        async with self.session_factory() as db:
+            await db.execute(
+                PhotoBlob.__table__.update()
+                .where(PhotoBlob.storage_key == bindparam("blob_key"), PhotoBlob.phash.is_(None))
+                .values(phash=bindparam("phash")),
+                hashes,
+            )
+            photo_ids = {row["photo_id"] for row in rows}
+            existing = set((await db.execute(select(Photo.id).where(Photo.id.in_(photo_ids)))).scalars())
+            # Photos removed while their derivatives were rendering leave nothing behind.
+            for row in rows:
+                if row["photo_id"] not in existing:
+                    try:
+                        await self.backend.delete(row["storage_key"])
+                    except Exception as err:
+                        logger.warning("Deleting orphaned derivative %s failed: %r", row["storage_key"], err)
+            rows = [row for row in rows if row["photo_id"] in existing]
+            if rows:
+                await db.execute(
+                    insert(TransformPhotos).values(rows)
+                    .on_conflict_do_nothing(index_elements=["photo_id", "spec"])
+                )
+            await db.commit()
+            return len(rows)
+
+    async def process(self, taken: Sequence[str]) -> int:
+        """
+        Render and record the derivatives of a batch of jobs.
+
+        A job that cannot be read, or whose photo fails to render, is moved to the
+        dead list without affecting the rest of the batch.
+
+        :param taken: The serialized jobs taken from the queue.
+        :type taken: Sequence[str]
+        :return: The number of derivatives recorded.
+        :rtype: int
+        """
+        jobs: dict[str, dict] = {}
+        failed: dict[str, str] = {}
+        for raw in taken:
+            try:
+                jobs[raw] = _read_job(raw)
+            except (ValueError, TypeError, AttributeError) as err:
+                logger.error("Discarding transform job %.200s: %r", raw, err)
+                failed[raw] = repr(err)
+
+        photos: dict[int, tuple[str, set[str]]] = {}
+        for job in jobs.values():
+            _, specs = photos.setdefault(job["photo_id"], (job["storage_key"], set()))
+            specs.update(job["specs"])
+        results = await asyncio.gather(
+            *(self._transform(photo_id, storage_key, [TransformSpec.parse(spec) for spec in sorted(specs)])
+              for photo_id, (storage_key, specs) in photos.items()),
+            return_exceptions=True,
+        )
+        rows, hashes, errors = [], [], {}
+        for photo_id, result in zip(photos, results):
+            if isinstance(result, BaseException):
+                logger.error("Transforming photo %s failed: %r", photo_id, result)
+                errors[photo_id] = repr(result)
+            else:
+                rows.extend(result[0])
+                hashes.append(result[1])
+        written = 0
+        try:
+            written = await self._save(rows, hashes) if hashes else 0
+        except Exception as err:
+            logger.exception("Recording derivatives failed")
+            errors.update((photo_id, repr(err)) for photo_id in photos if photo_id not in errors)
+        failed.update((raw, errors[job["photo_id"]]) for raw, job in jobs.items() if job["photo_id"] in errors)
+        await self.queue.done(taken, list(jobs.values()), failed)
+        return written
+
+    async def run(self) -> None:
+        """
+        Process jobs until cancelled.
+        """
+        keep_alive = asyncio.create_task(self.queue.queue.keep_alive())
+        try:
+            while True:
+                try:
+                    jobs = await self.queue.take(self.batch_size)
+                    if jobs:
+                        await self.process(jobs)
+                except Exception:
+                    logger.exception("Transform worker error")
+                    await asyncio.sleep(1)
+        finally:
+            keep_alive.cancel()
+
+    def start(self) -> None:
+        """
+        Start the process pool and consume the queue in the background.
+        """
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop consuming the queue and shut the process pool down.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.queue.queue.release()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+transform_queue = TransformQueue(
+    redis_client,
+    [TransformSpec.parse(spec) for spec in settings.transform_specs.split(",") if spec.strip()],
+    settings.transform_dedupe_ttl,
+)
+transform_worker = TransformWorker(
+    transform_queue,
+    storage_backend,
+    settings.transform_workers,
+    settings.transform_batch_size,
+)
+
+
+if __name__ == "__main__":
+    # A standalone worker, for deployments that disable the in-app one
+    # with TRANSFORM_WORKER_ENABLED=false.
+    async def main():
+        transform_worker.start()
+        try:
+            await transform_worker._task
+        finally:
+            await transform_worker.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import time
+import uuid
+
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+
+import redis.asyncio as redis
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+from src.services.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class ResumableUploads:
+    """
+    Chunked uploads of large originals that can be resumed after a dropped connection.
+
+    The bytes received so far are appended to a staging file; the owner and the
+    committed offset live in Redis under ``upload:{id}`` and expire with the session.
+    A client asks for the offset and continues from there.
+
+    One append at a time holds ``upload:{id}:lock``. The lock has a short TTL of its
+    own that the append keeps extending while data arrives, so a crashed append
+    blocks the upload for ``lock_ttl`` seconds at most. Staging files whose session
+    expired are removed by :meth:`purge`, which runs every ``cleanup_interval``.
+    """
+
+    # KEYS: lock. ARGV: token, ttl.
+    REFRESH = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    # Saves the offset (unless negative) and releases the lock, only if it is still
+    # held with the token. KEYS: session, lock. ARGV: token, offset, session ttl.
+    RELEASE = """
+    if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+        return 0
+    end
+    redis.call('DEL', KEYS[2])
+    if tonumber(ARGV[2]) >= 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('HSET', KEYS[1], 'offset', ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+    end
+    return 1
+    """
+
+    def __init__(self, r: redis.Redis, directory: str, max_size: int, ttl: int, lock_ttl: int = 60,
+                 cleanup_interval: float = 3600):
+        self.r = r
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.cleanup_interval = cleanup_interval
+        self._refresh = r.register_script(self.REFRESH)
+        self._release = r.register_script(self.RELEASE)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(upload_id: str) -> str:
+        return f"upload:{upload_id}"
+
+    @staticmethod
+    def _lock_key(upload_id: str) -> str:
+        return f"upload:{upload_id}:lock"
+
+    def path(self, upload_id: str) -> Path:
+        return self.directory / upload_id
+
+    def _touch(self, upload_id: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path(upload_id).touch()
+
+    async def create(self, user_id: int) -> str:
+        """
+        Start a new upload session.
+
+        :param user_id: The ID of the uploading user.
+        :type user_id: int
+        :return: The upload ID.
+        :rtype: str
+        """
+        upload_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._touch, upload_id)
+        await self.r.hset(self._key(upload_id), mapping={"user_id": user_id, "offset": 0})
+        await self.r.expire(self._key(upload_id), self.ttl)
+        return upload_id
+
+    async def get_offset(self, upload_id: str, user_id: int) -> int:
+        """
+        Get the number of bytes received so far.
+
+        :param upload_id: The upload ID.
+        :type upload_id: str
+        :param user_id: The ID of the uploading user.
+        :type user_id: int
+        :raises HTTPException: 404 if the session does not exist or belongs to another user.
+        :return: The committed offset.
+        :rtype: int
+        """
+        state = await self.r.hgetall(self._key(upload_id))
+        if not state or int(state[b"user_id"]) != user_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        return int(state[b"offset"])
+
+    async def append(self, upload_id: str, user_id: int, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """
+        Append a chunk of the file, streamed from the request body.
+
+        :param upload_id: The upload ID.
+        :type upload_id: str
+        :param user_id: The ID of the uploading user.
+        :type user_id: int
+        :param offset: The offset the client believes it continues from.
+        :type offset: int
+        :param chunks: The request body.
+        :type chunks: AsyncIterator[bytes]
+        :raises HTTPException: 409 on an offset mismatch or a concurrent append, 413 if the file grows too large.
+        :return: The new offset.
+        :rtype: int
+        """
+        lock, token = self._lock_key(upload_id), uuid.uuid4().hex
+        if not await self.r.set(lock, token, nx=True, ex=self.lock_ttl):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is in progress")
+        current = -1
+        try:
+            # The offset is only read under the lock, so two appends cannot both continue from it.
+            expected = await self.get_offset(upload_id, user_id)
+            if offset != expected:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Expected offset {expected}")
+            current = expected
+            file = await asyncio.to_thread(open, self.path(upload_id), "r+b")
+            try:
+                await asyncio.to_thread(file.truncate, current)
+                await asyncio.to_thread(file.seek, current)
+                refreshed = time.monotonic()
+                async for chunk in chunks:
+                    if current + len(chunk) > self.max_size:
+                        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                            detail="File is too large")
+                    await asyncio.to_thread(file.write, chunk)
+                    current += len(chunk)
+                    if time.monotonic() - refreshed > self.lock_ttl / 3:
+                        if not await self._refresh(keys=[lock], args=[token, self.lock_ttl]):
+                            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload lock was lost")
+                        refreshed = time.monotonic()
+            finally:
+                await asyncio.to_thread(file.close)
+        finally:
+            # Whatever was received is kept, so a dropped connection can resume from here.
+            released = await self._release(keys=[self._key(upload_id), lock], args=[token, current, self.ttl])
+        if not released:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload lock was lost")
+        return current
+
+    async def open(self, upload_id: str, user_id: int) -> BinaryIO:
+        """
+        Open the received file for reading.
+
+        :param upload_id: The upload ID.
+        :type upload_id: str
+        :param user_id: The ID of the uploading user.
+        :type user_id: int
+        :return: The staged file.
+        :rtype: BinaryIO
+        """
+        await self.get_offset(upload_id, user_id)
+        return await asyncio.to_thread(open, self.path(upload_id), "rb")
+
+    async def discard(self, upload_id: str) -> None:
+        """
+        Remove an upload session and its staged file.
+
+        :param upload_id: The upload ID.
+        :type upload_id: str
+        """
+        await self.r.delete(self._key(upload_id))
+        await asyncio.to_thread(self.path(upload_id).unlink, missing_ok=True)
+
+    def _stale_files(self) -> list[Path]:
+        if not self.directory.is_dir():
+            return []
+        # Sessions are created right after their file, and every append touches it.
+        cutoff = time.time() - self.lock_ttl
+        return [path for path in self.directory.iterdir() if path.stat().st_mtime < cutoff]
+
+    async def purge(self) -> int:
+        """
+        Remove the staging files of expired upload sessions.
+
+        :return: The number of files removed.
+        :rtype: int
+        """
+        paths = await asyncio.to_thread(self._stale_files)
+        if not paths:
+            return 0
+        async with self.r.pipeline(transaction=False) as pipe:
+            for path in paths:
+                pipe.exists(self._key(path.name))
+            alive = await pipe.execute()
+        expired = [path for path, exists in zip(paths, alive) if not exists]
+        for path in expired:
+            await asyncio.to_thread(path.unlink, missing_ok=True)
+        return len(expired)
+
+    async def _purge_periodically(self) -> None:
+        while True:
+            try:
+                removed = await self.purge()
+                if removed:
+                    logger.info("Removed %d expired upload files", removed)
+            except (redis.RedisError, OSError) as err:
+                logger.warning("Purging expired uploads failed: %s", err)
+            await asyncio.sleep(self.cleanup_interval)
+
+    def start(self) -> None:
+        """
+        Start purging expired uploads in the background.
+        """
+        self._task = asyncio.create_task(self._purge_periodically())
+
+    async def stop(self) -> None:
+        """
+        Stop purging expired uploads.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+resumable_uploads = ResumableUploads(
+    redis_client,
+    str(Path(settings.upload_tmp_dir) / "sessions"),
+    settings.max_upload_size,
+    settings.upload_session_ttl,
+    settings.upload_lock_ttl,
+    settings.upload_cleanup_interval,
+)
@@ -0,0 +1,38 @@
+import contextlib
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class StatementLog(list):
+    """
+    The SQL statements executed inside :func:`count_statements`.
+    """
+
+    def __str__(self) -> str:
+        return "\n".join(self)
+
+
+@contextlib.contextmanager
+def count_statements(engine: AsyncEngine) -> Iterator[StatementLog]:
+    """
+    Record every statement sent to the database while the block runs.
+
+    Used to pin the number of round trips an endpoint makes, so a lazy load or an
+    extra refresh shows up as a failing test:
+
+        with count_statements(engine) as statements:
+            await see_photo(1, user, session)
+        self.assertEqual(len(statements), 2, statements)
+    """
+    statements = StatementLog()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+from jose import JWTError, jwt
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.auth import Auth
+from src.services.cache import LRUCache
+
+
+class TestAccessTokenCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.auth = Auth()
+        self.auth.token_cache = LRUCache(maxsize=10, ttl=900)
+
+    async def test_claims_are_cached(self):
+        token = await self.auth.create_access_token({"sub": "user@example.com"})
+
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            first = self.auth.decode_access_token(token)
+            second = self.auth.decode_access_token(token)
+
+        self.assertEqual(first["sub"], "user@example.com")
+        self.assertIs(first, second)
+        decode.assert_called_once()
+        self.assertEqual(self.auth.token_cache.stats(), {"size": 1, "hits": 1, "misses": 1})
+
+    async def test_expired_token_is_not_cached(self):
+        token = await self.auth.create_access_token({"sub": "user@example.com"}, expires_delta=-1)
+
+        with self.assertRaises(JWTError):
+            self.auth.decode_access_token(token)
+        self.assertEqual(len(self.auth.token_cache), 0)
+
+    async def test_blacklist_evicts_cached_claims(self):
+        token = await self.auth.create_access_token({"sub": "user@example.com"})
+        self.auth.decode_access_token(token)
+
+        with patch.object(Auth, "revocation", AsyncMock()):
+            await self.auth.add_to_blacklist(token, 900)
+
+        self.assertEqual(len(self.auth.token_cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
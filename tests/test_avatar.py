@@ -0,0 +1,95 @@
+import threading
+import unittest
+import sys
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.avatar import AvatarService, gravatar_hash
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.error = None
+
+    async def get(self, key):
+        if self.error:
+            raise self.error
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.error:
+            raise self.error
+        self.data[key] = str(value).encode()
+
+
+class Gravatar(BaseHTTPRequestHandler):
+    """
+    Answers 200 for the hash of known@example.com and 404 for any other.
+    """
+    requests = []
+
+    def do_HEAD(self):
+        self.requests.append(self.path)
+        found = self.path.startswith("/avatar/" + gravatar_hash("known@example.com"))
+        self.send_response(200 if found else 404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAvatarService(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Gravatar)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/avatar/"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        Gravatar.requests = []
+        self.redis = FakeRedis()
+        self.service = AvatarService(self.redis, base_url=self.base_url, timeout=2)
+
+    def test_url_uses_the_normalized_address(self):
+        service = AvatarService(self.redis)
+
+        self.assertEqual(service.url(" MyEmailAddress@example.com "),
+                         "https://www.gravatar.com/avatar/0bc83cb571cd1c50ba6f3e8a78ef1346")
+        self.assertTrue(service.url("user@example.com", "identicon").endswith("?d=identicon"))
+
+    async def test_probe_results_are_cached(self):
+        known = await self.service.resolve("known@example.com")
+        unknown = await self.service.resolve("unknown@example.com")
+        again = await self.service.resolve("UNKNOWN@example.com")
+
+        self.assertIsNone(known)
+        self.assertEqual(unknown, self.service.url("unknown@example.com", "identicon"))
+        self.assertEqual(again, unknown)
+        self.assertEqual(len(Gravatar.requests), 2)
+        self.assertTrue(all(path.endswith("?d=404") for path in Gravatar.requests))
+
+    async def test_failed_probe_is_not_cached(self):
+        service = AvatarService(self.redis, base_url="http://127.0.0.1:1/avatar/", timeout=1)
+
+        self.assertIsNone(await service.exists("user@example.com"))
+        self.assertEqual(self.redis.data, {})
+
+    async def test_redis_errors_do_not_stop_the_probe(self):
+        self.redis.error = ConnectionError("down")
+
+        self.assertFalse(await self.service.exists("unknown@example.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from redis.exceptions import ConnectionError
+
+from src.services.cache import CacheInvalidator, LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_expiry(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        with patch("src.services.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=1)
+        with patch("src.services.cache.time.monotonic", return_value=105):
+            self.assertEqual(cache.get("a"), 1)
+            self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 1)
+
+    def test_pop(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.get("a"))
+
+
+
+class TestCacheInvalidator(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.redis = MagicMock()
+        self.redis.publish = AsyncMock()
+        self.invalidator = CacheInvalidator(self.redis)
+        self.cache = self.invalidator.register("names", LRUCache(maxsize=10, ttl=60))
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+
+    async def test_invalidate_drops_locally_and_publishes(self):
+        await self.invalidator.invalidate("names", "a")
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        channel, message = self.redis.publish.await_args.args
+        self.assertEqual((channel, json.loads(message)), (CacheInvalidator.CHANNEL, ["names", ["a"]]))
+
+    async def test_messages_from_other_workers_are_applied(self):
+        self.invalidator._drop("names", ["b"])
+        self.invalidator._drop("unknown", ["a"])
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+
+    async def test_redis_errors_still_drop_locally(self):
+        self.redis.publish.side_effect = ConnectionError("down")
+
+        await self.invalidator.invalidate("names", "a")
+
+        self.assertIsNone(self.cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
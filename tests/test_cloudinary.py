@@ -0,0 +1,101 @@
+import io
+import json
+import threading
+import unittest
+import sys
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fastapi import HTTPException
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.storage import CloudinaryUploader
+
+
+class CloudinaryStub(BaseHTTPRequestHandler):
+    """
+    Stands in for the Cloudinary upload API; answers with the queued responses in order.
+    """
+    responses: list = []
+    paths: list = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.paths.append(self.path)
+        status, body = self.responses.pop(0) if self.responses else (200, {"version": 1})
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCloudinaryUploader(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), CloudinaryStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        CloudinaryStub.responses = []
+        CloudinaryStub.paths = []
+        self.uploader = CloudinaryUploader(concurrency=2, timeout=5, retries=2, backoff=0)
+        host, port = self.server.server_address
+        self.uploader.configure("demo", "key", "secret", upload_prefix=f"http://{host}:{port}")
+
+    async def test_upload(self):
+        CloudinaryStub.responses = [(200, {"version": 42, "public_id": "PhotoShare/user"})]
+
+        result = await self.uploader.upload(io.BytesIO(b"image"), public_id="PhotoShare/user")
+
+        self.assertEqual(result["version"], 42)
+        self.assertEqual(CloudinaryStub.paths, ["/v1_1/demo/image/upload"])
+
+    async def test_retries_server_errors(self):
+        CloudinaryStub.responses = [(503, {"error": {"message": "Unavailable"}}), (200, {"version": 7})]
+
+        result = await self.uploader.upload(io.BytesIO(b"image"))
+
+        self.assertEqual(result["version"], 7)
+        self.assertEqual(len(CloudinaryStub.paths), 2)
+
+    async def test_retries_internal_server_errors(self):
+        # cloudinary.uploader reports these with http_code 200.
+        CloudinaryStub.responses = [(500, {"error": {"message": "General error"}}), (200, {"version": 8})]
+
+        result = await self.uploader.upload(io.BytesIO(b"image"))
+
+        self.assertEqual(result["version"], 8)
+        self.assertEqual(len(CloudinaryStub.paths), 2)
+
+    async def test_gives_up_after_retries(self):
+        CloudinaryStub.responses = [(500, {"error": {"message": "General error"}})] * 3
+
+        with self.assertRaises(HTTPException) as error:
+            await self.uploader.upload(io.BytesIO(b"image"))
+
+        self.assertEqual(error.exception.detail, "Upload failed: General error")
+        self.assertEqual(len(CloudinaryStub.paths), 3)
+
+    async def test_client_errors_are_not_retried(self):
+        CloudinaryStub.responses = [(400, {"error": {"message": "Invalid image file"}})]
+
+        with self.assertRaises(HTTPException) as error:
+            await self.uploader.upload(io.BytesIO(b"not an image"))
+
+        self.assertEqual(error.exception.status_code, 502)
+        self.assertEqual(len(CloudinaryStub.paths), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from unittest.mock import AsyncMock
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
 from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
@@ -7,7 +8,8 @@ import os
 sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
 
 from src.database.models import Comment
-from src.repository.comments import get_comment, update_comment, delete_comment
+from src.repository.comments import get_comment, update_comment, delete_comment, get_photo_comments
+from src.repository.pagination import decode_cursor, encode_cursor
 
 
 class TestAsyncMethod(unittest.IsolatedAsyncioTestCase):
@@ -55,6 +57,37 @@ class TestAsyncMethod(unittest.IsolatedAsyncioTestCase):
         self.session.delete.assert_called_once_with(mock_comment)
         self.session.commit.assert_called_once()
 
+    async def test_get_photo_comments_returns_next_cursor(self):
+        comments = [Comment(id=i, text='Test comment', created_at=datetime(2023, 11, 21, 12, i)) for i in range(1, 4)]
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = comments
+        self.session.execute.return_value = result
+
+        page, next_cursor = await get_photo_comments(2, None, 1, self.session)
+
+        self.assertEqual(page, comments[:2])
+        self.assertEqual(decode_cursor(next_cursor, 2), ['2023-11-21T12:02:00', 2])
+
+    async def test_get_photo_comments_last_page(self):
+        comments = [Comment(id=1, text='Test comment', created_at=datetime(2023, 11, 21, 12, 1))]
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = comments
+        self.session.execute.return_value = result
+
+        cursor = encode_cursor('2023-11-21T12:00:00', 0)
+        page, next_cursor = await get_photo_comments(2, cursor, 1, self.session)
+
+        self.assertEqual(page, comments)
+        self.assertIsNone(next_cursor)
+        self.assertIn("(comments.created_at, comments.id) >", str(self.session.execute.call_args.args[0]))
+
+    async def test_get_photo_comments_rejects_malformed_cursor(self):
+        with self.assertRaises(ValueError):
+            await get_photo_comments(2, 'not a cursor', 1, self.session)
+        for values in ([1, 1], ['2023-11-21T12:00:00', '1'], ['yesterday', 1]):
+            with self.assertRaises(ValueError):
+                await get_photo_comments(2, encode_cursor(*values), 1, self.session)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.database.db import Base
+from src.database.models import Comment, Counter, Photo, Tag, User
+from src.repository.counters import bump, get_counts, reconcile
+from src.services.counters import CounterReconciler
+
+
+class TestCounters(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_bump(self):
+        await bump({(Counter.USER_PHOTOS, 1): 1, (Counter.USER_PHOTOS, 2): 1}, self.session)
+        await bump({(Counter.USER_PHOTOS, 1): 2, (Counter.USER_COMMENTS, 1): 0}, self.session)
+        await self.session.commit()
+
+        self.assertEqual(await get_counts(Counter.USER_PHOTOS, [1, 2, 3], self.session), {1: 3, 2: 1, 3: 0})
+        self.assertEqual(await get_counts(Counter.USER_COMMENTS, [1], self.session), {1: 0})
+
+    async def test_photo_loads_its_comment_count(self):
+        self.session.add_all([
+            User(id=1, username="user", email="user@example.com", password="secret"),
+            Photo(id=1, description="photo", user_id=1),
+        ])
+        await bump({(Counter.PHOTO_COMMENTS, 1): 2}, self.session)
+        await self.session.commit()
+        self.session.expunge_all()
+
+        photo = (await self.session.execute(select(Photo))).scalar_one()
+
+        self.assertEqual(photo.comments_count, 2)
+
+    async def test_reconcile(self):
+        sea = Tag(tag_name="sea")
+        self.session.add_all([
+            User(id=1, username="user", email="user@example.com", password="secret"),
+            Photo(id=1, description="first", user_id=1, tags=[sea]),
+            Photo(id=2, description="second", user_id=1),
+        ])
+        await self.session.flush()
+        self.session.add(Comment(text="nice", user_id=1, photo_id=1))
+        # Drifted: too many photos, a comment count for a photo without comments, nothing for the tag.
+        await bump({(Counter.USER_PHOTOS, 1): 5, (Counter.PHOTO_COMMENTS, 2): 1}, self.session)
+        await self.session.commit()
+
+        fixed = await reconcile(self.session)
+
+        self.assertEqual(fixed, {
+            Counter.PHOTO_COMMENTS: 2, Counter.USER_COMMENTS: 1, Counter.USER_PHOTOS: 1, Counter.TAG_PHOTOS: 1,
+        })
+        self.assertEqual(await get_counts(Counter.USER_PHOTOS, [1], self.session), {1: 2})
+        self.assertEqual(await get_counts(Counter.PHOTO_COMMENTS, [1, 2], self.session), {1: 1, 2: 0})
+        self.assertEqual(await get_counts(Counter.TAG_PHOTOS, [sea.id], self.session), {sea.id: 1})
+        self.assertEqual(set((await reconcile(self.session)).values()), {0})
+
+    async def test_reconciler_runs_once_per_interval(self):
+        r = AsyncMock()
+        r.set.side_effect = [True, None]
+        reconciler = CounterReconciler(r, 60, session_factory=lambda: self.session)
+
+        self.assertIsNotNone(await reconciler.run_once())
+        self.assertIsNone(await reconciler.run_once())
+        r.set.assert_awaited_with(CounterReconciler.LOCK, 1, nx=True, ex=60)
+
+    async def test_reconciler_survives_errors(self):
+        reconciler = CounterReconciler(AsyncMock(), 0)
+        errors = [TimeoutError(), OSError("refused")]
+
+        async def run_once():
+            if errors:
+                raise errors.pop(0)
+            return {Counter.USER_PHOTOS: 0}
+
+        reconciler.run_once = AsyncMock(side_effect=run_once)
+        with self.assertLogs("src.services.counters", "ERROR") as logs:
+            reconciler.start()
+            while reconciler.run_once.await_count < 3:
+                await asyncio.sleep(0)
+            await reconciler.stop()
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertIsNone(reconciler._task)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.email import EmailOutbox, EmailWorker, SMTPPool, render_message
+
+
+class SMTPSink:
+    """
+    A local SMTP server that accepts everything except the recipients it is told to refuse.
+    """
+
+    def __init__(self, refuse: dict = None):
+        self.refuse = refuse or {}
+        self.messages = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 sink")
+        recipients = []
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                await reply("250 sink")
+            elif verb == "RCPT":
+                recipient = command.split("<", 1)[1].rstrip(">")
+                code = self.refuse.get(recipient)
+                if code:
+                    await reply(f"{code} refused")
+                else:
+                    recipients.append(recipient)
+                    await reply("250 ok")
+            elif verb == "DATA":
+                await reply("354 go on")
+                data = b""
+                while (chunk := await reader.readline()) != b".\r\n":
+                    data += chunk
+                self.messages.append((recipients, data))
+                recipients = []
+                await reply("250 queued")
+            elif verb == "QUIT":
+                await reply("221 bye")
+                break
+            else:
+                # MAIL, RSET and NOOP
+                recipients = [] if verb == "RSET" else recipients
+                await reply("250 ok")
+        writer.close()
+
+
+def job(recipient: str) -> dict:
+    return EmailOutbox.job(recipient, "Confirm your email", "email_template.html",
+                           {"host": "http://test/", "username": "user", "token": "token"})
+
+
+def raw(recipient: str, **changes) -> str:
+    return json.dumps(dict(job(recipient), **changes))
+
+
+class TestEmail(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.sink = SMTPSink(refuse={"bounce@example.com": 550, "busy@example.com": 451})
+        port = await self.sink.start()
+        self.pool = SMTPPool("127.0.0.1", port, use_tls=False, start_tls=False, size=2, timeout=5)
+        self.outbox = MagicMock()
+        self.outbox.fail = AsyncMock()
+        self.outbox.ack = AsyncMock()
+        self.worker = EmailWorker(self.outbox, self.pool, batch_size=20)
+
+    async def asyncTearDown(self) -> None:
+        await self.pool.close()
+        await self.sink.stop()
+
+    def test_render_escapes_context(self):
+        message = render_message(dict(job("user@example.com"), context={"host": "", "username": "<b>", "token": ""}))
+
+        self.assertEqual(message["To"], "user@example.com")
+        self.assertIn("Hi &lt;b&gt;,", message.get_content())
+
+    async def test_batch_reuses_connections(self):
+        sent = await self.worker.process([raw(f"user{i}@example.com") for i in range(20)])
+        sent += await self.worker.process([raw("late@example.com")])
+
+        self.assertEqual(sent, 21)
+        self.assertEqual(len(self.sink.messages), 21)
+        self.assertEqual(self.sink.connections, 2)
+        self.assertEqual(self.outbox.ack.await_count, 21)
+        self.outbox.fail.assert_not_called()
+
+    async def test_failures_are_retried_or_buried(self):
+        sent = await self.worker.process([raw("bounce@example.com"), raw("busy@example.com"), raw("user@example.com")])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(
+            {(json.loads(call.args[0])["to"], call.kwargs.get("permanent", False))
+             for call in self.outbox.fail.await_args_list},
+            {("bounce@example.com", True), ("busy@example.com", False)},
+        )
+
+    async def test_broken_jobs_are_buried_without_stopping_the_batch(self):
+        missing_template = raw("user@example.com", template="missing.html")
+        malformed = json.dumps({"to": "user@example.com"})
+
+        sent = await self.worker.process([missing_template, malformed, raw("other@example.com")])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(self.sink.messages), 1)
+        self.assertEqual({(call.args[0], call.kwargs["permanent"]) for call in self.outbox.fail.await_args_list},
+                         {(missing_template, True), (malformed, True)})
+
+    async def test_outbox_errors_do_not_stop_the_batch(self):
+        self.outbox.ack.side_effect = [ConnectionError("down"), None]
+
+        sent = await self.worker.process([raw("user@example.com"), raw("other@example.com")])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(self.sink.messages), 2)
+
+    async def test_reconnects_after_server_dropped_connection(self):
+        await self.worker.process([raw("user@example.com")])
+        await self.sink.stop()
+        for smtp in self.pool._idle:
+            smtp.close()
+        self.sink.server = await asyncio.start_server(self.sink.handle, "127.0.0.1", self.pool.options["port"])
+
+        self.assertEqual(await self.worker.process([raw("again@example.com")]), 1)
+
+
+class FakePipeline:
+    def __init__(self):
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, *args))
+
+    async def execute(self):
+        return []
+
+
+class TestEmailOutbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.redis = MagicMock()
+        self.pipe = FakePipeline()
+        self.redis.pipeline.return_value = self.pipe
+        self.outbox = EmailOutbox(self.redis, max_attempts=3, retry_backoff=10)
+
+    async def test_fail_schedules_retry_with_backoff(self):
+        failed = raw("user@example.com", attempts=1)
+
+        await self.outbox.fail(failed, "451 busy")
+
+        (command, key, jobs), lrem = self.pipe.calls
+        (retry, due), = jobs.items()
+        self.assertEqual((command, key), ("zadd", EmailOutbox.RETRY))
+        self.assertIn('"attempts": 2', retry)
+        self.assertEqual(lrem, ("lrem", self.outbox.queue.processing, 1, failed))
+
+    async def test_fail_buries_after_max_attempts(self):
+        await self.outbox.fail(raw("user@example.com", attempts=2), "451 busy")
+        await self.outbox.fail(raw("bounce@example.com"), "550 refused", permanent=True)
+        await self.outbox.fail("{not json", "JSONDecodeError")
+
+        buried = [call for call in self.pipe.calls if call[0] == "rpush"]
+        self.assertEqual([call[1] for call in buried], [EmailOutbox.DEAD] * 3)
+        self.assertEqual(json.loads(buried[2][2]), {"raw": "{not json", "error": "JSONDecodeError"})
+        self.assertEqual(len([call for call in self.pipe.calls if call[0] == "lrem"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
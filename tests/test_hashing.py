@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+import sys
+import os
+
+from fastapi import HTTPException
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.hashing import PasswordHasher
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.hasher = PasswordHasher(rounds=4, workers=2, max_queue=1)
+
+    def tearDown(self) -> None:
+        self.hasher.shutdown()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.hasher.hash("password")
+
+        self.assertTrue(await self.hasher.verify("password", hashed))
+        self.assertFalse(await self.hasher.verify("wrong", hashed))
+
+    async def test_rehash_when_cost_changes(self):
+        hashed = await self.hasher.hash("password")
+        stronger = PasswordHasher(rounds=5, workers=1, max_queue=1)
+        try:
+            verified, new_hash = await stronger.verify_and_update("password", hashed)
+        finally:
+            stronger.shutdown()
+
+        self.assertTrue(verified)
+        self.assertTrue(new_hash.startswith("$2b$05$"))
+
+    async def test_no_rehash_for_current_cost(self):
+        hashed = await self.hasher.hash("password")
+
+        self.assertEqual(await self.hasher.verify_and_update("password", hashed), (True, None))
+
+    async def test_rejects_when_queue_is_full(self):
+        hashed = await self.hasher.hash("password")
+        calls = [self.hasher.verify("password", hashed) for _ in range(4)]
+
+        results = await asyncio.gather(*calls, return_exceptions=True)
+
+        rejected = [r for r in results if isinstance(r, HTTPException)]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(rejected[0].status_code, 503)
+        self.assertEqual(self.hasher.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
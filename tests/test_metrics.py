@@ -0,0 +1,119 @@
+import unittest
+import sys
+import os
+
+from fastapi import FastAPI
+from prometheus_client import CollectorRegistry
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.cache import LRUCache
+from src.services.metrics import (
+    MetricsMiddleware,
+    RequestMetrics,
+    StatsCollector,
+    instrument_engine,
+    instrument_redis,
+    registry,
+)
+
+
+async def call(app, method: str, path: str) -> int:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [], "root_path": "", "scheme": "http", "server": ("test", 80)}
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def sample(name: str, **labels) -> float:
+    return registry.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+
+    async def test_requests_are_recorded_by_route_template(self):
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            return {"id": item_id}
+
+        metrics = RequestMetrics()
+        metrics.preallocate(app.routes)
+        app.add_middleware(MetricsMiddleware, metrics=metrics)
+        labels = dict(method="GET", route="/items/{item_id}")
+        before = sample("http_request_duration_seconds_count", status="2xx", **labels)
+        before_unmatched = sample("http_request_duration_seconds_count", method="GET", route="unmatched",
+                                  status="4xx")
+
+        self.assertEqual(await call(app, "GET", "/items/1"), 200)
+        self.assertEqual(await call(app, "GET", "/items/2"), 200)
+        self.assertEqual(await call(app, "GET", "/items/x"), 422)
+        self.assertEqual(await call(app, "GET", "/missing"), 404)
+
+        self.assertEqual(sample("http_request_duration_seconds_count", status="2xx", **labels), before + 2)
+        self.assertEqual(sample("http_request_duration_seconds_count", status="4xx", **labels), 1)
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="4xx"),
+            before_unmatched + 1,
+        )
+
+    async def test_statements_are_timed(self):
+        engine = create_async_engine("sqlite+aiosqlite://")
+        instrument_engine(engine)
+        instrument_engine(engine)
+        before = sample("db_statement_duration_seconds_count", operation="SELECT")
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                with self.assertRaises(Exception):
+                    await conn.execute(text("SELECT * FROM missing"))
+                await conn.execute(text("  select 2"))
+        finally:
+            await engine.dispose()
+
+        self.assertEqual(sample("db_statement_duration_seconds_count", operation="SELECT"), before + 2)
+
+    async def test_redis_commands_are_timed(self):
+        class Client:
+            async def execute_command(self, *args, **options):
+                return args
+
+        client = Client()
+        instrument_redis(client)
+        instrument_redis(client)
+        before_get = sample("redis_command_duration_seconds_count", command="GET")
+        before_other = sample("redis_command_duration_seconds_count", command="OTHER")
+
+        self.assertEqual(await client.execute_command("GET", "key"), ("GET", "key"))
+        await client.execute_command("OBJECT", "ENCODING", "key")
+
+        self.assertEqual(sample("redis_command_duration_seconds_count", command="GET"), before_get + 1)
+        self.assertEqual(sample("redis_command_duration_seconds_count", command="OTHER"), before_other + 1)
+
+    def test_service_statistics_are_collected(self):
+        revocation = {"items": 3, "memory_bytes": 1024, "hash_count": 7, "expected_false_positive_rate": 0.001,
+                      "checks": 10, "redis_lookups": 4, "false_positives": 1}
+        pool = {"size": 5, "checked_out": 1, "overflow": 0, "checkouts": 9, "timeouts": 0, "wait_seconds_total": 0.5,
+                "replicas": []}
+        collectors = CollectorRegistry()
+        collectors.register(StatsCollector(lambda: pool, lambda: revocation, {"users": LRUCache()}))
+
+        self.assertEqual(collectors.get_sample_value("revocation_filter_memory_bytes"), 1024)
+        self.assertEqual(collectors.get_sample_value("revocation_filter_false_positives"), 1)
+        self.assertEqual(collectors.get_sample_value("revocation_checks_total"), 10)
+        self.assertEqual(collectors.get_sample_value("db_pool_checked_out", {"database": "primary"}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
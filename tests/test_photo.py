@@ -1,14 +1,32 @@
+import hashlib
+import io
+import tempfile
 import unittest
-from unittest.mock import AsyncMock
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from redis.exceptions import ConnectionError
 from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 import os
-from src.database.models import Photo
-from src.repository.photo import remove_photo, update_description, see_photo
+from src.database.models import Photo, User
+from src.repository.photo import add_photo, remove_photo, update_description, see_photo
+from src.routes.photo import _queue_derivatives
+from src.services.storage import LocalStorage
 
 sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
 
 
+def png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+IMAGE = png()
+
+
 class TestPhotoRepository(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self) -> None:
@@ -66,5 +84,124 @@ class TestPhotoRepository(unittest.IsolatedAsyncioTestCase):
             Photo.__table__.select().where(Photo.id == photo_id)
         )
 
+
+class TestPhotoDeduplication(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.backend = LocalStorage(str(root / "media"), "/media", str(root / "tmp"))
+        self.patches = [
+            patch("src.repository.photo.storage_backend", self.backend),
+            patch("src.services.storage.storage_backend", self.backend),
+        ]
+        for p in self.patches:
+            p.start()
+        self.session = AsyncMock(spec=AsyncSession())
+        self.session.execute.return_value = MagicMock()
+        self.user = User(id=1)
+        self.digest = hashlib.sha256(IMAGE).hexdigest()
+        self.key = f"blobs/{self.digest[:2]}/{self.digest}.png"
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    async def test_first_upload_stores_the_blob(self):
+        self.session.execute.return_value.one_or_none.return_value = (self.key, 1)
+
+        photo = await add_photo("desc", None, UploadFile(io.BytesIO(IMAGE), filename="a.html"),
+                                self.session, self.user)
+
+        self.assertEqual(photo.content_hash, self.digest)
+        self.assertEqual(photo.storage_key, self.key)
+        self.assertEqual((self.backend.root / self.key).read_bytes(), IMAGE)
+        self.session.commit.assert_awaited_once()
+        # The stored extension follows the detected format, not the file name.
+        statement = self.session.execute.await_args_list[0].args[0]
+        stored_key = statement.compile().params["storage_key"]
+        self.assertTrue(stored_key.startswith(f"blobs/{self.digest[:2]}/{self.digest}-"), stored_key)
+        self.assertTrue(stored_key.endswith(".png"), stored_key)
+
+    async def test_upload_that_is_not_an_image_is_rejected(self):
+        file = UploadFile(io.BytesIO(b"<script>alert(1)</script>"), filename="a.png")
+
+        with self.assertRaises(HTTPException) as error:
+            await add_photo("desc", None, file, self.session, self.user)
+
+        self.assertEqual(error.exception.status_code, 415)
+        self.session.execute.assert_not_called()
+        self.assertFalse(self.backend.tmp_dir.exists() and any(self.backend.tmp_dir.iterdir()))
+
+    async def test_duplicate_upload_shares_the_blob(self):
+        self.session.execute.return_value.one_or_none.return_value = (self.key, 2)
+
+        photo = await add_photo("desc", None, UploadFile(io.BytesIO(IMAGE), filename="b.png"),
+                                self.session, self.user)
+
+        self.assertEqual(photo.storage_key, self.key)
+        self.assertFalse(self.backend.root.exists())
+        self.assertEqual(list(self.backend.tmp_dir.iterdir()), [])
+
+    async def test_metadata_only_upload(self):
+        self.session.execute.return_value.one_or_none.return_value = (self.key, 3)
+
+        photo = await add_photo("desc", None, None, self.session, self.user, content_hash=self.digest)
+
+        self.assertEqual(photo.url, f"/media/{self.key}")
+        statement = self.session.execute.await_args_list[0].args[0]
+        # Only contents the user already has a photo of can be reused by hash.
+        self.assertIn("photos.user_id", str(statement))
+        self.assertEqual(statement.compile().params["user_id_1"], self.user.id)
+
+    async def test_metadata_only_upload_of_unknown_content(self):
+        self.session.execute.return_value.one_or_none.return_value = None
+
+        photo = await add_photo("desc", None, None, self.session, self.user, content_hash=self.digest)
+
+        self.assertIsNone(photo)
+        self.session.add.assert_not_called()
+
+    async def test_last_reference_removes_the_blob(self):
+        (self.backend.root / self.key).parent.mkdir(parents=True)
+        (self.backend.root / self.key).write_bytes(b"image")
+        result = self.session.execute.return_value
+        result.scalar_one_or_none.return_value = Photo(id=1, storage_key=self.key, content_hash=self.digest)
+        result.scalars.return_value = []
+        result.one.side_effect = [(self.key, 1), (self.key, 0)]
+
+        await remove_photo(1, self.user, self.session)
+        self.assertTrue((self.backend.root / self.key).exists())
+
+        await remove_photo(1, self.user, self.session)
+        self.assertFalse((self.backend.root / self.key).exists())
+
+    async def test_blob_file_survives_a_failed_removal(self):
+        (self.backend.root / self.key).parent.mkdir(parents=True)
+        (self.backend.root / self.key).write_bytes(b"image")
+        result = self.session.execute.return_value
+        result.scalar_one_or_none.return_value = Photo(id=1, storage_key=self.key, content_hash=self.digest)
+        result.scalars.return_value = []
+        result.one.return_value = (self.key, 0)
+        self.session.commit.side_effect = ConnectionError("down")
+
+        with self.assertRaises(ConnectionError):
+            await remove_photo(1, self.user, self.session)
+
+        self.assertTrue((self.backend.root / self.key).exists())
+
+
+class TestQueueDerivatives(unittest.IsolatedAsyncioTestCase):
+
+    async def test_redis_outage_does_not_fail_the_upload(self):
+        photo = Photo(id=1, storage_key="blobs/ab/ab.jpg")
+        with patch("src.routes.photo.transform_queue.enqueue", AsyncMock(side_effect=ConnectionError("down"))) \
+                as enqueue:
+            await _queue_derivatives(photo)
+
+        enqueue.assert_awaited_once_with(1, "blobs/ab/ab.jpg")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,179 @@
+import io
+import tempfile
+from datetime import datetime
+import unittest
+import sys
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import UploadFile
+from PIL import Image
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.database.db import Base
+from src.database.models import Photo, Tag, User
+from src.repository.pagination import encode_cursor
+from src.repository.photo import add_photo, search_photos, see_photo, update_description
+from src.repository.tags import tag_ids
+from src.schemas import PhotoBase, PhotoModels
+from src.services.storage import LocalStorage
+from tests.query_counter import count_statements
+
+
+def jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class TestPhotoQueryCount(unittest.IsolatedAsyncioTestCase):
+    """
+    Pin the number of statements each photo endpoint runs, response serialization included.
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.user = User(id=1, username="user", email="user@example.com", password="secret")
+        self.session.add_all([
+            self.user,
+            Photo(id=1, description="photo", user_id=1, tags=[Tag(tag_name="sea"), Tag(tag_name="sun")]),
+        ])
+        await self.session.commit()
+        self.session.expunge_all()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        backend = LocalStorage(str(root / "media"), "/media", str(root / "tmp"))
+        self.patches = [
+            patch("src.repository.photo.storage_backend", backend),
+            patch("src.services.storage.storage_backend", backend),
+        ]
+        for p in self.patches:
+            p.start()
+
+    async def asyncTearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_see_photo(self):
+        with count_statements(self.engine) as statements:
+            photo = await see_photo(1, self.user, self.session)
+            response = PhotoModels.model_validate(photo)
+
+        self.assertEqual([tag.tag_name for tag in response.tags], ["sea", "sun"])
+        # The photo and one SELECT ... IN for its tags.
+        self.assertEqual(len(statements), 2, statements)
+
+    async def test_update_description(self):
+        # Tags are upserted through a data-modifying CTE that SQLite cannot run, so
+        # the photo is left without tags here.
+        body = PhotoBase(description="new", tags=[])
+
+        with count_statements(self.engine) as statements:
+            photo = await update_description(1, body, self.user, self.session)
+            response = PhotoModels.model_validate(photo)
+
+        self.assertEqual(response.description, "new")
+        self.assertEqual(response.tags, [])
+        # Load the photo and its tags, update the photo, unlink the old tags, update the tag counters.
+        self.assertEqual(len(statements), 5, statements)
+
+    async def test_add_photo(self):
+        file = UploadFile(io.BytesIO(jpeg()), filename="photo.jpg")
+
+        with count_statements(self.engine) as statements:
+            photo = await add_photo("new", None, file, self.session, self.user)
+            response = PhotoModels.model_validate(photo)
+
+        self.assertEqual(response.url, photo.url)
+        # Upsert the blob, insert the photo, update the counters.
+        self.assertEqual(len(statements), 3, statements)
+
+    async def test_content_hash_reuse_is_limited_to_own_uploads(self):
+        photo = await add_photo("new", None, UploadFile(io.BytesIO(jpeg()), filename="photo.jpg"),
+                                self.session, self.user)
+        other = User(id=2, username="other", email="other@example.com", password="secret")
+        self.session.add(other)
+        await self.session.commit()
+
+        stolen = await add_photo("copy", None, None, self.session, other, content_hash=photo.content_hash)
+        reused = await add_photo("again", None, None, self.session, self.user, content_hash=photo.content_hash)
+
+        self.assertIsNone(stolen)
+        self.assertEqual(reused.storage_key, photo.storage_key)
+
+
+
+class TestPhotoSearch(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        tag_ids.clear()
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        sea, sun, city = Tag(tag_name="sea"), Tag(tag_name="sun"), Tag(tag_name="city")
+        self.session.add_all([
+            User(id=1, username="user", email="user@example.com", password="secret"),
+            Photo(id=1, description="Beach at noon", user_id=1, created_at=datetime(2023, 1, 1), tags=[sea, sun]),
+            Photo(id=2, description="Stormy sea", user_id=1, created_at=datetime(2023, 1, 2), tags=[sea]),
+            Photo(id=3, description="Sunset over the city", user_id=1, created_at=datetime(2023, 1, 3),
+                  tags=[sun, city]),
+            Photo(id=4, description="100% city", user_id=1, created_at=datetime(2023, 1, 3), tags=[city]),
+        ])
+        await self.session.commit()
+        self.session.expunge_all()
+
+    async def asyncTearDown(self) -> None:
+        tag_ids.clear()
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def search(self, tags=(), match_all=True, keywords=None, newest_first=True, limit=10, cursor=None):
+        photos, next_cursor = await search_photos(list(tags), match_all, keywords, newest_first, limit, cursor,
+                                                  self.session)
+        return [photo.id for photo in photos], next_cursor
+
+    async def test_all_tags(self):
+        self.assertEqual(await self.search(["sea", "sun"]), ([1], None))
+
+    async def test_any_tag(self):
+        self.assertEqual(await self.search(["sea", "city"], match_all=False), ([4, 3, 2, 1], None))
+
+    async def test_unknown_tag(self):
+        self.assertEqual(await self.search(["sea", "snow"]), ([], None))
+        self.assertEqual(await self.search(["sea", "snow"], match_all=False), ([2, 1], None))
+
+    async def test_pages_in_date_order(self):
+        first, cursor = await self.search(newest_first=False, limit=3)
+        second, last = await self.search(newest_first=False, limit=3, cursor=cursor)
+
+        self.assertEqual(first + second, [1, 2, 3, 4])
+        self.assertIsNone(last)
+
+    async def test_rejects_cursor_values_of_the_wrong_type(self):
+        for values in ([1, 1], ["2023-11-21T12:00:00", "1"], [None, 1]):
+            with self.assertRaises(ValueError):
+                await self.search(cursor=encode_cursor(*values))
+
+    async def test_tag_ids_are_cached(self):
+        await self.search(["sea"])
+
+        with count_statements(self.engine) as statements:
+            await self.search(["sea"])
+
+        # The photos and their tags; no tag lookup.
+        self.assertEqual(len(statements), 2, statements)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+from datetime import datetime
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.database.models import User
+from src.services import principal as principal_codec
+
+
+class TestPrincipalCodec(unittest.TestCase):
+    def setUp(self) -> None:
+        self.user = User(id=1, role_id=3, username="username", first_name="First", last_name="Last",
+                         email="user@example.com", password="secret", created_at=datetime(2023, 11, 21, 12, 0),
+                         avatar="https://example.com/avatar.png", confirmed=True, ban=False)
+
+    def test_round_trip(self):
+        principal = principal_codec.Principal.from_user(self.user)
+
+        result = principal_codec.loads(principal_codec.dumps(principal))
+
+        self.assertEqual(result, principal)
+        self.assertEqual(result.created_at, datetime(2023, 11, 21, 12, 0))
+
+    def test_record_has_no_secrets(self):
+        record = principal_codec.dumps(principal_codec.Principal.from_user(self.user))
+
+        self.assertNotIn(b"secret", record)
+
+    def test_other_schema_version_is_a_miss(self):
+        record = principal_codec.dumps(principal_codec.Principal.from_user(self.user))
+        record = record.replace(b"[1,", b"[0,", 1)
+
+        self.assertIsNone(principal_codec.loads(record))
+
+    def test_malformed_record_is_a_miss(self):
+        self.assertIsNone(principal_codec.loads(b"\x80\x04garbage"))
+
+    def test_record_with_another_field_count_is_a_miss(self):
+        record = principal_codec.dumps(principal_codec.Principal.from_user(self.user))
+
+        self.assertIsNone(principal_codec.loads(record[:-1] + b",0]"))
+        self.assertIsNone(principal_codec.loads(b"[1,2]"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import sys
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.database.db import Base
+from src.database.models import Counter
+from src.repository.counters import get_counts
+from src.services.query_profiler import QueryProfiler, SlowQuery, _fingerprint
+
+
+class TestQueryProfiler(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_records_slow_statements_with_their_caller(self):
+        profiler = QueryProfiler(threshold=0, size=2, explain=True)
+        profiler.instrument(self.engine)
+        profiler.instrument(self.engine)
+
+        for user_id in range(3):
+            await get_counts(Counter.USER_PHOTOS, [user_id], self.session)
+
+        self.assertEqual(len(profiler.entries), 2)
+        entry = profiler.entries[-1]
+        self.assertTrue(entry.statement.startswith("SELECT counters."), entry.statement)
+        # Parameter values may be secrets and are never kept.
+        self.assertNotIn("parameters", SlowQuery.__slots__)
+        self.assertEqual(entry.fingerprint, " ".join(entry.statement.split()))
+        self.assertTrue(entry.caller.startswith("src.repository.counters.get_counts:"), entry.caller)
+        # Plans are only captured on PostgreSQL.
+        self.assertIsNone(entry.plan)
+
+    async def test_fast_statements_are_not_recorded(self):
+        profiler = QueryProfiler(threshold=10)
+        profiler.instrument(self.engine)
+
+        await get_counts(Counter.USER_PHOTOS, [1], self.session)
+
+        self.assertEqual(len(profiler.entries), 0)
+
+    def test_fingerprint_ignores_the_length_of_placeholder_lists(self):
+        self.assertEqual(_fingerprint("SELECT * FROM t\n  WHERE id IN ($1, $2, $3)"),
+                         _fingerprint("SELECT * FROM t WHERE id IN ($1)"))
+        self.assertNotEqual(_fingerprint("SELECT * FROM t WHERE id = $1"),
+                            _fingerprint("SELECT * FROM u WHERE id = $1"))
+
+    def test_plans_are_captured_once_per_fingerprint_and_interval(self):
+        profiler = QueryProfiler(explain=True, explain_interval=60)
+
+        with patch("src.services.query_profiler.time.monotonic", return_value=1000):
+            self.assertTrue(profiler._claim_explain("SELECT * FROM t WHERE id IN (%s, %s)"))
+            self.assertFalse(profiler._claim_explain("SELECT * FROM t WHERE id IN (%s)"))
+            self.assertTrue(profiler._claim_explain("SELECT * FROM u"))
+        with patch("src.services.query_profiler.time.monotonic", return_value=1061):
+            self.assertTrue(profiler._claim_explain("SELECT * FROM t WHERE id IN (%s)"))
+
+    async def test_analyze_is_opt_in(self):
+        class Connection:
+            statements = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+            async def exec_driver_sql(self, statement, parameters):
+                self.statements.append(statement)
+                return [("Seq Scan on t",)]
+
+            async def rollback(self):
+                pass
+
+        class Engine:
+            def connect(self):
+                return Connection()
+
+        for analyze, prefix in ((False, "EXPLAIN SELECT"), (True, "EXPLAIN (ANALYZE, BUFFERS) SELECT")):
+            Connection.statements = []
+            entry = SlowQuery(statement="SELECT * FROM t", fingerprint="SELECT * FROM t", duration=1, caller="unknown",
+                              recorded_at=datetime.utcnow())
+
+            await QueryProfiler(explain=True, analyze=analyze)._capture_plan(Engine(), entry, ())
+
+            self.assertTrue(Connection.statements[0].startswith(prefix), Connection.statements[0])
+            self.assertEqual(entry.plan, "Seq Scan on t")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.queue import ReliableQueue
+
+
+class FakeRedis:
+    """
+    The list, set and key commands of Redis the queue uses, with its scripts run in Python.
+    """
+
+    def __init__(self):
+        self.lists = {}
+        self.sets = {}
+        self.keys = set()
+
+    def register_script(self, script):
+        return self.take_script if script == ReliableQueue.TAKE else self.recover_script
+
+    def _move(self, source, destination, front=False):
+        if not self.lists.get(source):
+            return None
+        job = self.lists[source].pop(-1 if front else 0)
+        target = self.lists.setdefault(destination, [])
+        target.insert(0, job) if front else target.append(job)
+        return job
+
+    async def blmove(self, source, destination, timeout, src, dest):
+        return self._move(source, destination)
+
+    async def take_script(self, keys, args):
+        jobs = []
+        while len(jobs) < args[0] and (job := self._move(*keys)) is not None:
+            jobs.append(job)
+        return jobs
+
+    async def recover_script(self, keys, args):
+        heartbeat, processing, queue, consumers = keys
+        if heartbeat in self.keys:
+            return 0
+        moved = 0
+        while self._move(processing, queue, front=True) is not None:
+            moved += 1
+        self.sets.get(consumers, set()).discard(args[0])
+        return moved
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def delete(self, *keys):
+        self.keys.difference_update(keys)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, r: FakeRedis):
+        self.r = r
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def lrem(self, key, count, value):
+        self.r.lists.get(key, []).remove(value)
+
+    def set(self, key, value, ex=None):
+        self.r.keys.add(key)
+
+    def sadd(self, key, member):
+        self.r.sets.setdefault(key, set()).add(member)
+
+    async def execute(self):
+        return []
+
+
+class TestReliableQueue(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        self.redis.lists["jobs"] = ["1", "2", "3", "4"]
+
+    async def test_taken_jobs_stay_until_acked(self):
+        queue = ReliableQueue(self.redis, "jobs", consumer="a")
+
+        jobs = await queue.take(3)
+        await queue.ack("1", "3")
+
+        self.assertEqual(jobs, ["1", "2", "3"])
+        self.assertEqual(self.redis.lists["jobs"], ["4"])
+        self.assertEqual(self.redis.lists["jobs:processing:a"], ["2"])
+
+    async def test_jobs_of_dead_consumers_are_put_back(self):
+        dead, alive, other = (ReliableQueue(self.redis, "jobs", consumer=name) for name in ("dead", "alive", "other"))
+        for queue in (dead, alive, other):
+            await queue.heartbeat()
+        await dead.take(2)
+        await alive.take(1)
+        # The heartbeat of the dead consumer expires.
+        self.redis.keys.discard("jobs:heartbeat:dead")
+
+        self.assertEqual(await other.recover(), 2)
+
+        self.assertEqual(self.redis.lists["jobs"], ["1", "2", "4"])
+        self.assertEqual(self.redis.lists["jobs:processing:alive"], ["3"])
+        self.assertEqual(self.redis.sets["jobs:consumers"], {"alive", "other"})
+
+    async def test_release_puts_own_jobs_back(self):
+        queue = ReliableQueue(self.redis, "jobs", consumer="a")
+        await queue.heartbeat()
+        await queue.take(2)
+
+        await queue.release()
+
+        self.assertEqual(self.redis.lists["jobs"], ["1", "2", "3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
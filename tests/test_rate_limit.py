@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException, Request
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.rate_limit import RateLimiter, rate_limit
+
+
+class FakeScript:
+    """
+    Runs the sliding-window script against a dict, counting the Redis round trips.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+        self.error = None
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        times, _, weight = args
+        current, previous = self.data.get(keys[0], 0), self.data.get(keys[1], 0)
+        if previous * weight + current >= times:
+            return 0
+        self.data[keys[0]] = current + 1
+        return 1
+
+
+def limiter(script: FakeScript) -> RateLimiter:
+    r = MagicMock()
+    r.register_script.return_value = script
+    return RateLimiter(r, local_size=100)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.script = FakeScript()
+        self.clock = patch("src.services.rate_limit.time.time", return_value=6000.0)
+        self.clock.start()
+
+    def tearDown(self) -> None:
+        self.clock.stop()
+
+    async def test_worker_rejects_locally_once_it_used_the_limit(self):
+        rl = limiter(self.script)
+
+        results = [await rl.hit("login:ip", times=3, seconds=60) for _ in range(5)]
+
+        self.assertEqual(results[:3], [None] * 3)
+        self.assertEqual(results[3:], [60.0, 60.0])
+        self.assertEqual(self.script.calls, 3)
+
+    async def test_rejection_by_redis_blocks_locally(self):
+        first, second = limiter(self.script), limiter(self.script)
+        for _ in range(2):
+            self.assertIsNone(await first.hit("login:ip", times=3, seconds=60))
+        self.assertIsNone(await second.hit("login:ip", times=3, seconds=60))
+
+        self.assertEqual(await second.hit("login:ip", times=3, seconds=60), 20)
+        self.assertEqual(await second.hit("login:ip", times=3, seconds=60), 20)
+        self.assertEqual(self.script.calls, 4)
+
+    async def test_previous_window_is_weighted(self):
+        rl = limiter(self.script)
+        for _ in range(3):
+            await rl.hit("login:ip", times=3, seconds=60)
+
+        # Half way through the next window, half of the previous one still counts.
+        self.clock.stop()
+        self.clock = patch("src.services.rate_limit.time.time", return_value=6090.0)
+        self.clock.start()
+        results = [await rl.hit("login:ip", times=3, seconds=60) for _ in range(3)]
+
+        self.assertEqual(results, [None, None, 20])
+
+    async def test_redis_errors_let_requests_through(self):
+        self.script.error = ConnectionError("down")
+
+        self.assertIsNone(await limiter(self.script).hit("login:ip", times=1, seconds=60))
+
+    async def test_dependency_rejects_with_retry_after(self):
+        dependency = rate_limit("signup", times=1, seconds=60, per="ip")
+        request = Request({"type": "http", "method": "POST", "path": "/", "headers": [],
+                           "client": ("203.0.113.7", 1234)})
+
+        with patch("src.services.rate_limit.rate_limiter", limiter(self.script)):
+            await dependency(request)
+            with self.assertRaises(HTTPException) as err:
+                await dependency(request)
+
+        self.assertEqual(err.exception.status_code, 429)
+        self.assertEqual(err.exception.headers["Retry-After"], "60")
+        self.assertIn("ratelimit:{signup:ip:203.0.113.7}:100", self.script.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
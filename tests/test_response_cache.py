@@ -0,0 +1,171 @@
+import inspect
+import unittest
+import sys
+import os
+
+from fastapi import Request
+from pydantic import BaseModel
+from redis.exceptions import ConnectionError
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.response_cache import ResponseCache
+
+
+class FakeRedis:
+    """
+    The subset of Redis the response cache uses, kept in memory.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def register_script(self, script):
+        if "INCR" in script:
+            return self.invalidate_script
+        return self.set_script
+
+    async def set_script(self, keys, args):
+        generation, etag, body, ttl, n = args
+        if any(self.data.get(key, 0) > generation for key in keys[1:n + 1]):
+            return 0
+        self.data[keys[0]] = {b"etag": etag.encode(), b"body": body}
+        for key in keys[n + 1:]:
+            self.data.setdefault(key, set()).add(keys[0])
+        return 1
+
+    async def invalidate_script(self, keys, args):
+        n = args[0]
+        generation = self.data[keys[0]] = self.data.get(keys[0], 0) + 1
+        for key in keys[1:n + 1]:
+            self.data[key] = generation
+        for key in keys[n + 1:]:
+            for member in self.data.pop(key, set()):
+                self.data.pop(member, None)
+        return generation
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, r: FakeRedis):
+        self.r = r
+        self.results = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hgetall(self, key):
+        self.results.append(dict(self.r.data.get(key, {})))
+
+    def get(self, key):
+        self.results.append(self.r.data.get(key))
+
+    async def execute(self):
+        return self.results
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+
+
+def make_request(path: str, query: str = "", etag: str = None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+                    "headers": headers})
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.redis = FakeRedis()
+        self.cache = ResponseCache(self.redis, ttl=60)
+        self.calls = 0
+
+        @self.cache.cached(Item, tags=lambda item: [f"item:{item.id}"])
+        async def get_item(item_id: int):
+            self.calls += 1
+            return Item(id=item_id, name=f"item {self.calls}")
+
+        self.get_item = get_item
+
+    async def test_miss_then_hit(self):
+        first = await self.get_item(1, cache_request=make_request("/items/1"))
+        second = await self.get_item(1, cache_request=make_request("/items/1"))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(first.body, b'{"id":1,"name":"item 1"}')
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(second.headers["etag"], first.headers["etag"])
+
+    async def test_query_order_does_not_matter(self):
+        await self.get_item(1, cache_request=make_request("/items/1", "a=1&b=2"))
+        await self.get_item(1, cache_request=make_request("/items/1", "b=2&a=1"))
+        await self.get_item(1, cache_request=make_request("/items/1", "a=2"))
+
+        self.assertEqual(self.calls, 2)
+
+    async def test_not_modified(self):
+        first = await self.get_item(1, cache_request=make_request("/items/1"))
+        second = await self.get_item(1, cache_request=make_request("/items/1", etag=first.headers["etag"]))
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.body, b"")
+
+    async def test_invalidate(self):
+        await self.get_item(1, cache_request=make_request("/items/1"))
+        await self.get_item(2, cache_request=make_request("/items/2"))
+
+        await self.cache.invalidate("item:1")
+        response = await self.get_item(1, cache_request=make_request("/items/1"))
+        await self.get_item(2, cache_request=make_request("/items/2"))
+
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(response.body, b'{"id":1,"name":"item 3"}')
+
+    async def test_miss_overtaken_by_invalidation_is_not_stored(self):
+        invalidated = False
+
+        @self.cache.cached(Item, tags=lambda item: [f"item:{item.id}"])
+        async def slow_get_item(item_id: int):
+            nonlocal invalidated
+            self.calls += 1
+            if not invalidated:
+                # The write commits and invalidates while this miss is still running.
+                invalidated = True
+                await self.cache.invalidate("item:1")
+            return Item(id=item_id, name=f"item {self.calls}")
+
+        stale = await slow_get_item(1, cache_request=make_request("/items/1"))
+        fresh = await slow_get_item(1, cache_request=make_request("/items/1"))
+        cached = await slow_get_item(1, cache_request=make_request("/items/1"))
+
+        self.assertEqual(stale.body, b'{"id":1,"name":"item 1"}')
+        self.assertEqual(fresh.body, b'{"id":1,"name":"item 2"}')
+        self.assertEqual(cached.body, fresh.body)
+        self.assertEqual(self.calls, 2)
+
+    async def test_redis_errors_are_misses(self):
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("down")
+
+        self.cache._invalidate_script = unavailable
+        self.redis.pipeline = lambda transaction=True: (_ for _ in ()).throw(ConnectionError("down"))
+
+        response = await self.get_item(1, cache_request=make_request("/items/1"))
+        await self.cache.invalidate("item:1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    def test_signature_exposes_request(self):
+        self.assertIn("cache_request", inspect.signature(self.get_item).parameters)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import hashlib
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.revocation import BloomFilter, RevocationList
+
+
+def digest(value: str) -> bytes:
+    return hashlib.sha256(value.encode()).digest()
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(digest(f"token-{i}"))
+
+        self.assertTrue(all(digest(f"token-{i}") in bloom for i in range(1000)))
+
+    def test_false_positive_rate_is_close_to_target(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(digest(f"token-{i}"))
+
+        false_positives = sum(digest(f"other-{i}") in bloom for i in range(10000))
+
+        self.assertLess(false_positives / 10000, 0.03)
+        self.assertAlmostEqual(bloom.false_positive_rate, 0.01, delta=0.005)
+
+
+class TestRevocationList(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.redis = MagicMock()
+        self.redis.exists = AsyncMock(return_value=0)
+        self.revocation = RevocationList(self.redis, capacity=100, error_rate=0.01)
+        self.revocation.ready = True
+
+    async def test_unknown_token_skips_redis(self):
+        self.assertFalse(await self.revocation.is_revoked("token", digest("token")))
+        self.redis.exists.assert_not_called()
+
+    async def test_possible_positive_is_confirmed_in_redis(self):
+        self.revocation.filter.add(digest("token"))
+        self.redis.exists.return_value = 1
+
+        self.assertTrue(await self.revocation.is_revoked("token", digest("token")))
+        self.redis.exists.assert_called_once_with("blacklist:token")
+
+    async def test_false_positive_is_counted(self):
+        self.revocation.filter.add(digest("token"))
+
+        self.assertFalse(await self.revocation.is_revoked("token", digest("token")))
+        self.assertEqual(self.revocation.metrics()["false_positives"], 1)
+
+    async def test_not_ready_falls_back_to_redis(self):
+        self.revocation.ready = False
+
+        await self.revocation.is_revoked("token", digest("token"))
+
+        self.redis.exists.assert_called_once_with("blacklist:token")
+        self.assertEqual(self.revocation.metrics()["false_positives"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
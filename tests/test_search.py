@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+from collections import namedtuple
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.database.models import Photo
+from src.repository import photo as repository_photo
+from src.repository.pagination import decode_cursor, encode_cursor
+from src.repository.search import search_comments, search_photos
+
+Row = namedtuple("Row", "item rank snippet")
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+class TestFullTextSearch(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.session = AsyncMock(spec=AsyncSession())
+        self.session.execute.return_value = MagicMock()
+
+    def statement(self) -> str:
+        return compile_sql(self.session.execute.await_args.args[0])
+
+    async def test_search_photos(self):
+        self.session.execute.return_value.all.return_value = [
+            Row(Photo(id=3), 0.5, "<b>sea</b> view"), Row(Photo(id=1), 0.2, "<b>sea</b>"),
+        ]
+
+        hits, next_cursor = await search_photos("sea", 1, None, self.session)
+
+        self.assertEqual([hit["item"].id for hit in hits], [3])
+        self.assertEqual(hits[0]["snippet"], "<b>sea</b> view")
+        self.assertEqual(decode_cursor(next_cursor, 2), [0.5, 3])
+        sql = self.statement()
+        self.assertIn("photos.search_vector @@ websearch_to_tsquery", sql)
+        self.assertIn("ts_rank_cd(photos.search_vector", sql)
+        self.assertIn("ts_headline", sql)
+
+    async def test_search_comments_from_cursor(self):
+        self.session.execute.return_value.all.return_value = []
+
+        hits, next_cursor = await search_comments("nice -photo", 10, encode_cursor(0.5, 3), self.session)
+
+        self.assertEqual((hits, next_cursor), ([], None))
+        sql = self.statement()
+        self.assertIn("comments.search_vector @@ websearch_to_tsquery", sql)
+        self.assertIn("(CAST(ts_rank_cd(comments.search_vector", sql)
+        self.assertIn("comments.id) < (", sql)
+
+    async def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await search_photos("sea", 10, encode_cursor("x", 3), self.session)
+
+    async def test_tag_search_keywords_use_the_index(self):
+        self.session.execute.return_value.scalars.return_value.all.return_value = []
+
+        await repository_photo.search_photos([], True, "stormy sea", True, 10, None, self.session)
+
+        self.assertIn("photos.search_vector @@ websearch_to_tsquery", self.statement())
+        self.assertNotIn("ILIKE", self.statement())
+
+
+if __name__ == "__main__":
+    unittest.main()
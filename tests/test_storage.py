@@ -0,0 +1,106 @@
+import hashlib
+import io
+import tempfile
+import unittest
+import sys
+import os
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.storage import LocalStorage, MediaFiles, stage_stream, stage_upload
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+class TestLocalStorage(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.backend = LocalStorage(str(root / "media"), "/media", str(root / "tmp"))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    async def test_staged_object_is_visible_only_once_committed(self):
+        staged = await stage_stream(chunks(b"abc", b"def"), self.backend, max_size=10)
+
+        self.assertEqual(staged.size, 6)
+        self.assertEqual(staged.sha256, hashlib.sha256(b"abcdef").hexdigest())
+        self.assertFalse(self.backend.root.exists())
+
+        await staged.commit("blobs/ab/abcdef.jpg")
+
+        self.assertEqual((self.backend.root / "blobs/ab/abcdef.jpg").read_bytes(), b"abcdef")
+        self.assertEqual(list(self.backend.tmp_dir.iterdir()), [])
+
+    async def test_aborted_object_is_discarded(self):
+        staged = await stage_stream(chunks(b"abc"), self.backend, max_size=10)
+
+        await staged.abort()
+
+        self.assertEqual(list(self.backend.tmp_dir.iterdir()), [])
+        self.assertFalse(self.backend.root.exists())
+
+    async def test_too_large_file_is_discarded(self):
+        with self.assertRaises(HTTPException) as error:
+            await stage_stream(chunks(b"abc", b"def"), self.backend, max_size=5)
+
+        self.assertEqual(error.exception.status_code, 413)
+        self.assertEqual(list(self.backend.tmp_dir.iterdir()), [])
+        self.assertFalse(self.backend.root.exists())
+
+    async def test_delete(self):
+        staged = await stage_stream(chunks(b"abc"), self.backend, max_size=10)
+        await staged.commit("photos/abc")
+
+        await self.backend.delete("photos/abc")
+        await self.backend.delete("photos/abc")
+
+        self.assertFalse((self.backend.root / "photos/abc").exists())
+
+    async def test_upload_suffix_comes_from_the_detected_format(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4), "red").save(buffer, "GIF")
+
+        staged = await stage_upload(UploadFile(io.BytesIO(buffer.getvalue()), filename="photo.html"), self.backend)
+        await staged.abort()
+
+        self.assertEqual(staged.suffix, ".gif")
+        self.assertEqual(staged.size, len(buffer.getvalue()))
+
+    async def test_active_content_is_rejected(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+        for body, filename in ((svg, "photo.svg"), (b"<html></html>", "photo.jpg")):
+            with self.assertRaises(HTTPException) as error:
+                await stage_upload(UploadFile(io.BytesIO(body), filename=filename), self.backend)
+
+            self.assertEqual(error.exception.status_code, 415)
+        self.assertFalse(self.backend.tmp_dir.exists())
+
+    async def test_media_is_served_with_nosniff(self):
+        (self.backend.root / "photos").mkdir(parents=True)
+        (self.backend.root / "photos" / "a.jpg").write_bytes(b"data")
+        media = MediaFiles(directory=str(self.backend.root))
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await media({"type": "http", "method": "GET", "path": "/photos/a.jpg", "headers": []}, receive, send)
+
+        headers = dict(messages[0]["headers"])
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual(headers[b"x-content-type-options"], b"nosniff")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+import sys
+import os
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.database.models import Tag
+from src.repository.tags import create_tag
+from src.schemas import ImageTagModel
+
+
+class TestCreateTag(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.session = AsyncMock(spec=AsyncSession())
+
+    def returns(self, tags, inserted=False):
+        result = MagicMock()
+        result.all.return_value = [(tag, inserted) for tag in tags]
+        result.scalars.return_value.all.return_value = tags
+        return result
+
+    async def test_single_statement_upsert(self):
+        tags = [Tag(id=1, tag_name="sea"), Tag(id=2, tag_name="sun")]
+        self.session.execute.return_value = self.returns(tags, inserted=True)
+
+        with patch("src.repository.tags.response_cache.invalidate", AsyncMock()) as invalidate:
+            result = await create_tag([ImageTagModel(tag_name=name) for name in ["sea", " sun", "sea"]],
+                                      self.session)
+
+        self.assertEqual(result, tags)
+        self.session.execute.assert_called_once()
+        sql = str(self.session.execute.call_args.args[0])
+        self.assertIn("ON CONFLICT (tag_name) DO NOTHING", sql)
+        self.session.commit.assert_called_once()
+        invalidate.assert_awaited_once_with("tags")
+
+    async def test_existing_tags_keep_the_listing_cached(self):
+        tags = [Tag(id=1, tag_name="sea")]
+        self.session.execute.return_value = self.returns(tags)
+
+        with patch("src.repository.tags.response_cache.invalidate", AsyncMock()) as invalidate:
+            result = await create_tag([ImageTagModel(tag_name="sea")], self.session)
+
+        self.assertEqual(result, tags)
+        self.session.commit.assert_not_called()
+        invalidate.assert_not_called()
+
+    async def test_rereads_tags_inserted_concurrently(self):
+        tags = [Tag(id=1, tag_name="sea"), Tag(id=2, tag_name="sun")]
+        self.session.execute.side_effect = [self.returns(tags[:1]), self.returns(tags)]
+
+        result = await create_tag([ImageTagModel(tag_name="sea"), ImageTagModel(tag_name="sun")], self.session)
+
+        self.assertEqual(result, tags)
+        self.assertEqual(self.session.execute.call_count, 2)
+
+    async def test_empty_names_skip_the_database(self):
+        result = await create_tag([ImageTagModel(tag_name=" ")], self.session)
+
+        self.assertEqual(result, [])
+        self.session.execute.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+import sys
+import os
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.storage import LocalStorage
+from src.services.transform import TransformSpec, TransformWorker, perceptual_hash, render
+
+
+def jpeg(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class TestTransformSpec(unittest.TestCase):
+    def test_parse(self):
+        spec = TransformSpec.parse("200x100-fill")
+
+        self.assertEqual(spec, TransformSpec(200, 100, "fill"))
+        self.assertEqual(str(spec), "200x100-fill")
+
+    def test_parse_invalid(self):
+        for value in ("200x100", "200-fill", "0x100-fit", "200x100-blur", "9999x1-fit"):
+            with self.assertRaises(ValueError):
+                TransformSpec.parse(value)
+
+    def test_render(self):
+        (fit, fill), phash = render(jpeg(400, 200), [TransformSpec(100, 100, "fit"), TransformSpec(100, 100, "fill")])
+
+        self.assertEqual(Image.open(io.BytesIO(fit)).size, (100, 50))
+        self.assertEqual(Image.open(io.BytesIO(fill)).size, (100, 100))
+        self.assertEqual(len(phash), 16)
+
+    def test_perceptual_hash_survives_resizing(self):
+        image = Image.linear_gradient("L").rotate(30).convert("RGB")
+        smaller = image.resize((64, 64))
+
+        distance = bin(int(perceptual_hash(image), 16) ^ int(perceptual_hash(smaller), 16)).count("1")
+
+        self.assertLessEqual(distance, 4)
+
+
+class TestTransformWorker(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.backend = LocalStorage(str(root / "media"), "/media", str(root / "tmp"))
+        (root / "media" / "photos").mkdir(parents=True)
+        (root / "media" / "photos" / "1.jpg").write_bytes(jpeg(400, 200))
+        self.session = AsyncMock(spec=AsyncSession())
+        self.session.execute.return_value = MagicMock()
+        self.session.execute.return_value.scalars.return_value = [1]
+        self.queue = AsyncMock()
+
+        @contextlib.asynccontextmanager
+        async def session_factory():
+            yield self.session
+
+        self.worker = TransformWorker(self.queue, self.backend, session_factory=session_factory)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    async def test_process_batches_and_dedupes_specs(self):
+        jobs = [
+            {"photo_id": 1, "storage_key": "photos/1.jpg", "specs": ["100x100-fill", "50x50-fit"]},
+            {"photo_id": 1, "storage_key": "photos/1.jpg", "specs": ["100x100-fill"]},
+        ]
+        taken = [json.dumps(job) for job in jobs]
+
+        written = await self.worker.process(taken)
+
+        self.assertEqual(written, 2)
+        self.assertTrue((self.backend.root / "transforms/1/100x100-fill.jpg").exists())
+        self.assertTrue((self.backend.root / "transforms/1/50x50-fit.jpg").exists())
+        # One perceptual hash update, one existence check and one bulk insert for the whole batch.
+        self.assertEqual(self.session.execute.await_count, 3)
+        self.session.commit.assert_awaited_once()
+        self.queue.done.assert_awaited_once_with(taken, jobs, {})
+
+    async def test_failures_are_dead_lettered_without_stopping_the_batch(self):
+        malformed = json.dumps({"photo_id": 1, "storage_key": "photos/1.jpg", "specs": ["blur"]})
+        missing = json.dumps({"photo_id": 2, "storage_key": "photos/2.jpg", "specs": ["50x50-fit"]})
+        good = json.dumps({"photo_id": 1, "storage_key": "photos/1.jpg", "specs": ["50x50-fit"]})
+
+        written = await self.worker.process([malformed, "[1, 1]", missing, good])
+
+        self.assertEqual(written, 1)
+        taken, jobs, failed = self.queue.done.await_args.args
+        self.assertEqual(taken, [malformed, "[1, 1]", missing, good])
+        self.assertEqual([job["photo_id"] for job in jobs], [2, 1])
+        self.assertEqual(set(failed), {malformed, "[1, 1]", missing})
+
+    async def test_failed_save_dead_letters_the_batch(self):
+        self.session.commit.side_effect = ConnectionError("database down")
+        good = json.dumps({"photo_id": 1, "storage_key": "photos/1.jpg", "specs": ["50x50-fit"]})
+
+        self.assertEqual(await self.worker.process([good]), 0)
+
+        self.assertEqual(list(self.queue.done.await_args.args[2]), [good])
+
+    async def test_removed_photo_derivatives_are_discarded(self):
+        self.session.execute.return_value.scalars.return_value = []
+
+        written = await self.worker.process([json.dumps({"photo_id": 1, "storage_key": "photos/1.jpg",
+                                                          "specs": ["50x50-fit"]})])
+
+        self.assertEqual(written, 0)
+        self.assertFalse((self.backend.root / "transforms/1/50x50-fit.jpg").exists())
+        self.assertEqual(self.session.execute.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from fastapi import HTTPException
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from src.services.uploads import ResumableUploads
+
+
+class FakeRedis:
+    """
+    The commands of Redis the upload sessions use, with their scripts run in Python.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def register_script(self, script):
+        return self.refresh_script if script == ResumableUploads.REFRESH else self.release_script
+
+    async def refresh_script(self, keys, args):
+        return int(self.data.get(keys[0]) == args[0])
+
+    async def release_script(self, keys, args):
+        session, lock = keys
+        token, offset, ttl = args
+        if self.data.get(lock) != token:
+            return 0
+        del self.data[lock]
+        if offset >= 0 and session in self.data:
+            self.data[session][b"offset"] = str(offset).encode()
+        return 1
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def hset(self, key, mapping):
+        self.data[key] = {name.encode(): str(value).encode() for name, value in mapping.items()}
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def expire(self, key, ttl):
+        pass
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, r: FakeRedis):
+        self.r = r
+        self.results = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def exists(self, key):
+        self.results.append(int(key in self.r.data))
+
+    async def execute(self):
+        return self.results
+
+
+async def body(*chunks: bytes, wait: asyncio.Event = None):
+    for chunk in chunks:
+        if wait is not None:
+            await wait.wait()
+        yield chunk
+
+
+class TestResumableUploads(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.redis = FakeRedis()
+        self.uploads = ResumableUploads(self.redis, self.tmp.name, max_size=100, ttl=3600, lock_ttl=60)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    async def test_concurrent_appends_are_rejected(self):
+        upload_id = await self.uploads.create(user_id=1)
+        release = asyncio.Event()
+        first = asyncio.create_task(self.uploads.append(upload_id, 1, 0, body(b"abc", wait=release)))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as err:
+            await self.uploads.append(upload_id, 1, 0, body(b"xyz"))
+        self.assertEqual(err.exception.detail, "Upload is in progress")
+        release.set()
+        self.assertEqual(await first, 3)
+
+        # A client that started from the old offset finds the lock free but the offset moved.
+        with self.assertRaises(HTTPException) as err:
+            await self.uploads.append(upload_id, 1, 0, body(b"xyz"))
+        self.assertEqual(err.exception.detail, "Expected offset 3")
+        self.assertEqual(await self.uploads.append(upload_id, 1, 3, body(b"de")), 5)
+        self.assertEqual(self.uploads.path(upload_id).read_bytes(), b"abcde")
+        self.assertNotIn(f"upload:{upload_id}:lock", self.redis.data)
+
+    async def test_lost_lock_does_not_save_the_offset(self):
+        upload_id = await self.uploads.create(user_id=1)
+
+        async def expiring_body():
+            yield b"abc"
+            # The lock expired and another append took it.
+            self.redis.data[f"upload:{upload_id}:lock"] = "other"
+
+        with self.assertRaises(HTTPException) as err:
+            await self.uploads.append(upload_id, 1, 0, expiring_body())
+
+        self.assertEqual(err.exception.detail, "Upload lock was lost")
+        self.assertEqual(await self.uploads.get_offset(upload_id, 1), 0)
+
+    async def test_purge_removes_files_of_expired_sessions(self):
+        expired, active, fresh = [await self.uploads.create(user_id=1) for _ in range(3)]
+        await self.redis.delete(f"upload:{expired}", f"upload:{fresh}")
+        old = time.time() - 120
+        for upload_id in (expired, active):
+            os.utime(self.uploads.path(upload_id), (old, old))
+
+        self.assertEqual(await self.uploads.purge(), 1)
+
+        self.assertFalse(self.uploads.path(expired).exists())
+        self.assertTrue(self.uploads.path(active).exists())
+        # Too recent to tell from a session that is being created.
+        self.assertTrue(self.uploads.path(fresh).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
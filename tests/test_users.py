@@ -0,0 +1,213 @@
+import json
+import unittest
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+from query_counter import count_statements
+from src.database.db import Base
+from src.database.models import SystemFlag, User
+from src.repository import users as repository_users
+from src.schemas import UpdateUserProfileModel, UserModel
+
+
+class FakeRedis:
+    """
+    The string commands of Redis the user cache uses, kept in memory.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, r: FakeRedis):
+        self.r = r
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None, nx=False):
+        if not (nx and key in self.r.data):
+            self.r.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.r.data.pop(key, None)
+
+    async def execute(self):
+        return []
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.session.add(User(id=1, username="user", first_name="First", email="user@example.com",
+                              password="secret", role_id=3))
+        await self.session.commit()
+
+        self.redis = FakeRedis()
+        self.patches = [
+            patch("src.repository.users.redis_client", self.redis),
+            patch("src.repository.users.response_cache.invalidate", AsyncMock()),
+            patch("src.repository.users.cache_invalidator.r", AsyncMock()),
+        ]
+        for p in self.patches:
+            p.start()
+        repository_users.local_users.clear()
+
+    async def asyncTearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        repository_users.local_users.clear()
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_lookup_fills_every_key(self):
+        with count_statements(self.engine) as statements:
+            by_email = await repository_users.get_principal("email", "user@example.com", self.session)
+        self.assertEqual(len(statements), 1, statements)
+        self.assertEqual(set(self.redis.data), {"user:id:1", "user:email:user@example.com", "user:username:user"})
+
+        repository_users.local_users.clear()
+        with count_statements(self.engine) as statements:
+            by_id = await repository_users.get_principal("id", 1, self.session)
+            by_username = await repository_users.get_principal("username", "user", self.session)
+
+        self.assertEqual(len(statements), 0, statements)
+        self.assertEqual(by_id, by_email)
+        self.assertEqual(by_username, by_email)
+
+    async def test_unknown_user(self):
+        self.assertIsNone(await repository_users.get_principal("username", "nobody", self.session))
+        self.assertEqual(self.redis.data, {})
+
+    async def test_invalid_field(self):
+        with self.assertRaises(ValueError):
+            await repository_users.get_principal("password", "secret", self.session)
+
+    async def test_update_writes_through(self):
+        await repository_users.get_principal("username", "user", self.session)
+
+        body = UpdateUserProfileModel(username="renamed", first_name="New", last_name=None)
+        await repository_users.update_user_profile("user@example.com", body, self.session)
+
+        self.assertNotIn("user:username:user", self.redis.data)
+        self.assertIsNone(await repository_users.get_principal("username", "user", self.session))
+        with count_statements(self.engine) as statements:
+            renamed = await repository_users.get_principal("username", "renamed", self.session)
+            by_id = await repository_users.get_principal("id", 1, self.session)
+        self.assertEqual(len(statements), 0, statements)
+        self.assertEqual(renamed.first_name, "New")
+        self.assertEqual(by_id.username, "renamed")
+        repository_users.response_cache.invalidate.assert_awaited_with("user:1")
+        # Other workers drop their copies under the old and the new keys.
+        channel, message = repository_users.cache_invalidator.r.publish.await_args.args
+        name, keys = json.loads(message)
+        self.assertEqual(name, "users")
+        self.assertEqual(set(keys), {"user:id:1", "user:email:user@example.com", "user:username:renamed",
+                                     "user:username:user"})
+
+    async def test_invalidation_from_another_worker_drops_the_local_copy(self):
+        await repository_users.get_principal("id", 1, self.session)
+        self.assertIsNotNone(repository_users.local_users.get("user:id:1"))
+
+        # What the listener does with a message published by the worker that changed the user.
+        repository_users.cache_invalidator._drop("users", ["user:id:1"])
+
+        self.assertIsNone(repository_users.local_users.get("user:id:1"))
+
+    async def test_ban_writes_through(self):
+        await repository_users.get_principal("email", "user@example.com", self.session)
+        repository_users.local_users.clear()
+
+        await repository_users.update_user_ban("user", self.session)
+
+        repository_users.local_users.clear()
+        principal = await repository_users.get_principal("email", "user@example.com", self.session)
+        self.assertTrue(principal.ban)
+
+    async def test_replace_avatar_only_if_unchanged(self):
+        await self.session.execute(User.__table__.update().values(avatar="https://example.com/plain"))
+        await self.session.commit()
+
+        replaced = await repository_users.replace_avatar("user@example.com", "https://example.com/plain",
+                                                          "https://example.com/default", self.session)
+        kept = await repository_users.replace_avatar("user@example.com", "https://example.com/plain",
+                                                      "https://example.com/other", self.session)
+
+        self.assertEqual(replaced.avatar, "https://example.com/default")
+        self.assertIsNone(kept)
+        repository_users.local_users.clear()
+        principal = await repository_users.get_principal("id", 1, self.session)
+        self.assertEqual(principal.avatar, "https://example.com/default")
+
+
+def signup(name: str) -> UserModel:
+    return UserModel(username=name, first_name="", last_name="", email=f"{name}@example.com", password="secret")
+
+
+class TestCreateUser(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        repository_users.first_admin_claimed = False
+
+    async def asyncTearDown(self) -> None:
+        repository_users.first_admin_claimed = False
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def test_first_user_is_admin(self):
+        first = await repository_users.create_user(signup("first"), self.session)
+        with count_statements(self.engine) as statements:
+            second = await repository_users.create_user(signup("second"), self.session)
+
+        self.assertEqual((first.role_id, second.role_id), (1, 3))
+        self.assertIsNotNone(second.created_at)
+        # Only the INSERT of the user, its id and created_at come back with it.
+        self.assertEqual(len(statements), 1, statements)
+
+    async def test_flag_claimed_elsewhere(self):
+        self.session.add(SystemFlag(name=SystemFlag.FIRST_ADMIN))
+        await self.session.commit()
+
+        user = await repository_users.create_user(signup("first"), self.session)
+
+        self.assertEqual(user.role_id, 3)
+        self.assertTrue(repository_users.first_admin_claimed)
+
+    async def test_failed_signup_gives_the_claim_back(self):
+        self.session.add(User(username="taken", email="taken@example.com", password="secret"))
+        await self.session.commit()
+
+        with self.assertRaises(Exception):
+            await repository_users.create_user(signup("taken"), self.session)
+        await self.session.rollback()
+        user = await repository_users.create_user(signup("first"), self.session)
+
+        self.assertEqual(user.role_id, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()